@@ -0,0 +1,112 @@
+"""
+Generators of synthetic genome-scale inputs for the benchmark suite: \
+count matrices, HTSeq count folders, DESeq tables, fold change tables and reference tables. \
+All generators are seeded, so every benchmark run measures the exact same data.
+"""
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+UNCOUNTED_ROWS = ['__no_feature', '__ambiguous', '__alignment_not_unique', '__too_low_aQual', '__not_aligned']
+BIOTYPES = ['protein_coding', 'pseudogene', 'lincRNA', 'piRNA', 'miRNA']
+
+
+def feature_names(n_features: int) -> np.ndarray:
+    """
+    Returns WormBase-style names for 'n_features' features.
+    """
+    return np.array([f"WBGene{i:08d}" for i in range(n_features)])
+
+
+def count_matrix(n_features: int, n_samples: int, random_seed: int = 0) -> pd.DataFrame:
+    """
+    Returns a (features x samples) DataFrame of negative binomial read counts, \
+    with a log-normal spread of mean expression levels and about 30% of lowly-expressed features.
+    """
+    rng = np.random.default_rng(random_seed)
+    means = rng.lognormal(3, 2, n_features)
+    dispersion = 0.1 + 1 / means
+    counts = rng.negative_binomial(1 / dispersion[:, np.newaxis], 1 / (1 + dispersion * means)[:, np.newaxis],
+                                   size=(n_features, n_samples))
+    return pd.DataFrame(counts, index=feature_names(n_features), columns=[f"sample{i}" for i in range(n_samples)])
+
+
+def uncounted_table(counts: pd.DataFrame, random_seed: int = 0) -> pd.DataFrame:
+    """
+    Returns an HTSeq table of uncounted reads (no feature, ambiguous, etc) for the samples of a count matrix.
+    """
+    rng = np.random.default_rng(random_seed)
+    totals = counts.sum(axis=0).values
+    values = (rng.uniform(0.01, 0.2, (len(UNCOUNTED_ROWS), counts.shape[1])) * totals).astype(int)
+    return pd.DataFrame(values, index=UNCOUNTED_ROWS, columns=counts.columns)
+
+
+def htseq_folder(path: Path, counts: pd.DataFrame, random_seed: int = 0):
+    """
+    Writes every sample of a count matrix into 'path' as an HTSeq-count .txt file, including the uncounted rows.
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    full = pd.concat([counts, uncounted_table(counts, random_seed)])
+    for sample in full.columns:
+        full[sample].to_csv(path.joinpath(f"{sample}.txt"), sep='\t', header=False)
+
+
+def deseq_table(n_features: int, random_seed: int = 0) -> pd.DataFrame:
+    """
+    Returns a DESeq2-style results table, where about 10% of the features are differentially expressed.
+    """
+    rng = np.random.default_rng(random_seed)
+    base_mean = rng.lognormal(3, 2, n_features)
+    lfc_se = rng.uniform(0.1, 1, n_features)
+    lfc = rng.normal(0, 0.3, n_features)
+    de = rng.random(n_features) < 0.1
+    lfc[de] += rng.choice([-3, 3], de.sum())
+    stat = lfc / lfc_se
+    from scipy.stats import norm
+    pvalue = 2 * norm.sf(np.abs(stat))
+    order = np.argsort(pvalue)
+    padj = np.empty_like(pvalue)
+    padj[order] = np.minimum(1, np.minimum.accumulate((pvalue[order] * n_features / np.arange(1, n_features + 1))
+                                                      [::-1])[::-1])
+    return pd.DataFrame({'baseMean': base_mean, 'log2FoldChange': lfc, 'lfcSE': lfc_se, 'stat': stat,
+                         'pvalue': pvalue, 'padj': padj}, index=feature_names(n_features))
+
+
+def fold_change_series(n_features: int, random_seed: int = 0) -> pd.Series:
+    """
+    Returns a Series of strictly positive fold change values.
+    """
+    rng = np.random.default_rng(random_seed)
+    return pd.Series(rng.lognormal(0, 1, n_features), index=feature_names(n_features), name='Fold Change')
+
+
+def attr_ref_table(n_features: int, n_attributes: int, density: float = 0.05,
+                   random_seed: int = 0) -> pd.DataFrame:
+    """
+    Returns an Attribute Reference Table, where every feature belongs to each attribute with probability 'density'. \
+    Non-members are NaN, as in the Attribute Reference Tables RNAlysis reads.
+    """
+    rng = np.random.default_rng(random_seed)
+    membership = rng.random((n_features, n_attributes)) < density
+    df = pd.DataFrame(np.where(membership, 1, np.nan), columns=[f"attribute{i}" for i in range(n_attributes)])
+    df.insert(0, 'gene', feature_names(n_features))
+    return df
+
+
+def biotype_ref_table(n_features: int, random_seed: int = 0) -> pd.DataFrame:
+    """
+    Returns a Biotype Reference Table, where about 70% of the features are protein-coding.
+    """
+    rng = np.random.default_rng(random_seed)
+    biotypes = rng.choice(BIOTYPES, n_features, p=[0.7, 0.1, 0.1, 0.05, 0.05])
+    return pd.DataFrame({'gene': feature_names(n_features), 'bioType': biotypes})
+
+
+def feature_sets(n_features: int, n_sets: int, set_size: int, random_seed: int = 0) -> dict:
+    """
+    Returns a dictionary of 'n_sets' random sets of feature names, each of size 'set_size'.
+    """
+    rng = np.random.default_rng(random_seed)
+    names = feature_names(n_features)
+    return {f"set{i}": set(names[rng.choice(n_features, set_size, replace=False)]) for i in range(n_sets)}
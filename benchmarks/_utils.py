@@ -0,0 +1,16 @@
+"""
+Helpers shared by the benchmark suites.
+"""
+import time
+
+
+def throughput(func, n_items: int, repeat: int = 3) -> float:
+    """
+    Calls 'func' 'repeat' times and returns the number of items processed per second in the fastest call.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return n_items / best
@@ -0,0 +1,92 @@
+"""
+Benchmarks of the enrichment module: \
+hypergeometric and randomization enrichment tests over genome-scale reference tables, \
+and preparation of set intersections for UpSet plots. \
+'time_*' benchmarks measure run time, 'peakmem_*' benchmarks measure peak memory, \
+and 'track_*_throughput' benchmarks report the number of attributes tested per second.
+"""
+import shutil
+import tempfile
+from pathlib import Path
+
+from rnalysis import enrichment
+from . import _generators
+from ._utils import throughput
+
+
+class EnrichmentSuite:
+    params = ([2_000, 20_000], [10, 100])
+    param_names = ['n_features', 'n_attributes']
+    timeout = 300
+
+    def setup(self, n_features, n_attributes):
+        self.folder = Path(tempfile.mkdtemp())
+        self.attr_ref_path = self.folder.joinpath('attr_ref.csv')
+        self.biotype_ref_path = self.folder.joinpath('biotype_ref.csv')
+        _generators.attr_ref_table(n_features, n_attributes).to_csv(self.attr_ref_path, index=False)
+        _generators.biotype_ref_table(n_features).to_csv(self.biotype_ref_path, index=False)
+        genes = _generators.feature_names(n_features)
+        self.feature_set = enrichment.FeatureSet(set(genes[::20]), 'benchmark set')
+        self.kwargs = dict(attributes='all', biotype='protein_coding', attr_ref_path=str(self.attr_ref_path),
+                           biotype_ref_path=str(self.biotype_ref_path), plot=False)
+
+    def teardown(self, n_features, n_attributes):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def time_enrich_hypergeometric(self, n_features, n_attributes):
+        self.feature_set.enrich_hypergeometric(**self.kwargs)
+
+    def peakmem_enrich_hypergeometric(self, n_features, n_attributes):
+        self.feature_set.enrich_hypergeometric(**self.kwargs)
+
+    def track_enrich_hypergeometric_throughput(self, n_features, n_attributes):
+        return throughput(lambda: self.feature_set.enrich_hypergeometric(**self.kwargs), n_attributes)
+
+    track_enrich_hypergeometric_throughput.unit = 'attributes/s'
+
+    def time_enrich_randomization(self, n_features, n_attributes):
+        self.feature_set.enrich_randomization(reps=1000, random_seed=0, **self.kwargs)
+
+    def peakmem_enrich_randomization(self, n_features, n_attributes):
+        self.feature_set.enrich_randomization(reps=1000, random_seed=0, **self.kwargs)
+
+    def track_enrich_randomization_throughput(self, n_features, n_attributes):
+        return throughput(lambda: self.feature_set.enrich_randomization(reps=1000, random_seed=0, **self.kwargs),
+                          n_attributes, repeat=1)
+
+    track_enrich_randomization_throughput.unit = 'attributes/s'
+
+
+class EnrichManySuite:
+    params = ([20_000], [10, 100], [10, 100])
+    param_names = ['n_features', 'n_attributes', 'n_sets']
+    timeout = 300
+
+    def setup(self, n_features, n_attributes, n_sets):
+        self.folder = Path(tempfile.mkdtemp())
+        self.attr_ref_path = self.folder.joinpath('attr_ref.csv')
+        self.biotype_ref_path = self.folder.joinpath('biotype_ref.csv')
+        _generators.attr_ref_table(n_features, n_attributes).to_csv(self.attr_ref_path, index=False)
+        _generators.biotype_ref_table(n_features).to_csv(self.biotype_ref_path, index=False)
+        self.sets = _generators.feature_sets(n_features, n_sets, n_features // 50)
+
+    def teardown(self, n_features, n_attributes, n_sets):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def time_enrich_many_hypergeometric(self, n_features, n_attributes, n_sets):
+        enrichment.enrich_many(self.sets, 'all', biotype='all', attr_ref_path=str(self.attr_ref_path),
+                               biotype_ref_path=str(self.biotype_ref_path))
+
+
+class UpsetSuite:
+    params = ([20_000, 100_000], [3, 6, 10])
+    param_names = ['n_features', 'n_sets']
+
+    def setup(self, n_features, n_sets):
+        self.sets = _generators.feature_sets(n_features, n_sets, n_features // 10)
+
+    def time_generate_upset_srs(self, n_features, n_sets):
+        enrichment._generate_upset_srs(self.sets)
+
+    def peakmem_generate_upset_srs(self, n_features, n_sets):
+        enrichment._generate_upset_srs(self.sets)
@@ -0,0 +1,126 @@
+"""
+Benchmarks of the filtering module: \
+CountFilter filtering and normalization, loading csv files and HTSeq count folders, DESeq filtering \
+and randomization tests. \
+'time_*' benchmarks measure run time, 'peakmem_*' benchmarks measure peak memory, \
+and 'track_*_throughput' benchmarks report the number of features processed per second.
+"""
+import shutil
+import tempfile
+from pathlib import Path
+
+from rnalysis import filtering, general
+from . import _generators
+from ._utils import throughput
+
+
+class CountFilterSuite:
+    params = ([2_000, 20_000, 100_000], [6, 48])
+    param_names = ['n_features', 'n_samples']
+
+    def setup(self, n_features, n_samples):
+        self.counts = _generators.count_matrix(n_features, n_samples)
+        self.uncounted = _generators.uncounted_table(self.counts)
+        self.c = filtering.CountFilter((Path('counts.csv'), self.counts))
+
+    def time_filter_low_reads(self, n_features, n_samples):
+        self.c.filter_low_reads(threshold=5, inplace=False)
+
+    def peakmem_filter_low_reads(self, n_features, n_samples):
+        self.c.filter_low_reads(threshold=5, inplace=False)
+
+    def track_filter_low_reads_throughput(self, n_features, n_samples):
+        return throughput(lambda: self.c.filter_low_reads(threshold=5, inplace=False), n_features * n_samples)
+
+    track_filter_low_reads_throughput.unit = 'counts/s'
+
+    def time_normalize_to_rpm(self, n_features, n_samples):
+        self.c.normalize_to_rpm(self.uncounted, inplace=False)
+
+    def peakmem_normalize_to_rpm(self, n_features, n_samples):
+        self.c.normalize_to_rpm(self.uncounted, inplace=False)
+
+    def track_normalize_to_rpm_throughput(self, n_features, n_samples):
+        return throughput(lambda: self.c.normalize_to_rpm(self.uncounted, inplace=False), n_features * n_samples)
+
+    track_normalize_to_rpm_throughput.unit = 'counts/s'
+
+
+class LoadCsvSuite:
+    params = ([20_000, 100_000], ['c', 'pyarrow'])
+    param_names = ['n_features', 'engine']
+    timeout = 300
+
+    def setup(self, n_features, engine):
+        self.folder = Path(tempfile.mkdtemp())
+        self.fname = self.folder.joinpath('counts.csv')
+        _generators.count_matrix(n_features, 48).to_csv(self.fname)
+
+    def teardown(self, n_features, engine):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def time_load_csv(self, n_features, engine):
+        general.load_csv(self.fname, 0, engine=engine)
+
+    def time_load_csv_usecols(self, n_features, engine):
+        general.load_csv(self.fname, 0, usecols=list(range(7)), engine=engine)
+
+    def peakmem_load_csv(self, n_features, engine):
+        general.load_csv(self.fname, 0, engine=engine)
+
+
+class FromFolderSuite:
+    params = ([2_000, 20_000, 100_000], [6, 24])
+    param_names = ['n_features', 'n_samples']
+    timeout = 300
+
+    def setup(self, n_features, n_samples):
+        self.folder = Path(tempfile.mkdtemp())
+        _generators.htseq_folder(self.folder, _generators.count_matrix(n_features, n_samples))
+
+    def teardown(self, n_features, n_samples):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def time_from_folder(self, n_features, n_samples):
+        filtering.CountFilter.from_folder(self.folder)
+
+    def time_from_folder_norm_to_rpm(self, n_features, n_samples):
+        filtering.CountFilter.from_folder(self.folder, norm_to_rpm=True)
+
+    def peakmem_from_folder(self, n_features, n_samples):
+        filtering.CountFilter.from_folder(self.folder)
+
+
+class DESeqFilterSuite:
+    params = [2_000, 20_000, 100_000]
+    param_names = ['n_features']
+
+    def setup(self, n_features):
+        self.d = filtering.DESeqFilter((Path('deseq.csv'), _generators.deseq_table(n_features)))
+
+    def time_filter_significant(self, n_features):
+        self.d.filter_significant(alpha=0.1, inplace=False)
+
+    def time_filter_abs_log2_fold_change(self, n_features):
+        self.d.filter_abs_log2_fold_change(abslog2fc=1, inplace=False)
+
+    def peakmem_filter_significant(self, n_features):
+        self.d.filter_significant(alpha=0.1, inplace=False)
+
+
+class RandomizationTestSuite:
+    params = ([2_000, 20_000], [1_000, 10_000])
+    param_names = ['n_features', 'reps']
+    timeout = 300
+
+    def setup(self, n_features, reps):
+        fold_change = _generators.fold_change_series(n_features)
+        self.ref = filtering.FoldChangeFilter((Path('ref.csv'), fold_change), 'numerator', 'denominator')
+        self.subset = filtering.FoldChangeFilter((Path('subset.csv'), fold_change.iloc[::20]),
+                                                 'numerator', 'denominator')
+
+    def time_randomization_test(self, n_features, reps):
+        self.subset.randomization_test(self.ref, reps=reps, random_seed=0)
+
+    def peakmem_randomization_test(self, n_features, reps):
+        self.subset.randomization_test(self.ref, reps=reps, random_seed=0)
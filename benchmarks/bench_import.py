@@ -0,0 +1,12 @@
+"""
+Benchmarks of the time it takes to import the RNAlysis modules in a fresh interpreter.
+"""
+
+
+class ImportSuite:
+    params = ['rnalysis.general', 'rnalysis.filtering', 'rnalysis.enrichment']
+    param_names = ['module']
+    timeout = 120
+
+    def timeraw_import(self, module):
+        return f"import {module}"
@@ -10,3 +10,6 @@ __version__ = "1.3.4"
 __license__ = "MIT"
 __attr_file_key__ = "attribute_reference_table"""
 __biotype_file_key__ = "biotype_reference_table"
+__go_cache_dir_key__ = "go_dictionary_cache_dir"
+__enrichment_plot_key__ = "plot_enrichment_results"
+__profile_key__ = "profile_operations"
@@ -4,24 +4,22 @@ These include gene ontology/tissue/phenotype enrichment, enrichment for user-def
 set visualization ,etc. \
 Results of enrichment analyses can be saved to .csv files.
 """
-import random
 import numpy as np
 import pandas as pd
 from rnalysis import general, filtering
-import tissue_enrichment_analysis as tea
-import seaborn as sns
-import matplotlib.pyplot as plt
-from matplotlib.cm import ScalarMappable
 from pathlib import Path
-import statsmodels.stats.multitest as multitest
-from ipyparallel import Client
 from itertools import repeat, compress
-import upsetplot as upset
-import matplotlib_venn as vn
 import warnings
+import os
+import logging
 from typing import Union, List, Set, Dict, Tuple, Iterable, Type, Callable
 
+_LOGGER = logging.getLogger(__name__)
 
+_GO_DICT_CACHE_VERSION = 3
+
+
+@general._profile_methods('__init__')
 class FeatureSet:
     """ receives a filtered gene set and preforms various enrichment analyses"""
     __slots__ = {'gene_set': 'set of feature names/indices', 'set_name': 'name of the FeatureSet'}
@@ -276,7 +274,71 @@ class FeatureSet:
             fname = str(Path)
         general.save_to_csv(df, filename=fname + '.csv')
 
-    def go_enrichment(self, mode: str = 'all', alpha: float = 0.05, save_csv: bool = False, fname: str = None):
+    @staticmethod
+    def _go_dict_cache_path(analysis: str) -> Path:
+
+        """
+        Internal method, returns the path of the on-disk cache file of a GO/Tissue/Phenotype dictionary. \
+        The file name is versioned by both the cache format and the tissue_enrichment_analysis version, \
+        so dictionaries cached by incompatible versions are never loaded. \
+        Dictionaries are cached as parquet files (see general.save_table()) rather than pickle, \
+        since the cache directory may be shared, and loading a pickle can execute arbitrary code.
+
+        :param analysis: 'go', 'tissue' or 'phenotype'
+        :rtype: pathlib.Path
+        """
+        import tissue_enrichment_analysis as tea
+        tea_version = getattr(tea, '__version__', 'unknown')
+        return general.read_go_cache_dir().joinpath(
+            f"{analysis}_dict_v{_GO_DICT_CACHE_VERSION}_tea{tea_version}.parquet")
+
+    @staticmethod
+    def _fetch_go_dictionary(analysis: str, offline: bool = False) -> pd.DataFrame:
+
+        """
+        Internal method, returns the GO/Tissue/Phenotype dictionary required for go_enrichment. \
+        Dictionaries are looked up in the in-process cache first, then in the on-disk cache, \
+        and only then fetched from the internet (after which they are saved to the on-disk cache). \
+        The on-disk cache requires the optional package 'pyarrow'.
+
+        :param analysis: 'go', 'tissue' or 'phenotype'
+        :param offline: if True, the dictionary will never be fetched from the internet.
+        :rtype: pandas DataFrame
+        """
+        if analysis in FeatureSet._go_dicts:
+            return FeatureSet._go_dicts[analysis]
+
+        cache_pth = FeatureSet._go_dict_cache_path(analysis)
+        if cache_pth.exists():
+            try:
+                d, _ = general.load_table(cache_pth)
+                FeatureSet._go_dicts[analysis] = d
+                return d
+            except Exception:
+                warnings.warn(f"Could not read the cached {analysis} dictionary at '{cache_pth}'. "
+                              f"The cached dictionary will be ignored.")
+
+        if offline:
+            raise FileNotFoundError(f"No cached {analysis} dictionary was found in '{cache_pth.parent}', "
+                                    f"and it cannot be fetched in offline mode. ")
+        import tissue_enrichment_analysis as tea
+        d = tea.fetch_dictionary(analysis)
+        if d is None:
+            raise ConnectionError(f"Could not fetch the {analysis} dictionary, and no cached dictionary was found in "
+                                  f"'{cache_pth.parent}'. Please check your internet connection. ")
+        FeatureSet._go_dicts[analysis] = d
+        try:
+            cache_pth.parent.mkdir(parents=True, exist_ok=True)
+            tmp_pth = general.save_table(d, cache_pth.with_name(f"{cache_pth.stem}.{os.getpid()}.tmp.parquet"))
+            os.replace(tmp_pth, cache_pth)
+        except ImportError:
+            _LOGGER.debug("The %s dictionary was not cached, since 'pyarrow' is not installed.", analysis)
+        except OSError:
+            warnings.warn(f"Could not save the {analysis} dictionary to the cache directory '{cache_pth.parent}'. ")
+        return d
+
+    def go_enrichment(self, mode: str = 'all', alpha: float = 0.05, save_csv: bool = False, fname: str = None,
+                      offline: bool = False, plot: bool = None):
 
         """
         Analyzes GO, Tissue and/or Phenotype enrichment for the given group of genomic features. \
@@ -293,6 +355,13 @@ class FeatureSet:
         :param save_csv: If True, save the result to a csv.
         :type fname: str or pathlib.Path
         :param fname: Name and path in which to save the results. Must be specified if save_csv is True.
+        :type offline: bool (default False)
+        :param offline: if True, GO/Tissue/Phenotype dictionaries will only be loaded from the local cache \
+        (see general.set_go_cache_dir()), and will never be fetched from the internet.
+        :type plot: bool or None (default None)
+        :param plot: if True, the results will be plotted. If False, no plots will be generated, \
+        and matplotlib will not be imported. If None, the setting saved in the settings file will be used \
+        (see general.set_enrichment_plotting()).
         :return: a DataFrame which contains the significant enrichmenet terms
 
         .. figure::  go_en.png
@@ -310,62 +379,65 @@ class FeatureSet:
         """
         assert isinstance(alpha, float), "alpha must be a float!"
         assert isinstance(mode, str), "'mode' must be a string!"
-        plt.style.use('seaborn-white')
+        import tissue_enrichment_analysis as tea
+        plot = general._get_enrichment_plotting(plot)
+        if plot:
+            import matplotlib.pyplot as plt
+            plt.style.use('seaborn-white')
         if mode == 'all':
             d = []
             df_comb = pd.DataFrame()
-            for k, arg in enumerate(('go', 'tissue', 'phenotype')):
-                print(f'Calculating... {100 * k / 3 :.2f}% done')
-                if arg in FeatureSet._go_dicts:
-                    d.append(FeatureSet._go_dicts[arg])
-                else:
-                    d.append(tea.fetch_dictionary(arg))
-                    FeatureSet._go_dicts[arg] = d[-1]
+            progress = general._Progress(3, 'GO/Tissue/Phenotype enrichment')
+            for arg in ('go', 'tissue', 'phenotype'):
+                d.append(self._fetch_go_dictionary(arg, offline=offline))
                 df = tea.enrichment_analysis(self.gene_set, d[-1], alpha=alpha)
                 if not df.empty:
                     df_comb = df_comb.append(df)
-                    plt.figure()
-                    tea.plot_enrichment_results(df, title=f'{arg.capitalize()} Enrichment Analysis', analysis=arg)
-                    plt.title(f'{arg.capitalize()} Enrichment Analysis for sample {self.set_name}', fontsize=20)
+                    if plot:
+                        plt.figure()
+                        tea.plot_enrichment_results(df, title=f'{arg.capitalize()} Enrichment Analysis', analysis=arg)
+                        plt.title(f'{arg.capitalize()} Enrichment Analysis for sample {self.set_name}', fontsize=20)
+                progress.update()
 
         else:
             assert (mode == 'go' or mode == 'tissue' or mode == 'phenotype'), "Invalid mode!"
-            d = tea.fetch_dictionary(mode)
-            df_comb = tea.enrichment_analysis(self.gene_set, d, show=True)
-            if not df_comb.empty:
+            d = self._fetch_go_dictionary(mode, offline=offline)
+            df_comb = tea.enrichment_analysis(self.gene_set, d, show=plot)
+            if plot and not df_comb.empty:
                 tea.plot_enrichment_results(df_comb, title=f'{mode.capitalize()} Enrichment Analysis', analysis=mode)
                 plt.title(f'{mode.capitalize()} Enrichment Analysis', fontsize=20)
 
         if save_csv:
             self._enrichment_save_csv(df_comb, fname)
-        plt.show()
+        if plot:
+            general._show_figures('go_enrichment')
         return df_comb
 
     @staticmethod
-    def _single_enrichment(gene_set, attributes, attr_ref_df: pd.DataFrame, fraction: Callable, reps: int):
-        attributes = [attributes] if not isinstance(attributes, list) else attributes
+    def _enrichment_observed(gene_set: set, background, attributes: List[str]):
+        """
+        Internal method, counts the features of the enrichment set which belong to each of the given attributes, \
+        and calculates the expected counts and log2 fold enrichment for each attribute. Static class method.
+
+        :param gene_set: the enrichment set. All of its features must appear in the background.
+        :type background: enrichment.Background
+        :param attributes: names of attributes from the Attribute Reference Table.
+        :return: the size of the enrichment set, a 1D array of observed counts per attribute, \
+        the boolean attribute matrix of the background, and a DataFrame with the columns \
+        'name', 'samples', 'n obs', 'n exp' and 'log2_fold_enrichment'.
+        """
         for attribute in attributes:
             assert isinstance(attribute, str), f"Error in attribute {attribute}: attributes must be strings!"
-            df = attr_ref_df[[attribute, 'int_index']]
-            srs = df[attribute]
-            srs_int = (df.set_index('int_index', inplace=False))[attribute]
-            obs_srs = srs.loc[gene_set]
-            n = obs_srs.shape[0]
-            expected_fraction = fraction(srs)
-            observed_fraction = fraction(obs_srs)
-            log2_fold_enrichment = np.log2(observed_fraction / expected_fraction) if observed_fraction > 0 else -np.inf
-            ind = srs_int.index
-            if log2_fold_enrichment >= 0:
-                success = sum(
-                    (fraction(srs_int.loc[np.random.choice(ind, n, replace=False)]) >= observed_fraction
-                     for _ in repeat(None, reps)))
-            else:
-                success = sum(
-                    (fraction(srs_int.loc[np.random.choice(ind, n, replace=False)]) <= observed_fraction
-                     for _ in repeat(None, reps)))
-            pval = (success + 1) / (reps + 1)
-
-            return [attribute, n, int(n * observed_fraction), n * expected_fraction, log2_fold_enrichment, pval]
+        attr_matrix = background.attr_matrix(attributes)
+        in_set = background.attr_ref_df.index.isin(list(gene_set))
+        n = int(in_set.sum())
+        obs = attr_matrix[in_set].sum(axis=0)
+        expected_fraction = background.attr_counts[attributes].values / len(background)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log2_fold_enrichment = np.log2((obs / n) / expected_fraction)
+        res_df = pd.DataFrame({'name': attributes, 'samples': n, 'n obs': obs, 'n exp': n * expected_fraction,
+                               'log2_fold_enrichment': log2_fold_enrichment})
+        return n, obs, attr_matrix, res_df
 
     @staticmethod
     def _enrichment_get_attrs(attributes, attr_ref_path):
@@ -384,12 +456,9 @@ class FeatureSet:
                     assert isinstance(attr, str), f"Invalid type of attribute {attr}: {type(attr)}"
 
         try:
-            with open(attr_ref_path) as f:
-                all_attrs = f.readline().split(',')[1::]
+            all_attrs = general._read_header_line(attr_ref_path).split(',')[1::]
         except:
             raise ValueError(f"Invalid or nonexistent Attribute Reference Table path! path:'{attr_ref_path}'")
-        if all_attrs[-1].endswith('\n'):
-            all_attrs[-1] = all_attrs[-1][:-1]
 
         if attributes == ['all']:
             attributes = all_attrs
@@ -400,10 +469,18 @@ class FeatureSet:
             return select_attributes
         return attributes
 
-    def _enrichment_get_reference(self, biotype, background_genes, attr_ref_path, biotype_ref_path):
-        gene_set = self.gene_set
+    @staticmethod
+    def _enrichment_build_reference(biotype, background_genes, attr_ref_path, biotype_ref_path):
 
-        attr_ref_df = general.load_csv(attr_ref_path)
+        """
+        Internal method, loads the Attribute Reference Table and reduces it to the requested background set, \
+        which is determined either by 'background_genes' or by 'biotype' and a Biotype Reference Table. \
+        Static class method.
+
+        :return: the background Attribute Reference Table, sorted by index, with an additional 'int_index' column.
+        :rtype: pandas DataFrame
+        """
+        attr_ref_df = general.load_csv(attr_ref_path, dtype='compact')
         general._attr_table_assertions(attr_ref_df)
         attr_ref_df.set_index('gene', inplace=True)
 
@@ -435,36 +512,47 @@ class FeatureSet:
         if biotype == 'all':
             pass
         else:
-            biotype_ref_df = general.load_csv(biotype_ref_path)
+            biotype_ref_df = general.load_csv(biotype_ref_path, dtype='compact')
             general._biotype_table_assertions(biotype_ref_df)
             biotype_ref_df.set_index('gene', inplace=True)
             biotype_ref_df.columns = biotype_ref_df.columns.str.lower()
+            biotype_ref_df = biotype_ref_df.loc[biotype_ref_df.index.intersection(attr_ref_df.index)]
             if isinstance(biotype, (list, tuple, set)):
-                mask = pd.Series(np.zeros_like(biotype_ref_df['biotype'].values, dtype=bool),
-                                 biotype_ref_df['biotype'].index,
-                                 name='biotype')
-                for bio in biotype:
-                    mask = mask | (biotype_ref_df['biotype'] == bio)
+                mask = biotype_ref_df['biotype'].isin(biotype)
             else:
-                biotype_ref_df = biotype_ref_df.loc[biotype_ref_df.index.intersection(attr_ref_df.index)]
                 mask = biotype_ref_df['biotype'] == biotype
-            attr_ref_df = attr_ref_df.loc[biotype_ref_df[mask].index]
+            attr_ref_df = attr_ref_df.loc[biotype_ref_df.index[mask.values]]
         attr_ref_df.sort_index(inplace=True)
-        attr_ref_df['int_index'] = [i for i in range(len(attr_ref_df.index))]
-        print(f"{len(attr_ref_df.index)} background genes are used. ")
+        attr_ref_df['int_index'] = np.arange(attr_ref_df.shape[0])
+        _LOGGER.info("%d background genes are used. ", len(attr_ref_df.index))
+        return attr_ref_df
 
-        not_in_bg = gene_set.difference(set(attr_ref_df.index))
+    def _enrichment_get_reference(self, biotype, background_genes, attr_ref_path, biotype_ref_path):
+        background = Background._parse(biotype=biotype, background_genes=background_genes,
+                                       attr_ref_path=attr_ref_path, biotype_ref_path=biotype_ref_path)
+        return background.attr_ref_df, self._enrichment_get_gene_set(background)
+
+    def _enrichment_get_gene_set(self, background):
+        """
+        Internal method, returns the features of the FeatureSet which appear in the given Background, \
+        and warns about the features that do not.
+
+        :type background: enrichment.Background
+        :rtype: set
+        """
+        gene_set = self.gene_set
+        not_in_bg = gene_set.difference(background.gene_set)
         if len(not_in_bg) > 0:
             gene_set = gene_set.difference(not_in_bg)
             warnings.warn(f"{len(not_in_bg)} genes in the enrichment set do not appear in the background genes. \n"
                           f"Enrichment will be run on the remaining {len(gene_set)}.")
-        return attr_ref_df, gene_set
+        return gene_set
 
     def enrich_randomization_parallel(self, attributes: Union[Iterable[str], str, Iterable[int], int] = None,
                                       fdr: float = 0.05, reps: int = 10000, biotype: str = 'protein_coding',
                                       background_genes=None, attr_ref_path: str = 'predefined',
                                       biotype_ref_path: str = 'predefined', save_csv: bool = False, fname=None,
-                                      return_fig: bool = False, random_seed: int = None):
+                                      return_fig: bool = False, random_seed: int = None, plot: bool = None):
 
         """
         Calculates enrichment scores, p-values and adjusted p-values \
@@ -502,16 +590,30 @@ class FeatureSet:
         'all' will include all genomic features in the reference table, \
        'protein_coding' will include only protein-coding genes from the reference table, etc. \
        Cannot be specified together with 'background_genes'.
-       :type background_genes: set of feature indices, filtering.Filter object, or enrichment.FeatureSet object
+       :type background_genes: set of feature indices, filtering.Filter object, enrichment.FeatureSet object \
+       or enrichment.Background object
        :param background_genes: a set of specific feature indices to be used as background genes. \
-       Cannot be specified together with 'biotype'.
+       Cannot be specified together with 'biotype'. \
+       If an enrichment.Background object is given, the precomputed background will be used, \
+       and 'biotype', 'attr_ref_path' and 'biotype_ref_path' will be ignored.
        :type save_csv: bool, default False
        :param save_csv: If True, will save the results to a .csv file, under the name specified in 'fname'.
        :type fname: str or pathlib.Path
        :param fname: The full path and name of the file to which to save the results. For example: \
        r'C:\dir\file'. No '.csv' suffix is required. If None (default), fname will be requested in a manual prompt.
        :type return_fig: bool (default False)
-       :param return_fig: if True, returns a matplotlib Figure object in addition to the results DataFrame.
+       :param return_fig: if True, returns a matplotlib Figure object in addition to the results DataFrame. \
+       If the results are not plotted, None will be returned instead of a Figure.
+       :type random_seed: non-negative int (default None)
+       :param random_seed: the random seed used to generate consistent results. \
+       Every attribute is given its own independent random stream, spawned from this seed, \
+       so results do not depend on the number of parallel engines. \
+       If None and 'background_genes' is an enrichment.Background object, \
+       random seeds will be drawn from the random state of the Background.
+       :type plot: bool or None (default None)
+       :param plot: if True, the results will be plotted. If False, no plots will be generated, \
+       and matplotlib will not be imported. If None, the setting saved in the settings file will be used \
+       (see general.set_enrichment_plotting()).
        :rtype: pd.DataFrame (default) or Tuple[pd.DataFrame, matplotlib.figure.Figure]
        :return:
        a pandas DataFrame with the indicated attribute names as rows/index, and the columns 'log2_fold_enrichment'
@@ -523,41 +625,29 @@ class FeatureSet:
 
           Example plot of enrich_randomization_parallel()
        """
-        attr_ref_path = general._get_attr_ref_path(attr_ref_path)
-        biotype_ref_path = general._get_biotype_ref_path(biotype_ref_path)
-        attr_ref_df, gene_set = self._enrichment_get_reference(biotype=biotype, background_genes=background_genes,
-                                                               attr_ref_path=attr_ref_path,
-                                                               biotype_ref_path=biotype_ref_path)
-
-        attributes = self._enrichment_get_attrs(attributes=attributes, attr_ref_path=attr_ref_path)
-        fraction = lambda mysrs: (mysrs.shape[0] - mysrs.isna().sum()) / mysrs.shape[0]
-        client = Client()
-        dview = client[:]
-        dview.execute("""import numpy as np
-              import pandas as pd""")
-        if random_seed is not None:
-            assert isinstance(random_seed, int) and random_seed >= 0, f"random_seed must be a non-negative integer. " \
-                                                                      f"Value {random_seed} invalid."
-            dview.execute(f"np.random.seed({random_seed})")
+        background = Background._parse(biotype=biotype, background_genes=background_genes,
+                                       attr_ref_path=attr_ref_path, biotype_ref_path=biotype_ref_path)
+        gene_set = self._enrichment_get_gene_set(background)
+        attributes = self._enrichment_get_attrs(attributes=attributes, attr_ref_path=background.attr_ref_path)
+        general._assert_random_seed(random_seed)
+        n, obs, attr_matrix, res_df = self._enrichment_observed(gene_set, background, attributes)
         k = len(attributes)
-        gene_set_rep = list(repeat(gene_set, k))
-        attr_ref_df_rep = list(repeat(attr_ref_df, k))
-        fraction_rep = list(repeat(fraction, k))
-        reps_rep = list(repeat(reps, k))
-
-        res = dview.map(FeatureSet._single_enrichment, gene_set_rep, attributes, attr_ref_df_rep, fraction_rep,
-                        reps_rep)
-        enriched_list = res.result()
-        res_df = pd.DataFrame(enriched_list,
-                              columns=['name', 'samples', 'n obs', 'n exp', 'log2_fold_enrichment',
-                                       'pval'])
+        seeds = background._spawn_seeds(k) if random_seed is None else general._spawn_seeds(random_seed, k)
+
+        from ipyparallel import Client
+        dview = Client()[:]
+        res = dview.map(_randomization_pvals, list(repeat(n, k)), [obs[[i]] for i in range(k)],
+                        [attr_matrix[:, [i]] for i in range(k)], list(repeat(reps, k)), seeds)
+        res_df['pval'] = np.concatenate(general._wait_with_progress(res, 'Randomization enrichment (parallel)'))
         res_df.replace(-np.inf, -np.max(np.abs(res_df['log2_fold_enrichment'].values)))
+        from statsmodels.stats import multitest
         significant, padj = multitest.fdrcorrection(res_df['pval'].values, alpha=fdr)
         res_df['padj'] = padj
         res_df['significant'] = significant
         res_df.set_index('name', inplace=True)
 
-        fig = self._plot_enrich_randomization(res_df, title=self.set_name)
+        fig = self._plot_enrich_randomization(res_df, title=self.set_name) if general._get_enrichment_plotting(
+            plot) else None
 
         if save_csv:
             self._enrichment_save_csv(res_df, fname)
@@ -569,7 +659,8 @@ class FeatureSet:
     def enrich_randomization(self, attributes: Union[Iterable[str], str, Iterable[int], int] = None, fdr: float = 0.05,
                              reps: int = 10000, biotype: str = 'protein_coding', background_genes=None,
                              attr_ref_path: str = 'predefined', biotype_ref_path: str = 'predefined',
-                             save_csv: bool = False, fname=None, return_fig: bool = False, random_seed: int = None):
+                             save_csv: bool = False, fname=None, return_fig: bool = False, random_seed: int = None,
+                             plot: bool = None):
 
         """
         Calculates enrichment scores, p-values and adjusted p-values \
@@ -606,16 +697,30 @@ class FeatureSet:
         'all' will include all genomic features in the reference table, \
         'protein_coding' will include only protein-coding genes from the reference table, etc. \
         Cannot be specified together with 'background_genes'.
-        :type background_genes: set of feature indices, filtering.Filter object, or enrichment.FeatureSet object
+        :type background_genes: set of feature indices, filtering.Filter object, enrichment.FeatureSet object \
+        or enrichment.Background object
         :param background_genes: a set of specific feature indices to be used as background genes. \
-        Cannot be specified together with 'biotype'.
+        Cannot be specified together with 'biotype'. \
+        If an enrichment.Background object is given, the precomputed background will be used, \
+        and 'biotype', 'attr_ref_path' and 'biotype_ref_path' will be ignored.
         :type save_csv: bool, default False
         :param save_csv: If True, will save the results to a .csv file, under the name specified in 'fname'.
         :type fname: str or pathlib.Path
         :param fname: The full path and name of the file to which to save the results. For example: \
         r'C:\dir\file'. No '.csv' suffix is required. If None (default), fname will be requested in a manual prompt.
        :type return_fig: bool (default False)
-       :param return_fig: if True, returns a matplotlib Figure object in addition to the results DataFrame.
+       :param return_fig: if True, returns a matplotlib Figure object in addition to the results DataFrame. \
+       If the results are not plotted, None will be returned instead of a Figure.
+        :type random_seed: non-negative int (default None)
+        :param random_seed: the random seed used to generate consistent results. \
+        Every attribute is given its own independent random stream, spawned from this seed, \
+        so results do not depend on the number of parallel engines. \
+        If None and 'background_genes' is an enrichment.Background object, \
+        random seeds will be drawn from the random state of the Background.
+        :type plot: bool or None (default None)
+        :param plot: if True, the results will be plotted. If False, no plots will be generated, \
+        and matplotlib will not be imported. If None, the setting saved in the settings file will be used \
+        (see general.set_enrichment_plotting()).
         :rtype: pd.DataFrame (default) or Tuple[pd.DataFrame, matplotlib.figure.Figure]
         :return: a pandas DataFrame with the indicated attribute names as rows/index, and the columns 'log2_fold_enrichment'
         and 'pvalue'; and a matplotlib Figure, if 'return_figure' is set to True.
@@ -627,54 +732,30 @@ class FeatureSet:
            Example plot of enrich_randomization()
 
         """
-        attr_ref_path = general._get_attr_ref_path(attr_ref_path)
-        biotype_ref_path = general._get_biotype_ref_path(biotype_ref_path)
-        attr_ref_df, gene_set = self._enrichment_get_reference(biotype=biotype, background_genes=background_genes,
-                                                               attr_ref_path=attr_ref_path,
-                                                               biotype_ref_path=biotype_ref_path)
-        attributes = self._enrichment_get_attrs(attributes=attributes, attr_ref_path=attr_ref_path)
-        fraction = lambda mysrs: (mysrs.shape[0] - mysrs.isna().sum()) / mysrs.shape[0]
-        enriched_list = []
-        if random_seed is not None:
-            assert isinstance(random_seed, int) and random_seed >= 0, f"random_seed must be a non-negative integer. " \
-                                                                      f"Value {random_seed} invalid."
-            random.seed(random_seed)
-
-        for k, attribute in enumerate(attributes):
-            assert isinstance(attribute, str), f"Error in attribute {attribute}: attributes must be strings!"
-            print(f"Finished {k} attributes out of {len(attributes)}")
-            df = attr_ref_df[[attribute, 'int_index']]
-            srs = df[attribute]
-            srs_int = (df.set_index('int_index', inplace=False))[attribute]
-            obs_srs = srs.loc[gene_set]
-            n = obs_srs.shape[0]
-            expected_fraction = fraction(srs)
-            observed_fraction = fraction(obs_srs)
-            log2_fold_enrichment = np.log2(observed_fraction / expected_fraction) if observed_fraction > 0 else -np.inf
-            ind = set(srs_int.index)
-            if log2_fold_enrichment >= 0:
-                success = sum(
-                    (fraction(srs_int.loc[random.sample(ind, n)]) >= observed_fraction
-                     for _ in repeat(None, reps)))
-            else:
-                success = sum(
-                    (fraction(srs_int.loc[random.sample(ind, n)]) <= observed_fraction
-                     for _ in repeat(None, reps)))
-            pval = (success + 1) / (reps + 1)
-
-            enriched_list.append(
-                (attribute, n, int(n * observed_fraction), n * expected_fraction, log2_fold_enrichment, pval))
-
-        res_df = pd.DataFrame(enriched_list,
-                              columns=['name', 'samples', 'n obs', 'n exp', 'log2_fold_enrichment',
-                                       'pval'])
+        background = Background._parse(biotype=biotype, background_genes=background_genes,
+                                       attr_ref_path=attr_ref_path, biotype_ref_path=biotype_ref_path)
+        gene_set = self._enrichment_get_gene_set(background)
+        attributes = self._enrichment_get_attrs(attributes=attributes, attr_ref_path=background.attr_ref_path)
+        general._assert_random_seed(random_seed)
+        n, obs, attr_matrix, res_df = self._enrichment_observed(gene_set, background, attributes)
+        k = len(attributes)
+        seeds = background._spawn_seeds(k) if random_seed is None else general._spawn_seeds(random_seed, k)
+
+        pvals = []
+        progress = general._Progress(k, 'Randomization enrichment')
+        for i in range(k):
+            pvals.append(_randomization_pvals(n, obs[[i]], attr_matrix[:, [i]], reps, seeds[i])[0])
+            progress.update()
+        res_df['pval'] = pvals
         res_df.replace(-np.inf, -np.max(np.abs(res_df['log2_fold_enrichment'].values)))
+        from statsmodels.stats import multitest
         significant, padj = multitest.fdrcorrection(res_df['pval'].values, alpha=fdr)
         res_df['padj'] = padj
         res_df['significant'] = significant
         res_df.set_index('name', inplace=True)
 
-        fig = self._plot_enrich_randomization(res_df, title=self.set_name)
+        fig = self._plot_enrich_randomization(res_df, title=self.set_name) if general._get_enrichment_plotting(
+            plot) else None
 
         if save_csv:
             self._enrichment_save_csv(res_df, fname)
@@ -686,7 +767,7 @@ class FeatureSet:
     def enrich_hypergeometric(self, attributes: Union[Iterable[str], str, Iterable[int], int] = None, fdr: float = 0.05,
                               biotype: str = 'protein_coding', background_genes=None,
                               attr_ref_path: str = 'predefined', biotype_ref_path: str = 'predefined',
-                              save_csv: bool = False, fname=None, return_fig: bool = False):
+                              save_csv: bool = False, fname=None, return_fig: bool = False, plot: bool = None):
 
         """
         Calculates enrichment scores, p-values and adjusted p-values \
@@ -727,16 +808,24 @@ class FeatureSet:
         'all' will include all genomic features in the reference table, \
         'protein_coding' will include only protein-coding genes from the reference table, etc. \
         Cannot be specified together with 'background_genes'.
-        :type background_genes: set of feature indices, filtering.Filter object, or enrichment.FeatureSet object
+        :type background_genes: set of feature indices, filtering.Filter object, enrichment.FeatureSet object \
+        or enrichment.Background object
         :param background_genes: a set of specific feature indices to be used as background genes. \
-        Cannot be specified together with 'biotype'.
+        Cannot be specified together with 'biotype'. \
+        If an enrichment.Background object is given, the precomputed background will be used, \
+        and 'biotype', 'attr_ref_path' and 'biotype_ref_path' will be ignored.
         :type save_csv: bool, default False
         :param save_csv: If True, will save the results to a .csv file, under the name specified in 'fname'.
         :type fname: str or pathlib.Path
         :param fname: The full path and name of the file to which to save the results. For example: \
         r'C:\dir\file'. No '.csv' suffix is required. If None (default), fname will be requested in a manual prompt.
        :type return_fig: bool (default False)
-       :param return_fig: if True, returns a matplotlib Figure object in addition to the results DataFrame.
+       :param return_fig: if True, returns a matplotlib Figure object in addition to the results DataFrame. \
+       If the results are not plotted, None will be returned instead of a Figure.
+        :type plot: bool or None (default None)
+        :param plot: if True, the results will be plotted. If False, no plots will be generated, \
+        and matplotlib will not be imported. If None, the setting saved in the settings file will be used \
+        (see general.set_enrichment_plotting()).
         :rtype: pd.DataFrame (default) or Tuple[pd.DataFrame, matplotlib.figure.Figure]
         :return:         a pandas DataFrame with the indicated attribute names as rows/index, and the columns 'log2_fold_enrichment'
         and 'pvalue'; and a matplotlib Figure, if 'return_figure' is set to True.
@@ -748,17 +837,16 @@ class FeatureSet:
            Example plot of enrich_hypergeometric()
 
         """
-        attr_ref_path = general._get_attr_ref_path(attr_ref_path)
-        biotype_ref_path = general._get_biotype_ref_path(biotype_ref_path)
-        attr_ref_df, gene_set = self._enrichment_get_reference(biotype=biotype, background_genes=background_genes,
-                                                               attr_ref_path=attr_ref_path,
-                                                               biotype_ref_path=biotype_ref_path)
-        attributes = self._enrichment_get_attrs(attributes=attributes, attr_ref_path=attr_ref_path)
+        background = Background._parse(biotype=biotype, background_genes=background_genes,
+                                       attr_ref_path=attr_ref_path, biotype_ref_path=biotype_ref_path)
+        attr_ref_df = background.attr_ref_df
+        gene_set = self._enrichment_get_gene_set(background)
+        attributes = self._enrichment_get_attrs(attributes=attributes, attr_ref_path=background.attr_ref_path)
         fraction = lambda mysrs: (mysrs.shape[0] - mysrs.isna().sum()) / mysrs.shape[0]
         enriched_list = []
-        for k, attribute in enumerate(attributes):
+        progress = general._Progress(len(attributes), 'Hypergeometric enrichment')
+        for attribute in attributes:
             assert isinstance(attribute, str), f"Error in attribute {attribute}: attributes must be strings!"
-            print(f"Finished {k} attributes out of {len(attributes)}")
             df = attr_ref_df[[attribute, 'int_index']]
             srs = df[attribute]
             obs_srs = srs.loc[gene_set]
@@ -766,22 +854,25 @@ class FeatureSet:
             expected_fraction = fraction(srs)
             observed_fraction = fraction(obs_srs)
             log2_fold_enrichment = np.log2(observed_fraction / expected_fraction) if observed_fraction > 0 else -np.inf
-            pval = self._calc_hypergeometric_pval(bg_size=srs.shape[0], go_size=srs.notna().sum(),
+            pval = self._calc_hypergeometric_pval(bg_size=len(background), go_size=background.attr_counts[attribute],
                                                   de_size=obs_srs.shape[0], go_de_size=obs_srs.notna().sum())
 
             enriched_list.append(
                 (attribute, n, int(n * observed_fraction), n * expected_fraction, log2_fold_enrichment, pval))
+            progress.update()
 
         res_df = pd.DataFrame(enriched_list,
                               columns=['name', 'samples', 'n obs', 'n exp', 'log2_fold_enrichment',
                                        'pval'])
         res_df.replace(-np.inf, -np.max(np.abs(res_df['log2_fold_enrichment'].values)))
+        from statsmodels.stats import multitest
         significant, padj = multitest.fdrcorrection(res_df['pval'].values, alpha=fdr)
         res_df['padj'] = padj
         res_df['significant'] = significant
         res_df.set_index('name', inplace=True)
 
-        fig = self._plot_enrich_randomization(res_df, title=self.set_name)
+        fig = self._plot_enrich_randomization(res_df, title=self.set_name) if general._get_enrichment_plotting(
+            plot) else None
 
         if save_csv:
             self._enrichment_save_csv(res_df, fname)
@@ -790,6 +881,35 @@ class FeatureSet:
             return res_df, fig
         return res_df
 
+    @staticmethod
+    def _calc_hypergeometric_pval(bg_size, go_size, de_size, go_de_size):
+
+        """
+        Performs a hypergeometric test on the given enrichment set. \
+        Given M genes in the background set, n genes in the test set, \
+        with N genes from the background set belonging to a specific attribute ('success') \
+        and X genes from the test set belonging to that attribute: \
+        if we were to randomly draw n genes from the background set (without replacement), \
+        what is the probability of drawing X or more (in case of enrichment)/X or less (in case of depletion) \
+        genes belonging to the given attribute? \
+        All arguments can also be numpy arrays of matching shapes, in which case an array of p-values is returned.
+
+        :param bg_size: size of the background set. Usually denoted as 'M'.
+        :param go_size: number of features in the background set that belong to the attribute. Usually denoted as 'n'.
+        :param de_size: size of the enrichment set. Usually denoted as 'N'.
+        :param go_de_size: number of features in the enrichment set that belong to the attribute. \
+        Usually denoted as 'x' or 'k'.
+        :rtype: float or numpy array of floats
+        :return: p-value of the hypergeometric test.
+        """
+        from scipy.stats import hypergeom
+        bg_size, go_size, de_size, go_de_size = np.broadcast_arrays(bg_size, go_size, de_size, go_de_size)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            is_enriched = (go_de_size / de_size) >= (go_size / bg_size)
+        pval = np.where(is_enriched, hypergeom.sf(go_de_size - 1, bg_size, go_size, de_size),
+                        hypergeom.cdf(go_de_size, bg_size, go_size, de_size))
+        return pval if pval.ndim > 0 else float(pval)
+
     @staticmethod
     def _plot_enrich_randomization(df: pd.DataFrame, title: str = ''):
 
@@ -804,6 +924,9 @@ class FeatureSet:
         :return: a matplotlib.pyplot.bar instance
 
         """
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+        from matplotlib.cm import ScalarMappable
         plt.style.use('seaborn-white')
 
         enrichment_names = df.index.values.tolist()
@@ -863,7 +986,7 @@ class FeatureSet:
                     fontsize=12, horizontalalignment='center', verticalalignment=valign)
 
         sns.despine()
-        plt.show()
+        general._show_figures('enrichment')
         return fig
 
     def biotypes(self, ref: str = 'predefined'):
@@ -889,7 +1012,7 @@ class FeatureSet:
         """
 
         ref = general._get_biotype_ref_path(ref)
-        ref_df = general.load_csv(ref)
+        ref_df = general.load_csv(ref, dtype='compact')
         general._biotype_table_assertions(ref_df)
         ref_df.columns = ref_df.columns.str.lower()
         not_in_ref = pd.Index(self.gene_set).difference(set(ref_df['gene']))
@@ -897,7 +1020,307 @@ class FeatureSet:
             warnings.warn(
                 f'{len(not_in_ref)} of the features in the Filter object do not appear in the Biotype Reference Table. ')
             ref_df = ref_df.append(pd.DataFrame({'gene': not_in_ref, 'biotype': 'not_in_biotype_reference'}))
-        return ref_df.set_index('gene', drop=False).loc[self.gene_set].groupby('biotype').count()
+        return ref_df.set_index('gene', drop=False).loc[self.gene_set].groupby('biotype', observed=True).count()
+
+
+@general._profile_methods('__init__')
+class Background:
+    """ a precomputed background set, which can be reused by multiple enrichment analyses """
+    __slots__ = {'attr_ref_df': 'the background Attribute Reference Table, sorted by index',
+                 'attr_ref_path': 'path of the Attribute Reference Table',
+                 'gene_set': 'set of the background features',
+                 'int_index': 'integer index of the background features',
+                 'attr_counts': 'number of background features belonging to each attribute',
+                 '_attr_matrix': 'boolean matrix of attribute membership for every background feature',
+                 '_seed_sequence': 'random state from which random seeds for randomization tests are spawned'}
+
+    def __init__(self, biotype: Union[str, List[str], Set[str]] = 'protein_coding', background_genes=None,
+                 attr_ref_path: str = 'predefined', biotype_ref_path: str = 'predefined', random_seed: int = None):
+
+        """
+        Loads the Attribute Reference Table and the Biotype Reference Table once, \
+        and precomputes the background set they define, so that repeated enrichment analyses \
+        against the same background can skip all of the setup.
+        A Background object can be given to any enrichment function through the 'background_genes' argument.
+
+        :type biotype: str specifying a specific biotype, list/set of strings each specifying a biotype, or 'all'. \
+        Default 'protein_coding'.
+        :param biotype: determines the background genes by their biotype. Requires specifying a Biotype Reference Table. \
+        'all' will include all genomic features in the reference table, \
+        'protein_coding' will include only protein-coding genes from the reference table, etc. \
+        Cannot be specified together with 'background_genes'.
+        :type background_genes: set of feature indices, filtering.Filter object, or enrichment.FeatureSet object
+        :param background_genes: a set of specific feature indices to be used as background genes. \
+        Cannot be specified together with 'biotype'.
+        :type attr_ref_path: str or pathlib.Path (default 'predefined')
+        :param attr_ref_path: the path of the Attribute Reference Table from which user-defined attributes will be drawn.
+        :type biotype_ref_path: str or pathlib.Path (default 'predefined')
+        :param biotype_ref_path: the path of the Biotype Reference Table. \
+        Will be used to generate background set if 'biotype' is specified.
+        :type random_seed: non-negative int (default None)
+        :param random_seed: the random seed from which the random states of randomization tests \
+        performed against this background will be drawn, when those are not given a random seed of their own.
+
+        :Examples:
+            >>> from rnalysis import enrichment
+            >>> bg = enrichment.Background('protein_coding', attr_ref_path='tests/attr_ref_table_for_examples.csv',
+            ... biotype_ref_path='tests/biotype_ref_table_for_tests.csv')
+            13 background genes are used.
+            >>> en = enrichment.FeatureSet({'WBGene00000041', 'WBGene00002074'}, 'my set')
+            >>> res = en.enrich_hypergeometric('all', background_genes=bg)
+
+        """
+        general._assert_random_seed(random_seed)
+        self.attr_ref_path = general._get_attr_ref_path(attr_ref_path)
+        biotype_ref_path = general._get_biotype_ref_path(biotype_ref_path) if biotype != 'all' else biotype_ref_path
+        self.attr_ref_df = FeatureSet._enrichment_build_reference(biotype=biotype, background_genes=background_genes,
+                                                                  attr_ref_path=self.attr_ref_path,
+                                                                  biotype_ref_path=biotype_ref_path)
+        self.gene_set = set(self.attr_ref_df.index)
+        self.int_index = self.attr_ref_df['int_index'].values
+        self._attr_matrix = self.attr_ref_df.drop('int_index', axis=1).notna()
+        self.attr_counts = self._attr_matrix.sum(axis=0)
+        self._seed_sequence = np.random.SeedSequence(random_seed)
+
+    def __len__(self):
+        return self.attr_ref_df.shape[0]
+
+    def __repr__(self):
+        return f"Background: {len(self)} features, {self.attr_counts.shape[0]} attributes"
+
+    def attr_matrix(self, attributes: List[str]) -> np.ndarray:
+        """
+        Returns a boolean matrix indicating, for every background feature (rows), \
+        whether it belongs to each of the given attributes (columns).
+
+        :param attributes: names of attributes from the Attribute Reference Table.
+        :type attributes: list of str
+        :rtype: numpy.ndarray of shape (background features, attributes)
+        """
+        return self._attr_matrix[attributes].values
+
+    def _spawn_seeds(self, n: int) -> list:
+        """
+        Spawns independent random seeds from the random state of the Background. \
+        Every call returns new seeds, so that repeated analyses against the same Background are independent, \
+        while the Background's random seed keeps the whole series of analyses reproducible.
+
+        :param n: number of seeds to spawn.
+        :rtype: list of numpy.random.SeedSequence
+        """
+        return self._seed_sequence.spawn(n)
+
+    @staticmethod
+    def _parse(biotype, background_genes, attr_ref_path, biotype_ref_path) -> 'Background':
+        """
+        Internal method, receives the background arguments of an enrichment function, \
+        and returns the given Background object or builds a new one from them.
+
+        :rtype: enrichment.Background
+        """
+        if isinstance(background_genes, Background):
+            return background_genes
+        return Background(biotype=biotype, background_genes=background_genes, attr_ref_path=attr_ref_path,
+                          biotype_ref_path=biotype_ref_path)
+
+
+def _parse_feature_sets(feature_sets) -> Dict[str, set]:
+    """
+    Receives the 'feature_sets' input from enrichment.enrich_many(), and turns it into a dictionary of python sets.
+
+    :param feature_sets: the 'feature_sets' input given to the function enrichment.enrich_many().
+    :type feature_sets: a dictionary where the keys are names of sets and the values are FeatureSets, \
+    python sets or Filter objects; or an iterable of FeatureSets.
+    :return: a dictionary, where the keys are names of sets and the values are python sets of feature indices.
+    """
+    if isinstance(feature_sets, dict):
+        items = list(feature_sets.items())
+    else:
+        assert isinstance(feature_sets, (list, tuple, set)), \
+            f"'feature_sets' must be a dictionary or an iterable of FeatureSets. Instead got {type(feature_sets)}"
+        items = [(obj.set_name if isinstance(obj, FeatureSet) and obj.set_name != '' else f'set {i}', obj) for i, obj
+                 in enumerate(feature_sets)]
+    parsed = {}
+    for name, obj in items:
+        assert name not in parsed, f"Duplicate set name '{name}'. All sets must have unique names. "
+        if isinstance(obj, FeatureSet):
+            parsed[name] = obj.gene_set
+        elif issubclass(obj.__class__, filtering.Filter):
+            parsed[name] = obj.index_set
+        elif isinstance(obj, (set, list, tuple)):
+            parsed[name] = set(obj)
+        else:
+            raise TypeError(f"Invalid type for set '{name}': {type(obj)}")
+    return parsed
+
+
+def _randomization_pvals(n: int, obs: np.ndarray, attr_matrix: np.ndarray, reps: int, random_seed=None):
+    """
+    Calculates randomization p-values of a single enrichment set for all attributes at once. \
+    Every repetition draws 'n' random background features (without replacement), \
+    and the number of drawn features belonging to each attribute is compared to the observed number.
+
+    :param n: size of the enrichment set.
+    :param obs: a 1D numpy array of the observed number of enrichment set features belonging to each attribute.
+    :param attr_matrix: a boolean numpy array of shape (background features, attributes).
+    :param reps: number of randomization repetitions.
+    :param random_seed: seed or numpy.random.SeedSequence for the random number generator.
+    :return: a 1D numpy array of p-values, calculated with the formula p = (successes + 1)/(repeats + 1).
+    """
+    rng = np.random.default_rng(random_seed)
+    bg_size = attr_matrix.shape[0]
+    expected = n * attr_matrix.sum(axis=0) / bg_size
+    is_enriched = obs >= expected
+    attr_int = attr_matrix.astype(np.int32)
+    # limit both the random numbers drawn and the gathered attribute matrix to ~2^22 elements per chunk
+    chunk_elements = bg_size * max(1, 2 ** 22 // max(bg_size, n * attr_matrix.shape[1]))
+    success = np.zeros(attr_matrix.shape[1], dtype=np.int64)
+    for idx in general._random_subsets(rng, bg_size, n, reps, chunk_elements):
+        rand_obs = attr_int[idx].sum(axis=1)
+        success += np.where(is_enriched, rand_obs >= obs, rand_obs <= obs).sum(axis=0)
+    return (success + 1) / (reps + 1)
+
+
+@general._profiled
+def enrich_many(feature_sets: Union[Dict[str, Union[FeatureSet, Set[str]]], Iterable[FeatureSet]],
+                attributes: Union[Iterable[str], str, Iterable[int], int] = 'all', fdr: float = 0.05,
+                method: str = 'hypergeometric', reps: int = 10000, biotype: str = 'protein_coding',
+                background_genes=None, attr_ref_path: str = 'predefined', biotype_ref_path: str = 'predefined',
+                random_seed: int = None, parallel: bool = False, save_csv: bool = False, fname=None) -> pd.DataFrame:
+    """
+    Calculates enrichment scores, p-values and adjusted p-values \
+    for enrichment and depletion of selected attributes from an Attribute Reference Table, \
+    for multiple FeatureSets against the same background set. \
+    The background set and the attribute table are only loaded and built once, \
+    and all sets are scored together, which makes this function much faster than calling \
+    FeatureSet.enrich_hypergeometric or FeatureSet.enrich_randomization for every FeatureSet separately. \
+    No plots are generated. \
+    P-values are corrected for multiple comparisons separately for every set, using \
+    the Benjamini–Hochberg step-up procedure (original FDR method).
+
+    :type feature_sets: dict or iterable of FeatureSets
+    :param feature_sets: the sets to calculate enrichment for. Either a dictionary where the keys are \
+    the names of the sets and the values are FeatureSets, python sets of feature indices or Filter objects; \
+    or an iterable of FeatureSets, in which case their 'set_name' will be used as their name.
+    :type attributes: str, int, iterable (list, tuple, set, etc) of str/int, or 'all' (default 'all').
+    :param attributes: An iterable of attribute names or attribute numbers \
+    (according to their order in the Attribute Reference Table). \
+    If 'all', all of the attributes in the Attribute Reference Table will be used. \
+    If None, a manual input prompt will be raised.
+    :type fdr: float between 0 and 1
+    :param fdr: Indicates the FDR threshold for significance.
+    :type method: 'hypergeometric' or 'randomization' (default 'hypergeometric')
+    :param method: the statistical test used to calculate p-values.
+    :type reps: int larger than 0
+    :param reps: How many repetitions to run the randomization for, if method is 'randomization'. \
+    10,000 is the default. Recommended 10,000 or higher.
+    :type biotype: str specifying a specific biotype, list/set of strings each specifying a biotype, or 'all'. \
+    Default 'protein_coding'.
+    :param biotype: determines the background genes by their biotype. Requires specifying a Biotype Reference Table. \
+    'all' will include all genomic features in the reference table, \
+    'protein_coding' will include only protein-coding genes from the reference table, etc. \
+    Cannot be specified together with 'background_genes'.
+    :type background_genes: set of feature indices, filtering.Filter object, enrichment.FeatureSet object \
+    or enrichment.Background object
+    :param background_genes: a set of specific feature indices to be used as background genes. \
+    Cannot be specified together with 'biotype'. \
+    If an enrichment.Background object is given, the precomputed background will be used, \
+    and 'biotype', 'attr_ref_path' and 'biotype_ref_path' will be ignored.
+    :type attr_ref_path: str or pathlib.Path (default 'predefined')
+    :param attr_ref_path: the path of the Attribute Reference Table from which user-defined attributes will be drawn.
+    :type biotype_ref_path: str or pathlib.Path (default 'predefined')
+    :param biotype_ref_path: the path of the Biotype Reference Table. \
+    Will be used to generate background set if 'biotype' is specified.
+    :type random_seed: non-negative int (default None)
+    :param random_seed: if method is 'randomization', the random seed used to generate consistent results. \
+    If None and 'background_genes' is an enrichment.Background object, \
+    random seeds will be drawn from the random state of the Background.
+    :type parallel: bool (default False)
+    :param parallel: if True and method is 'randomization', the sets will be scored in parallel. \
+    To use it you must first start a parallel session, using rnalysis.general.start_parallel_session().
+    :type save_csv: bool, default False
+    :param save_csv: If True, will save the results to a .csv file, under the name specified in 'fname'.
+    :type fname: str or pathlib.Path
+    :param fname: The full path and name of the file to which to save the results. For example: \
+    r'C:\\dir\\file'. No '.csv' suffix is required. If None (default), fname will be requested in a manual prompt.
+    :rtype: pandas DataFrame
+    :return: a long-form pandas DataFrame with one row per set and attribute, with the columns 'set', 'name', \
+    'samples', 'n obs', 'n exp', 'log2_fold_enrichment', 'pval', 'padj' and 'significant'.
+
+    :Examples:
+        >>> from rnalysis import enrichment
+        >>> sets = {'first set': {'WBGene00000041', 'WBGene00002074'}, 'second set': {'WBGene00000105'}}
+        >>> res = enrichment.enrich_many(sets, ['attribute1', 'attribute2'], biotype='all',
+        ... attr_ref_path='tests/attr_ref_table_for_examples.csv')
+    """
+    assert method in ('hypergeometric', 'randomization'), \
+        f"'method' must be either 'hypergeometric' or 'randomization'. Instead got '{method}'"
+    general._assert_random_seed(random_seed)
+    feature_sets = _parse_feature_sets(feature_sets)
+    background = Background._parse(biotype=biotype, background_genes=background_genes,
+                                   attr_ref_path=attr_ref_path, biotype_ref_path=biotype_ref_path)
+    attr_ref_df = background.attr_ref_df
+    attributes = FeatureSet._enrichment_get_attrs(attributes=attributes, attr_ref_path=background.attr_ref_path)
+    for attribute in attributes:
+        assert isinstance(attribute, str), f"Error in attribute {attribute}: attributes must be strings!"
+
+    attr_matrix = background.attr_matrix(attributes)
+    names = []
+    membership = []
+    for name, gene_set in feature_sets.items():
+        in_bg = attr_ref_df.index.isin(list(gene_set))
+        n_in_bg = int(in_bg.sum())
+        if n_in_bg == 0:
+            warnings.warn(f"None of the genes in the set '{name}' appear in the background genes. "
+                          f"The set '{name}' is ignored. ")
+            continue
+        if n_in_bg < len(gene_set):
+            warnings.warn(f"{len(gene_set) - n_in_bg} genes in the set '{name}' do not appear in the background "
+                          f"genes. \nEnrichment will be run on the remaining {n_in_bg}.")
+        names.append(name)
+        membership.append(in_bg)
+    assert len(names) > 0, "None of the given sets have any genes in the background set!"
+    membership = np.vstack(membership)
+
+    bg_size = len(background)
+    go_size = background.attr_counts[attributes].values
+    n = membership.sum(axis=1)
+    obs = membership.astype(np.int64) @ attr_matrix.astype(np.int64)
+    expected_fraction = go_size / bg_size
+    with np.errstate(divide='ignore'):
+        log2_fold_enrichment = np.log2((obs / n[:, np.newaxis]) / expected_fraction)
+
+    if method == 'hypergeometric':
+        pvals = FeatureSet._calc_hypergeometric_pval(bg_size=bg_size, go_size=go_size[np.newaxis, :],
+                                                     de_size=n[:, np.newaxis], go_de_size=obs)
+    else:
+        k = len(names)
+        seeds = background._spawn_seeds(k) if random_seed is None else general._spawn_seeds(random_seed, k)
+        if parallel:
+            from ipyparallel import Client
+            dview = Client()[:]
+            res = dview.map(_randomization_pvals, list(n), list(obs), list(repeat(attr_matrix, k)),
+                            list(repeat(reps, k)), seeds)
+            pvals = np.vstack(res.result())
+        else:
+            pvals = np.vstack([_randomization_pvals(n[i], obs[i], attr_matrix, reps, seeds[i]) for i in range(k)])
+
+    n_attrs = len(attributes)
+    res_df = pd.DataFrame({'set': np.repeat(names, n_attrs), 'name': np.tile(attributes, len(names)),
+                           'samples': np.repeat(n, n_attrs), 'n obs': obs.ravel(),
+                           'n exp': (n[:, np.newaxis] * expected_fraction).ravel(),
+                           'log2_fold_enrichment': log2_fold_enrichment.ravel(), 'pval': pvals.ravel()})
+    padj = np.empty_like(pvals, dtype=float)
+    significant = np.empty_like(pvals, dtype=bool)
+    from statsmodels.stats import multitest
+    for i in range(len(names)):
+        significant[i], padj[i] = multitest.fdrcorrection(pvals[i], alpha=fdr)
+    res_df['padj'] = padj.ravel()
+    res_df['significant'] = significant.ravel()
+
+    if save_csv:
+        FeatureSet._enrichment_save_csv(res_df, fname)
+    return res_df
 
 
 def _fetch_sets(objs: dict, ref: str = 'predefined'):
@@ -926,7 +1349,8 @@ def _fetch_sets(objs: dict, ref: str = 'predefined'):
                 attr_table
             except NameError:
                 pth = general._get_attr_ref_path(ref)
-                attr_table = general.load_csv(pth, 0)
+                attrs = [val for val in objs.values() if isinstance(val, str)]
+                attr_table = general.load_csv(pth, 0, dtype='compact', usecols=[0] + attrs)
             attr = objs[obj]
             myset = set(attr_table[attr].loc[attr_table[attr].notna()].index)
             objs[obj] = myset
@@ -935,6 +1359,7 @@ def _fetch_sets(objs: dict, ref: str = 'predefined'):
     return objs
 
 
+@general._profiled
 def upset_plot(objs: Dict[str, Union[str, FeatureSet, Set[str]]], title: str = '', ref: str = 'predefined'):
     """
     Generate an UpSet plot of 2 or more sets, FeatureSets or attributes from the Attribute Reference Table.
@@ -959,13 +1384,17 @@ def upset_plot(objs: Dict[str, Union[str, FeatureSet, Set[str]]], title: str = '
 
            Example plot of upset_plot()
     """
+    import matplotlib.pyplot as plt
+    import upsetplot as upset
 
     upset_df = _generate_upset_srs(_fetch_sets(objs=objs, ref=ref))
     upsetplot = upset.plot(upset_df)
     plt.title(title)
+    general._show_figures('upset_plot', show=False)
     return upsetplot
 
 
+@general._profiled
 def venn_diagram(objs: Dict[str, Union[str, FeatureSet, Set[str]]], title: str = 'default', ref: str = 'predefined',
                  set_colors: tuple = ('r', 'g', 'b'),
                  alpha: float = 0.4, weighted: bool = True, lines: bool = True, linecolor: str = 'black',
@@ -1009,6 +1438,8 @@ def venn_diagram(objs: Dict[str, Union[str, FeatureSet, Set[str]]], title: str =
 
            Example plot of venn_diagram()
     """
+    import matplotlib.pyplot as plt
+    import matplotlib_venn as vn
     if len(objs) > 3 or len(objs) < 2:
         raise ValueError(f'Venn can only accept between 2 and 3 sets. Instead got {len(objs)}')
     assert isinstance(title, str), f'Title must be a string. Instead got {type(title)}'
@@ -1034,6 +1465,7 @@ def venn_diagram(objs: Dict[str, Union[str, FeatureSet, Set[str]]], title: str =
     if title == 'default':
         title = 'Venn diagram of ' + ''.join([name + ' ' for name in objs.keys()])
     plt.title(title)
+    general._show_figures('venn_diagram', show=False)
     return plot_obj, circle_obj
 
 
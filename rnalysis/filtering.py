@@ -15,15 +15,14 @@ import pandas as pd
 from pathlib import Path
 import warnings
 import os
+import logging
 from rnalysis import general
-from sklearn.decomposition import PCA
-from sklearn.preprocessing import StandardScaler
-import seaborn as sns
-import matplotlib.pyplot as plt
-from grid_strategy import strategies
 from typing import Union, List, Set, Dict, Tuple
 
+_LOGGER = logging.getLogger(__name__)
 
+
+@general._profile_methods('__init__', '_inplace')
 class Filter:
     """
     An all-purpose Filter.
@@ -50,14 +49,23 @@ class Filter:
     __slots__ = {'fname': 'filename with full path', 'df': 'pandas.DataFrame with the data', 'shape': '(rows, columns)',
                  'columns': 'list of column names'}
 
-    def __init__(self, fname: Union[str, Path], drop_columns: Union[str, List[str]] = False):
+    def __init__(self, fname: Union[str, Path], drop_columns: Union[str, List[str]] = False,
+                 dtype: Union[str, type, dict] = None):
 
         """
-        :param fname: full path/filename of the .csv file to be loaded into the Filter object
+        :param fname: full path/filename of the .csv file to be loaded into the Filter object. \
+        The file can be compressed with gzip ('.gz'), bzip2 ('.bz2'), xz ('.xz') or zstd ('.zst'), \
+        in which case the compression suffix is removed from the file name used to save the Filter object.
         :type fname: Union[str, Path]
         :param drop_columns: if a string or list of strings are specified, \
         the columns of the same name/s will be dropped from the loaded DataFrame.
         :type drop_columns: str, list of str, or False (default False)
+        :param dtype: the data types of the loaded columns. If None, the types will be inferred by pandas. \
+        If 'compact', counts will be stored as uint32 and repeating labels as 'category', \
+        and floating point columns will be stored as float32 when this does not round them \
+        (see general.compact_dtypes), which reduces the memory footprint of the Filter object. \
+        Otherwise, the value is passed on to pandas.read_csv.
+        :type dtype: 'compact', a type, dict of column names and types, or None (default None)
 
         :Examples:
             >>> from rnalysis import filtering
@@ -70,8 +78,8 @@ class Filter:
             self.df = fname[1]
         else:
             assert isinstance(fname, (str, Path))
-            self.fname = Path(fname)
-            self.df = general.load_csv(fname, 0, squeeze=True, drop_columns=drop_columns)
+            self.fname = general._strip_compression_suffix(fname)
+            self.df = general.load_csv(fname, 0, squeeze=True, drop_columns=drop_columns, dtype=dtype)
         if self.df.index.has_duplicates:
             warnings.warn("This Filter object contains multiple rows with the same WBGene index.")
         self.shape = self.df.shape
@@ -89,6 +97,35 @@ class Filter:
         """
         return type(self)((self.fname, self.df.copy(deep=True)))
 
+    def memory_usage(self) -> pd.DataFrame:
+
+        """
+        Returns a report of the memory used by the Filter object, broken down by the columns of its DataFrame. \
+        The memory used by text columns includes the memory of the strings themselves.
+
+        :return: a DataFrame with the data type and memory usage (in bytes) of the index and of every column, \
+        and a 'Total' row.
+        :rtype: pandas DataFrame
+
+        :Examples:
+            >>> from rnalysis import filtering
+            >>> c = filtering.CountFilter('tests/counted.csv', dtype='compact')
+            >>> c.memory_usage().loc['Total', 'bytes']
+            1914
+
+        """
+        if isinstance(self.df, pd.Series):
+            usage = pd.Series({'Index': self.df.index.memory_usage(deep=True),
+                               self.df.name: self.df.memory_usage(deep=True, index=False)})
+            dtypes = pd.Series({'Index': self.df.index.dtype, self.df.name: self.df.dtype})
+        else:
+            usage = self.df.memory_usage(deep=True)
+            dtypes = pd.concat([pd.Series({'Index': self.df.index.dtype}), self.df.dtypes])
+        report = pd.DataFrame({'dtype': dtypes.astype(str), 'bytes': usage})
+        report.loc['Total'] = ['', usage.sum()]
+        report['bytes'] = report['bytes'].astype(int)
+        return report
+
     def _inplace(self, new_df: pd.DataFrame, opposite: bool, inplace: bool, suffix: str,
                  printout_operation: str = 'filter'):
 
@@ -112,26 +149,19 @@ class Filter:
 
         new_fname = Path(f"{str(self.fname.parent)}\\{self.fname.stem}{suffix}{self.fname.suffix}")
 
-        printout = ''
-        if printout_operation.lower() == 'filter':
-            printout += f"Filtered {self.df.shape[0] - new_df.shape[0]} features, leaving {new_df.shape[0]} " \
-                        f"of the original {self.df.shape[0]} features. "
-        elif printout_operation.lower() == 'normalize':
-            printout += f"Normalized the values of {new_df.shape[0]} features. "
-        if inplace:
+        if _LOGGER.isEnabledFor(logging.INFO):
             if printout_operation.lower() == 'filter':
-                printout += 'Filtered inplace.'
-            elif printout_operation.lower() == 'normalize':
-                printout += 'Normalized inplace.'
-            print(printout)
+                printout = f"Filtered {self.df.shape[0] - new_df.shape[0]} features, leaving {new_df.shape[0]} " \
+                           f"of the original {self.df.shape[0]} features. "
+                printout += 'Filtered inplace.' if inplace else 'Filtering result saved to new object.'
+            else:
+                printout = f"Normalized the values of {new_df.shape[0]} features. "
+                printout += 'Normalized inplace.' if inplace else 'Normalization result saved to a new object.'
+            _LOGGER.info(printout)
+        if inplace:
             self.df, self.fname = new_df, new_fname
             self.shape = self.df.shape
         else:
-            if printout_operation.lower() == 'filter':
-                printout += 'Filtering result saved to new object.'
-            elif printout_operation.lower() == 'normalize':
-                printout += 'Normalization result saved to a new object.'
-            print(printout)
             tmp_df, tmp_fname = self.df, self.fname
             self.df, self.fname = new_df, new_fname
             new_obj = self.__copy__()
@@ -155,6 +185,91 @@ class Filter:
             alt_filename = f"{str(self.fname.parent)}\\{alt_filename}{self.fname.suffix}"
         general.save_to_csv(self.df, alt_filename)
 
+    def save(self, fname: Union[str, Path] = None, file_format: str = 'parquet',
+             compression: Union[str, None] = 'default') -> Path:
+
+        """
+        Saves the current filtered data to a binary columnar file, which keeps the data types of the table \
+        and is much faster to read and write than a .csv file. \
+        The type of the Filter object, its file name, and metadata such as the numerator and denominator \
+        of a FoldChangeFilter or the experimental design of a CountFilter are saved as well, \
+        and are restored by Filter.load(). \
+        Requires the optional package 'pyarrow' for 'parquet' and 'feather' files, and 'tables' for 'hdf5' files.
+
+        :param fname: the path of the saved file. If None, the file name will be generated automatically \
+        according to the filtering methods used. \
+        The suffix of the format ('.parquet', '.feather' or '.h5') will be added if it is missing.
+        :type fname: str, pathlib.Path, or None (default None)
+        :param file_format: the file format to save in.
+        :type file_format: 'parquet', 'feather' or 'hdf5' (default 'parquet')
+        :param compression: the compression codec. If 'default', 'snappy' is used for parquet files, \
+        'lz4' for feather files and 'zlib' for hdf5 files. If None, the file will not be compressed.
+        :type compression: str, 'default' or None (default 'default')
+        :return: the path of the saved file.
+        :rtype: pathlib.Path
+
+        :Examples:
+            >>> from rnalysis import filtering
+            >>> c = filtering.CountFilter('tests/counted.csv')
+            >>> path = c.save('tests/counted', file_format='feather')
+            >>> c_loaded = filtering.Filter.load(path)
+
+        """
+        if fname is None:
+            fname = Path(self.fname).with_suffix('')
+        metadata = dict(filter_class=type(self).__name__, fname=str(self.fname), **self._save_metadata())
+        return general.save_table(self.df, fname, file_format=file_format, compression=compression, metadata=metadata)
+
+    @staticmethod
+    def load(fname: Union[str, Path], columns: List[str] = None, memory_map: bool = False):
+
+        """
+        Loads a Filter object saved by Filter.save(). \
+        The loaded object will be of the same type as the saved one (for example, a CountFilter), \
+        and will keep its original file name and metadata. Static class method.
+
+        :param fname: the path of the saved file. The file format is inferred from its suffix.
+        :type fname: str or pathlib.Path
+        :param columns: optional. If specified, only these columns will be loaded.
+        :type columns: list of str or None (default None)
+        :param memory_map: if True, parquet and feather files will be read through a memory map. \
+        Uncompressed feather files are then used without being copied into memory first. \
+        Ignored for hdf5 files.
+        :type memory_map: bool (default False)
+        :return: the loaded Filter object.
+
+        :Examples:
+            >>> from rnalysis import filtering
+            >>> c = filtering.Filter.load('tests/counted.feather', columns=['cond1', 'cond2'])
+
+        """
+        df, metadata = general.load_table(fname, columns=columns, memory_map=memory_map)
+        filter_class = globals().get(metadata.pop('filter_class', 'Filter'))
+        assert isinstance(filter_class, type) and issubclass(filter_class, Filter), \
+            f"The file '{fname}' does not contain a valid Filter object!"
+        return filter_class._load_from_metadata(Path(metadata.pop('fname', fname)), df, metadata)
+
+    def _save_metadata(self) -> dict:
+
+        """
+        Internal method, returns the metadata required to restore the Filter object after Filter.save().
+
+        :rtype: dict
+        """
+        return {}
+
+    @classmethod
+    def _load_from_metadata(cls, fname: Path, df: Union[pd.DataFrame, pd.Series], metadata: dict):
+
+        """
+        Internal method, creates a Filter object from a loaded table and the metadata saved by Filter.save().
+
+        :param fname: the file name of the Filter object.
+        :param df: the loaded table.
+        :param metadata: the metadata returned by _save_metadata().
+        """
+        return cls((fname, df))
+
     @staticmethod
     def _color_gen():
 
@@ -173,6 +288,31 @@ class Filter:
         while True:
             yield np.random.random(3)
 
+    @staticmethod
+    def _density_scatter(ax, xvals: np.ndarray, yvals: np.ndarray, bins: int = 256, cmap: str = 'Greys'):
+
+        """
+        Draws the density of a large number of points on a matplotlib axis as a single raster image, \
+        by binning them into a 2D histogram and rendering it with imshow. \
+        Unlike a scatter plot, the time it takes to render and the size of the saved figure \
+        do not depend on the number of points. Non-finite points are ignored.
+
+        :param ax: the matplotlib axis to draw on.
+        :param xvals: x values of the points.
+        :param yvals: y values of the points.
+        :param bins: number of bins along each axis.
+        :param cmap: name of the matplotlib colormap to color the density with. Empty bins are left blank.
+        :return: the matplotlib AxesImage that was drawn, or None if there were no finite points to draw.
+        """
+        from matplotlib.colors import LogNorm
+        finite = np.isfinite(xvals) & np.isfinite(yvals)
+        if not finite.any():
+            return None
+        hist, xedges, yedges = np.histogram2d(xvals[finite], yvals[finite], bins=bins)
+        return ax.imshow(np.ma.masked_equal(hist.T, 0), origin='lower', aspect='auto', interpolation='nearest',
+                         extent=(xedges[0], xedges[-1], yedges[0], yedges[-1]), cmap=cmap,
+                         norm=LogNorm(vmin=1, vmax=max(hist.max(), 1)))
+
     @staticmethod
     def _from_string(msg: str = '', delimiter: str = '\n'):
 
@@ -372,7 +512,7 @@ class Filter:
             biotype = [biotype]
 
         ref = general._get_biotype_ref_path(ref)
-        ref_df = general.load_csv(ref)
+        ref_df = general.load_csv(ref, dtype='compact')
         general._biotype_table_assertions(ref_df)
         ref_df.set_index('gene', inplace=True)
         ref_df.columns = ref_df.columns.str.lower()
@@ -463,7 +603,7 @@ class Filter:
             assert isinstance(attributes, (list, tuple, set))
         assert isinstance(mode, str), "'mode' must be a string!"
         ref = general._get_attr_ref_path(ref)
-        attr_ref_table = general.load_csv(ref)
+        attr_ref_table = general.load_csv(ref, dtype='compact', usecols=[0] + list(attributes))
         general._attr_table_assertions(attr_ref_table)
         attr_ref_table.set_index('gene', inplace=True)
         sep_idx = [attr_ref_table[attr_ref_table[attr].notnull()].index for attr in attributes]
@@ -714,7 +854,7 @@ class Filter:
 
         """
         ref = general._get_biotype_ref_path(ref)
-        ref_df = general.load_csv(ref)
+        ref_df = general.load_csv(ref, dtype='compact')
         general._biotype_table_assertions(ref_df)
         ref_df.columns = ref_df.columns.str.lower()
         not_in_ref = self.df.index.difference(ref_df['gene'])
@@ -723,11 +863,12 @@ class Filter:
                 f'{len(not_in_ref)} of the features in the Filter object do not appear in the Biotype Reference Table. ')
             ref_df = ref_df.append(pd.DataFrame({'gene': not_in_ref, 'biotype': 'not_in_biotype_reference'}))
         if return_format == 'short':
-            return ref_df.set_index('gene', drop=False).loc[self.df.index].groupby('biotype').count()
+            return ref_df.set_index('gene', drop=False).loc[self.df.index].groupby('biotype',
+                                                                                   observed=True).count()
         elif return_format == 'long':
             self_df = self.df.__deepcopy__()
             self_df['biotype'] = ref_df.set_index('gene').loc[self.df.index]
-            return self_df.groupby('biotype').describe()
+            return self_df.groupby('biotype', observed=True).describe()
 
         else:
             raise ValueError(f'Invalid format "{return_format}"')
@@ -1125,6 +1266,7 @@ class Filter:
         return self._set_ops([other], return_type, set.symmetric_difference)
 
 
+@general._profile_methods('__init__')
 class FoldChangeFilter(Filter):
     """
     A class that contains a single column, representing the gene-specific fold change between two conditions. \
@@ -1157,8 +1299,9 @@ class FoldChangeFilter(Filter):
     """
     __slots__ = {'numerator': 'name of the numerator', 'denominator': 'name of the denominator'}
 
-    def __init__(self, fname: Union[str, Path], numerator_name: str, denominator_name: str):
-        super().__init__(fname)
+    def __init__(self, fname: Union[str, Path], numerator_name: str, denominator_name: str,
+                 dtype: Union[str, type, dict] = None):
+        super().__init__(fname, dtype=dtype)
         self.numerator = numerator_name
         self.denominator = denominator_name
         self.df.name = 'Fold Change'
@@ -1171,7 +1314,15 @@ class FoldChangeFilter(Filter):
         return type(self)((self.fname, self.df.copy(deep=True)), numerator_name=self.numerator,
                           denominator_name=self.denominator)
 
-    def randomization_test(self, ref, alpha: float = 0.05, reps=10000, save_csv: bool = False, fname=None):
+    def _save_metadata(self) -> dict:
+        return dict(numerator=self.numerator, denominator=self.denominator)
+
+    @classmethod
+    def _load_from_metadata(cls, fname: Path, df: Union[pd.DataFrame, pd.Series], metadata: dict):
+        return cls((fname, df), numerator_name=metadata['numerator'], denominator_name=metadata['denominator'])
+
+    def randomization_test(self, ref, alpha: float = 0.05, reps=10000, save_csv: bool = False, fname=None,
+                           random_seed: int = None):
 
         """
         Perform a randomization test to examine whether the fold change of a group of specific genomic features \
@@ -1179,7 +1330,8 @@ class FoldChangeFilter(Filter):
 
         :type ref: FoldChangeFilter
         :param ref: A reference FoldChangeFilter object which contains the fold change for every reference gene. \
-        Will be used to calculate the expected score and to perform randomizations.
+        Will be used to calculate the expected score and to perform randomizations. \
+        Missing (NaN) fold changes are skipped when averaging the randomly drawn reference genes.
         :type alpha: float between 0 and 1
         :param alpha: Indicates the threshold for significance (alpha).
         :type reps: int larger than 0
@@ -1190,6 +1342,8 @@ class FoldChangeFilter(Filter):
         :type fname: str or pathlib.Path
         :param fname: The full path and name of the file to which to save the results. For example: \
         r'C:\dir\file'. No '.csv' suffix is required. If None (default), fname will be requested in a manual prompt.
+        :type random_seed: non-negative int (default None)
+        :param random_seed: the random seed used to generate consistent results.
         :rtype: pandas DataFrame
         :return: A Dataframe with the number of given genes, the observed fold change for the given group of genes, \
         the expected fold change for a group of genes of that size and the p value for the comparison.
@@ -1211,26 +1365,27 @@ class FoldChangeFilter(Filter):
 
         """
 
+        general._assert_random_seed(random_seed)
         obs_fc = self.df.mean(axis=0)
-        ref_df = pd.DataFrame(ref.df.__copy__(deep=True))
-        # exp_fc = ref_df['Fold Change'].mean(axis=0)
+        ref_values = ref.df.values
         n = self.df.shape[0]
-
-        ref_df['int_index'] = [int(i[6:14]) for i in ref_df.index]
-
-        srs_int = (ref_df.set_index('int_index', inplace=False))['Fold Change']
-
-        print('Calculating...')
-        rand = [srs_int[np.random.choice(srs_int.index, n, replace=False)].mean(axis=0) for _ in range(reps)]
-        exp_fc = np.mean(rand)
+        rng = np.random.default_rng(random_seed)
+
+        # like pandas' mean, skip missing fold changes. np.nanmean is slower, so it is only used when needed
+        mean = np.nanmean if np.isnan(ref_values).any() else np.mean
+        progress = general._Progress(reps, 'Randomization test')
+        rand = []
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            for idx in general._random_subsets(rng, ref_values.shape[0], n, reps):
+                rand.append(mean(ref_values[idx], axis=1))
+                progress.update(idx.shape[0])
+        rand = np.concatenate(rand)
+        exp_fc = np.nanmean(rand)
         if obs_fc > exp_fc:
-            success = sum(r >= obs_fc for r in rand)
+            success = np.sum(rand >= obs_fc)
         else:
-            success = sum(r <= obs_fc for r in rand)
-
-        # success = sum((srs_int[np.random.choice(srs_int.index, n, replace=False)].mean(
-        #     axis=0) >= obs_fc if obs_fc > exp_fc else srs_int[np.random.choice(srs_int.index, n, replace=False)].mean(
-        #     axis=0) <= obs_fc for _ in range(reps)))
+            success = np.sum(rand <= obs_fc)
 
         pval = (success + 1) / (reps + 1)
         res = [[n, obs_fc, exp_fc, pval]]
@@ -1240,7 +1395,8 @@ class FoldChangeFilter(Filter):
         res_df['significant'] = pval <= alpha
         if save_csv:
             general.save_to_csv(res_df, fname)
-        print(res_df)
+        if _LOGGER.isEnabledFor(logging.INFO):
+            _LOGGER.info(res_df.to_string())
 
         return res_df
 
@@ -1350,6 +1506,7 @@ class FoldChangeFilter(Filter):
             direction='neg', inplace=False)
 
 
+@general._profile_methods()
 class DESeqFilter(Filter):
     """
     A class that receives a DESeq output file and can filter it according to various characteristics.
@@ -1506,7 +1663,7 @@ class DESeqFilter(Filter):
         return self.filter_fold_change_direction(direction='pos', inplace=False), self.filter_fold_change_direction(
             direction='neg', inplace=False)
 
-    def volcano_plot(self, alpha: float = 0.1):
+    def volcano_plot(self, alpha: float = 0.1, density: bool = False, bins: int = 256):
 
         """
         Plots a volcano plot (log2(fold change) vs -log10(adj. p-value)) of the DESeqFilter object. \
@@ -1515,6 +1672,13 @@ class DESeqFilter(Filter):
 
         :type alpha: float between 0 and 1
         :param alpha: the significance threshold to color data points as significantly up/down-regulated.
+        :type density: bool (default False)
+        :param density: if True, the non-significant features will be drawn as a single density image \
+        (a 2D histogram) instead of individual points, while significant features are still drawn as points. \
+        Recommended for very large tables, since the time it takes to render the plot and the size of the saved \
+        figure will no longer grow with the number of features.
+        :type bins: positive int (default 256)
+        :param bins: number of bins along each axis of the density image, if density is True.
 
         .. figure::  volcano.png
            :align:   center
@@ -1523,19 +1687,172 @@ class DESeqFilter(Filter):
            Example plot of volcano_plot()
 
         """
+        import matplotlib.pyplot as plt
         plt.figure()
         plt.style.use('seaborn-white')
-        colors = pd.Series(index=self.df.index)
-        colors.loc[(self.df['padj'] <= alpha) & (self.df['log2FoldChange'] > 0)] = 'tab:red'
-        colors.loc[(self.df['padj'] <= alpha) & (self.df['log2FoldChange'] < 0)] = 'tab:blue'
-        colors.fillna('grey', inplace=True)
-        plt.scatter(self.df['log2FoldChange'], -np.log10(self.df['padj']), c=colors, s=1)
+        log2fc = self.df['log2FoldChange'].values
+        neg_log_padj = -np.log10(self.df['padj'].values)
+        significant = self.df['padj'].values <= alpha
+        colors = np.select([significant & (log2fc > 0), significant & (log2fc < 0)], ['tab:red', 'tab:blue'], 'grey')
+        if density:
+            not_colored = colors == 'grey'
+            self._density_scatter(plt.gca(), log2fc[not_colored], neg_log_padj[not_colored], bins=bins)
+            plt.scatter(log2fc[~not_colored], neg_log_padj[~not_colored], c=colors[~not_colored], s=1)
+        else:
+            plt.scatter(log2fc, neg_log_padj, c=colors, s=1)
         plt.title(f"Volcano plot of {self.fname.stem}", fontsize=18)
         plt.xlabel('Log2(fold change)', fontsize=15)
         plt.ylabel('-Log10(adj. p-value)', fontsize=15)
-        plt.show()
+        general._show_figures('volcano_plot')
 
 
+class SampleSheet:
+    """
+    An experimental design, which assigns every sample (column) of a CountFilter to a condition and a replicate. \
+    The samples of every condition are precomputed once, so that group-wise operations \
+    (averaging, fold change, plotting) do not need to rebuild lists of columns on every call.
+
+    **Attributes**
+
+    samples: list
+        The names of the samples.
+    conditions: list
+        The condition of every sample.
+    replicates: list
+        The replicate name/number of every sample.
+    groups: dict
+        A dictionary where the keys are the names of the conditions (by order of appearance), \
+        and the values are lists of the samples belonging to each condition.
+    """
+    __slots__ = {'samples': 'names of the samples', 'conditions': 'condition of every sample',
+                 'replicates': 'replicate of every sample', 'groups': 'dict of condition: samples',
+                 '_indices_cache': 'group index arrays, by the columns they were computed for'}
+
+    def __init__(self, samples: List[str], conditions: List[str], replicates: list = None):
+
+        """
+        :param samples: the names of the samples.
+        :type samples: list of str
+        :param conditions: the condition of every sample.
+        :type conditions: list of str, the same length as 'samples'
+        :param replicates: the replicate name/number of every sample. \
+        If None, the samples of every condition will be numbered by their order, starting from 1.
+        :type replicates: list, the same length as 'samples', or None (default None)
+
+        :Examples:
+            >>> from rnalysis import filtering
+            >>> design = filtering.SampleSheet(['cond1_rep1', 'cond1_rep2', 'cond2_rep1', 'cond2_rep2'],
+            ... ['cond1', 'cond1', 'cond2', 'cond2'])
+            >>> design.groups
+            {'cond1': ['cond1_rep1', 'cond1_rep2'], 'cond2': ['cond2_rep1', 'cond2_rep2']}
+
+        """
+        samples, conditions = list(samples), list(conditions)
+        assert len(samples) == len(conditions), "'samples' and 'conditions' must be of the same length!"
+        assert len(set(samples)) == len(samples), "Sample names must be unique!"
+        self.samples = samples
+        self.conditions = conditions
+        self.groups = {}
+        for sample, condition in zip(samples, conditions):
+            self.groups.setdefault(condition, []).append(sample)
+        if replicates is None:
+            counters = {}
+            replicates = []
+            for condition in conditions:
+                counters[condition] = counters.get(condition, 0) + 1
+                replicates.append(counters[condition])
+        else:
+            replicates = list(replicates)
+            assert len(replicates) == len(samples), "'samples' and 'replicates' must be of the same length!"
+        self.replicates = replicates
+        self._indices_cache = {}
+
+    def __repr__(self):
+        return f"SampleSheet: {len(self.samples)} samples in {len(self.groups)} conditions"
+
+    def __len__(self):
+        return len(self.samples)
+
+    @classmethod
+    def from_dict(cls, groups: Dict[str, List[str]]):
+
+        """
+        Creates a SampleSheet from a dictionary of conditions and their samples.
+
+        :param groups: a dictionary where the keys are the names of the conditions, \
+        and the values are lists of the samples belonging to each condition.
+        :type groups: dict
+        :rtype: SampleSheet
+
+        :Examples:
+            >>> from rnalysis import filtering
+            >>> design = filtering.SampleSheet.from_dict({'cond1': ['cond1_rep1', 'cond1_rep2'],
+            ... 'cond2': ['cond2_rep1', 'cond2_rep2']})
+
+        """
+        assert isinstance(groups, dict), f"'groups' must be a dictionary. Instead got {type(groups)}"
+        samples = [sample for members in groups.values() for sample in members]
+        conditions = [condition for condition, members in groups.items() for _ in members]
+        return cls(samples, conditions)
+
+    @classmethod
+    def from_triplicates(cls, samples: List[str]):
+
+        """
+        Creates a SampleSheet where every three consecutive samples are replicates of the same condition. \
+        The conditions are named after their first sample.
+
+        :param samples: the names of the samples.
+        :type samples: list of str
+        :rtype: SampleSheet
+        """
+        samples = list(samples)
+        if len(samples) % 3 != 0:
+            warnings.warn(f'Number of samples {len(samples)} is not divisible by 3. '
+                          f'Appending the remaining {len(samples) % 3} as an incomplete triplicate')
+        conditions = [samples[i - i % 3] for i in range(len(samples))]
+        return cls(samples, conditions)
+
+    @classmethod
+    def from_csv(cls, fname: Union[str, Path]):
+
+        """
+        Loads a SampleSheet from a .csv file with the columns 'sample' and 'condition', \
+        and optionally a 'replicate' column.
+
+        :param fname: the path of the .csv file.
+        :type fname: str or pathlib.Path
+        :rtype: SampleSheet
+        """
+        df = general.load_csv(fname)
+        df.columns = df.columns.str.lower()
+        for col in ['sample', 'condition']:
+            assert col in df.columns, f"The sample sheet must contain a '{col}' column!"
+        replicates = df['replicate'].tolist() if 'replicate' in df.columns else None
+        return cls(df['sample'].tolist(), df['condition'].tolist(), replicates)
+
+    def group_indices(self, columns: List[str]) -> Dict[str, np.ndarray]:
+
+        """
+        Returns the column positions of the samples of every condition, for a table with the given columns. \
+        The result is computed once for every set of columns and cached.
+
+        :param columns: the columns of the table.
+        :type columns: list of str
+        :return: a dictionary where the keys are the names of the conditions, \
+        and the values are numpy arrays of column positions.
+        """
+        key = tuple(columns)
+        if key not in self._indices_cache:
+            positions = {column: i for i, column in enumerate(columns)}
+            missing = [sample for sample in self.samples if sample not in positions]
+            assert len(missing) == 0, f"The samples {missing} from the SampleSheet do not appear in the table!"
+            self._indices_cache[key] = {condition: np.array([positions[sample] for sample in members])
+                                        for condition, members in self.groups.items()}
+        return self._indices_cache[key]
+
+
+@general._profile_methods('__init__')
 class CountFilter(Filter):
     """
     A class that receives a count matrix and can filter it according to various characteristics.
@@ -1560,9 +1877,116 @@ class CountFilter(Filter):
     triplicates: list
         Returns a nested list of the column names in the CountFilter, grouped by alphabetical order into triplicates. \
         For example, if counts.columns is ['A_rep1','A_rep2','A_rep3','B_rep1','B_rep2',_B_rep3'], then \
-        counts.triplicates will be  [['A_rep1','A_rep2','A_rep3'],['B_rep1','B_rep2',_B_rep3']]
+        counts.triplicates will be  [['A_rep1','A_rep2','A_rep3'],['B_rep1','B_rep2',_B_rep3']]. \
+        If an experimental design was set, returns the samples of every condition instead.
+    design: SampleSheet or None
+        The experimental design of the CountFilter, if one was set.
 
     """
+    __slots__ = {'design': 'SampleSheet describing the experimental design'}
+
+    def __init__(self, fname: Union[str, Path], drop_columns: Union[str, List[str]] = False,
+                 design: Union['SampleSheet', Dict[str, List[str]], str, Path] = None,
+                 dtype: Union[str, type, dict] = None):
+
+        """
+        :param fname: full path/filename of the .csv file to be loaded into the Filter object
+        :type fname: Union[str, Path]
+        :param drop_columns: if a string or list of strings are specified, \
+        the columns of the same name/s will be dropped from the loaded DataFrame.
+        :type drop_columns: str, list of str, or False (default False)
+        :param design: optional. The experimental design of the CountFilter. See CountFilter.set_design.
+        :type design: SampleSheet, dict of conditions and their samples, path to a sample sheet .csv file, or None
+        :param dtype: the data types of the loaded columns. If 'compact', raw counts will be stored as uint32. \
+        See Filter.__init__.
+        :type dtype: 'compact', a type, dict of column names and types, or None (default None)
+
+        :Examples:
+            >>> from rnalysis import filtering
+            >>> c = filtering.CountFilter('tests/counted_fold_change.csv',
+            ... design={'cond1': ['cond1_rep1', 'cond1_rep2'], 'cond2': ['cond2_rep1', 'cond2_rep2']})
+
+        """
+        super().__init__(fname, drop_columns, dtype=dtype)
+        self.design = None
+        if design is not None:
+            self.set_design(design)
+
+    def __copy__(self):
+        # read-only memory-mapped values are shared between the copies instead of being read into memory
+        df = self.df.copy(deep=False) if self._memmap_file() is not None else self.df.copy(deep=True)
+        return type(self)((self.fname, df), design=self.design)
+
+    def _save_metadata(self) -> dict:
+        if self.design is None:
+            return dict(design=None)
+        return dict(design=dict(samples=self.design.samples, conditions=self.design.conditions,
+                                replicates=self.design.replicates))
+
+    @classmethod
+    def _load_from_metadata(cls, fname: Path, df: Union[pd.DataFrame, pd.Series], metadata: dict):
+        design = metadata.get('design')
+        if design is not None:
+            design = SampleSheet(**design)
+            missing = [sample for sample in design.samples if sample not in df.columns]
+            if len(missing) > 0:
+                warnings.warn(f"The samples {missing} of the saved experimental design were not loaded. "
+                              f"The experimental design will not be restored.")
+                design = None
+        return cls((fname, df), design=design)
+
+    def set_design(self, design: Union[SampleSheet, Dict[str, List[str]], str, Path]):
+
+        """
+        Sets the experimental design of the CountFilter, which assigns every sample to a condition. \
+        Once a design is set, conditions can be referred to by name in CountFilter.fold_change, \
+        and are used by default to group samples in CountFilter.pca and CountFilter.plot_expression.
+
+        :param design: the experimental design.
+        :type design: SampleSheet, dict of conditions and their samples (see SampleSheet.from_dict), \
+        or path to a sample sheet .csv file (see SampleSheet.from_csv)
+
+        :Examples:
+            >>> from rnalysis import filtering
+            >>> c = filtering.CountFilter('tests/counted_fold_change.csv')
+            >>> c.set_design({'cond1': ['cond1_rep1', 'cond1_rep2'], 'cond2': ['cond2_rep1', 'cond2_rep2']})
+
+        """
+        if isinstance(design, dict):
+            design = SampleSheet.from_dict(design)
+        elif isinstance(design, (str, Path)):
+            design = SampleSheet.from_csv(design)
+        assert isinstance(design, SampleSheet), f"Invalid type for 'design': {type(design)}"
+        design.group_indices(self.columns)
+        self.design = design
+
+    def _design_groups(self) -> Dict[str, np.ndarray]:
+
+        """
+        Internal method, returns the column positions of the samples of every condition in the experimental design.
+
+        :return: a dictionary where the keys are the names of the conditions, \
+        and the values are numpy arrays of column positions.
+        """
+        assert self.design is not None, "No experimental design was set for this CountFilter. " \
+                                        "Please set one using CountFilter.set_design()."
+        return self.design.group_indices(self.columns)
+
+    def condition_means(self) -> pd.DataFrame:
+
+        """
+        Computes the mean of every condition in the experimental design for all features at once.
+
+        :return: a pandas DataFrame with the same index as the CountFilter, and one column for every condition.
+
+        :Examples:
+            >>> from rnalysis import filtering
+            >>> c = filtering.CountFilter('tests/counted_fold_change.csv',
+            ... design={'cond1': ['cond1_rep1', 'cond1_rep2'], 'cond2': ['cond2_rep1', 'cond2_rep2']})
+            >>> means = c.condition_means()
+
+        """
+        return self._group_stat(self.df, self._design_groups(), 'mean')
 
     @property
     def triplicates(self):
@@ -1570,10 +1994,12 @@ class CountFilter(Filter):
         """
         Returns a nested list of the column names in the CountFilter, grouped by alphabetical order into triplicates. \
         For example, if counts.columns is ['A_rep1','A_rep2','A_rep3','B_rep1','B_rep2',_B_rep3'], then \
-        counts.triplicates will be  [['A_rep1','A_rep2','A_rep3'],['B_rep1','B_rep2',_B_rep3']]
+        counts.triplicates will be  [['A_rep1','A_rep2','A_rep3'],['B_rep1','B_rep2',_B_rep3']]. \
+        If an experimental design was set, returns the samples of every condition instead.
 
         """
-
+        if self.design is not None:
+            return list(self.design.groups.values())
         mltplr = 3
         triplicate = [self.columns[(i) * mltplr:(1 + i) * mltplr] for i in range(self.shape[1] // mltplr)]
         if len(self.columns[(self.shape[1] // mltplr) * mltplr::]) > 0:
@@ -1590,16 +2016,18 @@ class CountFilter(Filter):
 
         :type numerator: str, or list of strs
         :param numerator: the CountFilter columns to be used as the numerator. If multiple arguments are given \
-        in a list, they will be averaged.
+        in a list, they will be averaged. If an experimental design was set, \
+        this can also be the name of a condition from the design.
         :type denominator: str, or list of strs
         :param denominator: the CountFilter columns to be used as the denominator. If multiple arguments are given \
-        in a list, they will be averaged.
+        in a list, they will be averaged. If an experimental design was set, \
+        this can also be the name of a condition from the design.
         :type numer_name: str or 'default'
         :param numer_name: name to give the numerator condition. If 'default', the name will be generarated \
-        automatically from the names of numerator columns.
+        automatically from the names of numerator columns, or will be the name of the numerator condition.
         :type denom_name: str or 'default'
         :param denom_name: name to give the denominator condition. If 'default', the name will be generarated \
-        automatically from the names of denominator columns.
+        automatically from the names of denominator columns, or will be the name of the denominator condition.
         :rtype: FoldChangeFilter
         :return: A new instance of FoldChangeFilter
 
@@ -1617,26 +2045,12 @@ class CountFilter(Filter):
             rnalysis.filtering.FoldChangeFilter
 
         """
-        assert isinstance(numerator, (str, list, tuple)), "numerator must be a string or a list!"
-        assert isinstance(denominator, (str, list, tuple)), "denominator must be a string or a list!"
         assert isinstance(numer_name, str), "numerator name must be a string or 'default'!"
         assert isinstance(denom_name, str), "denominator name must be a string or 'default'!"
-        if isinstance(numerator, str):
-            numerator = [numerator]
-        elif isinstance(numerator, tuple):
-            numerator = list(numerator)
-        if isinstance(denominator, str):
-            denominator = [denominator]
-        elif isinstance(denominator, tuple):
-            denominator = list(denominator)
-        for num in numerator:
-            assert num in self.df, f"all numerator arguments must be columns in the CountFilter object! ({num})"
-
-        for den in denominator:
-            assert den in self.df, f"all denominator arguments must be columns in the CountFilter object! ({den})"
-        srs = (self.df[numerator].mean(axis=1) + 1) / (self.df[denominator].mean(axis=1) + 1)
-        numer_name = f"Mean of {numerator}" if numer_name == 'default' else numer_name
-        denom_name = f"Mean of {denominator}" if denom_name == 'default' else denom_name
+        numerator, numer_name = self._fold_change_condition(numerator, numer_name, 'numerator')
+        denominator, denom_name = self._fold_change_condition(denominator, denom_name, 'denominator')
+        means = self._group_stat(self.df, {'numerator': numerator, 'denominator': denominator}, 'mean')
+        srs = (means['numerator'] + 1) / (means['denominator'] + 1)
         new_fname = Path(f"{str(self.fname.parent)}\\{self.fname.stem}'_fold_change_'"
                          f"{numer_name}_over_{denom_name}_{self.fname.suffix}")
 
@@ -1644,7 +2058,282 @@ class CountFilter(Filter):
 
         return fcfilt
 
-        pass
+    def _fold_change_condition(self, condition, name: str, arg_name: str):
+
+        """
+        Internal method, resolves a numerator/denominator argument of fold_change into a list of columns and a name.
+
+        :param condition: a column name, a list of column names, \
+        or the name of a condition from the experimental design.
+        :param name: the name given to the condition, or 'default'.
+        :param arg_name: the name of the argument, used in error messages.
+        :return: a tuple of (list of column names, name of the condition).
+        """
+        assert isinstance(condition, (str, list, tuple)), f"{arg_name} must be a string or a list!"
+        if self.design is not None and isinstance(condition, str) and condition in self.design.groups \
+            and condition not in self.df:
+            return list(self.design.groups[condition]), condition if name == 'default' else name
+        columns = [condition] if isinstance(condition, str) else list(condition)
+        for col in columns:
+            assert col in self.df, f"all {arg_name} arguments must be columns in the CountFilter object! ({col})"
+        return columns, f"Mean of {columns}" if name == 'default' else name
+
+    def fold_change_matrix(self, contrasts: Union[str, List[tuple]] = 'pairwise', control: str = None,
+                           return_filters: bool = False):
+
+        """
+        Calculate the log2 fold change of multiple contrasts at once. \
+        The mean of every condition is computed only once, \
+        and all fold changes are then calculated together as a single matrix. \
+        Like in CountFilter.fold_change, a pseudocount of 1 is added to the means before calculating fold change.
+
+        :type contrasts: 'pairwise', 'control', or list of (numerator, denominator) tuples (default 'pairwise')
+        :param contrasts: the contrasts to calculate. If 'pairwise', \
+        every pair of conditions in the experimental design will be compared. \
+        If 'control', every condition in the experimental design will be compared to the condition 'control'. \
+        Otherwise, a list of (numerator, denominator) tuples, \
+        where each numerator/denominator is in any format accepted by CountFilter.fold_change.
+        :type control: str or None (default None)
+        :param control: the name of the control condition. Required only when 'contrasts' is 'control'.
+        :type return_filters: bool (default False)
+        :param return_filters: if True, returns a dictionary of FoldChangeFilter objects instead of a DataFrame.
+        :return: if 'return_filters' is False, a pandas DataFrame with the same index as the CountFilter, \
+        and a column of log2 fold change values for every contrast, named '<numerator> vs <denominator>'. \
+        If 'return_filters' is True, a dictionary where the keys are the column names \
+        and the values are FoldChangeFilter objects (with fold change values that are not log-transformed).
+
+        :Examples:
+            >>> from rnalysis import filtering
+            >>> c = filtering.CountFilter('tests/counted_fold_change.csv',
+            ... design={'cond1': ['cond1_rep1', 'cond1_rep2'], 'cond2': ['cond2_rep1', 'cond2_rep2'],
+            ... 'cond3': ['cond3_rep1', 'cond3_rep2']})
+            >>> log2fc = c.fold_change_matrix('control', control='cond3')
+            >>> list(log2fc.columns)
+            ['cond1 vs cond3', 'cond2 vs cond3']
+
+        """
+        if contrasts == 'pairwise':
+            conditions = list(self.design.groups) if self.design is not None else []
+            assert len(conditions) > 0, "'pairwise' contrasts require an experimental design. " \
+                                        "Please set one using CountFilter.set_design()."
+            contrasts = [(conditions[i], conditions[j]) for i in range(len(conditions))
+                         for j in range(i + 1, len(conditions))]
+        elif contrasts == 'control':
+            assert self.design is not None, "'control' contrasts require an experimental design. " \
+                                            "Please set one using CountFilter.set_design()."
+            assert control in self.design.groups, f"Control condition '{control}' is not in the experimental design!"
+            contrasts = [(condition, control) for condition in self.design.groups if condition != control]
+        assert isinstance(contrasts, (list, tuple)) and len(contrasts) > 0, \
+            "'contrasts' must be 'pairwise', 'control', or a non-empty list of (numerator, denominator) tuples!"
+
+        groups = {}
+        pairs = []
+        for contrast in contrasts:
+            assert len(contrast) == 2, f"Every contrast must be a (numerator, denominator) tuple. Instead got {contrast}"
+            names = []
+            for condition, arg_name in zip(contrast, ['numerator', 'denominator']):
+                columns, name = self._fold_change_condition(condition, 'default', arg_name)
+                groups[name] = columns
+                names.append(name)
+            pairs.append(tuple(names))
+
+        means = self._group_stat(self.df, groups, 'mean')
+        log_means = np.log2(means.values + 1)
+        positions = {name: i for i, name in enumerate(means.columns)}
+        numer_pos = [positions[numer] for numer, _ in pairs]
+        denom_pos = [positions[denom] for _, denom in pairs]
+        log2fc = pd.DataFrame(log_means[:, numer_pos] - log_means[:, denom_pos], index=self.df.index,
+                              columns=[f"{numer} vs {denom}" for numer, denom in pairs])
+        if not return_filters:
+            return log2fc
+
+        filters = {}
+        for (numer, denom), col in zip(pairs, log2fc.columns):
+            new_fname = Path(f"{str(self.fname.parent)}\\{self.fname.stem}'_fold_change_'"
+                             f"{numer}_over_{denom}_{self.fname.suffix}")
+            filters[col] = FoldChangeFilter((new_fname, np.power(2, log2fc[col])), numerator_name=numer,
+                                            denominator_name=denom)
+        return filters
+
+    def differential_expression(self, numerator, denominator, test: str = 'wald', dispersion: str = 'trended'):
+
+        """
+        Test for differential expression between the numerator condition and the denominator condition \
+        for all features at once, and return the results as a DESeqFilter object. \
+        The CountFilter should contain raw (non-normalized) counts. \
+        Counts are normalized by size factors estimated with the median-of-ratios method over all samples.
+
+        :type numerator: str, or list of strs
+        :param numerator: the CountFilter columns to be used as the numerator condition, \
+        in any format accepted by CountFilter.fold_change. Must contain at least 2 samples.
+        :type denominator: str, or list of strs
+        :param denominator: the CountFilter columns to be used as the denominator condition, \
+        in any format accepted by CountFilter.fold_change. Must contain at least 2 samples.
+        :type test: 'wald' or 'welch' (default 'wald')
+        :param test: the statistical test to use. 'wald' performs a Wald test under a negative binomial model \
+        of the counts. 'welch' performs Welch's t-test on log2(normalized counts + 1).
+        :type dispersion: 'trended' or 'shared' (default 'trended')
+        :param dispersion: how to estimate the negative binomial dispersion for the Wald test. \
+        If 'trended', the dispersion of every feature is taken from a parametric trend \
+        (dispersion = a0 + a1 / mean) fitted to the feature-wise dispersion estimates. \
+        If 'shared', a single dispersion (the median of the feature-wise estimates) is used for all features.
+        :rtype: DESeqFilter
+        :return: A new instance of DESeqFilter, with the columns \
+        'baseMean', 'log2FoldChange', 'lfcSE', 'stat', 'pvalue' and 'padj'. \
+        'padj' are p-values adjusted for multiple comparisons using the Benjamini-Hochberg method. \
+        Features with no counts in either condition have NaN p-values.
+
+        :Examples:
+            >>> from rnalysis import filtering
+            >>> c = filtering.CountFilter('tests/counted_fold_change.csv',
+            ... design={'cond1': ['cond1_rep1', 'cond1_rep2'], 'cond2': ['cond2_rep1', 'cond2_rep2'],
+            ... 'cond3': ['cond3_rep1', 'cond3_rep2']})
+            >>> d = c.differential_expression('cond1', 'cond2')
+            >>> type(d)
+            rnalysis.filtering.DESeqFilter
+
+        """
+        assert test in {'wald', 'welch'}, f"Invalid test '{test}'. 'test' must be 'wald' or 'welch'."
+        assert dispersion in {'trended', 'shared'}, \
+            f"Invalid dispersion '{dispersion}'. 'dispersion' must be 'trended' or 'shared'."
+        numerator, numer_name = self._fold_change_condition(numerator, 'default', 'numerator')
+        denominator, denom_name = self._fold_change_condition(denominator, 'default', 'denominator')
+        assert len(numerator) >= 2 and len(denominator) >= 2, \
+            "Both the numerator and the denominator must contain at least 2 samples!"
+
+        counts = self.df.values.astype(np.float64)
+        size_factors = self._size_factors(counts)
+        positions = {col: i for i, col in enumerate(self.columns)}
+        numer_pos = [positions[col] for col in numerator]
+        denom_pos = [positions[col] for col in denominator]
+        norm = counts / size_factors
+        base_mean = norm[:, numer_pos + denom_pos].mean(axis=1)
+
+        if test == 'welch':
+            log_norm = np.log2(norm + 1)
+            lfc, lfc_se, stat, pvals = self._welch_test(log_norm[:, numer_pos], log_norm[:, denom_pos])
+        else:
+            lfc, lfc_se, stat, pvals = self._nb_wald_test(counts[:, numer_pos], counts[:, denom_pos],
+                                                          size_factors[numer_pos], size_factors[denom_pos],
+                                                          dispersion)
+
+        padj = np.full_like(pvals, np.nan)
+        tested = ~np.isnan(pvals)
+        if tested.any():
+            from statsmodels.stats import multitest
+            padj[tested] = multitest.fdrcorrection(pvals[tested])[1]
+
+        res = pd.DataFrame({'baseMean': base_mean, 'log2FoldChange': lfc, 'lfcSE': lfc_se, 'stat': stat,
+                            'pvalue': pvals, 'padj': padj}, index=self.df.index)
+        new_fname = Path(f"{str(self.fname.parent)}\\{self.fname.stem}_{test}_{numer_name}_vs_{denom_name}"
+                         f"{self.fname.suffix}")
+        return DESeqFilter((new_fname, res))
+
+    @staticmethod
+    def _size_factors(counts: np.ndarray) -> np.ndarray:
+
+        """
+        Internal method, estimates the size factor of every sample using the median-of-ratios method. \
+        Static class method.
+
+        :param counts: a (features x samples) numpy array of raw counts.
+        :return: a numpy array with the size factor of every sample.
+        """
+        with np.errstate(divide='ignore'):
+            log_counts = np.log(counts)
+        log_geo_means = log_counts.mean(axis=1)
+        expressed = np.isfinite(log_geo_means)
+        assert expressed.any(), "Cannot estimate size factors: every feature has a zero count in at least one sample!"
+        return np.exp(np.median(log_counts[expressed] - log_geo_means[expressed, np.newaxis], axis=0))
+
+    @staticmethod
+    def _welch_test(numer: np.ndarray, denom: np.ndarray):
+
+        """
+        Internal method, performs Welch's t-test on every row of the given arrays at once. Static class method.
+
+        :param numer: a (features x samples) numpy array of the numerator samples.
+        :param denom: a (features x samples) numpy array of the denominator samples.
+        :return: a tuple of numpy arrays (difference of means, standard error, t statistic, p-value).
+        """
+        from scipy.stats import t
+        n_numer, n_denom = numer.shape[1], denom.shape[1]
+        var_numer = numer.var(axis=1, ddof=1) / n_numer
+        var_denom = denom.var(axis=1, ddof=1) / n_denom
+        diff = numer.mean(axis=1) - denom.mean(axis=1)
+        se = np.sqrt(var_numer + var_denom)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            stat = diff / se
+            dof = (var_numer + var_denom) ** 2 / (var_numer ** 2 / (n_numer - 1) + var_denom ** 2 / (n_denom - 1))
+        pvals = 2 * t.sf(np.abs(stat), dof)
+        return diff, se, stat, pvals
+
+    @staticmethod
+    def _nb_wald_test(numer: np.ndarray, denom: np.ndarray, numer_sf: np.ndarray, denom_sf: np.ndarray,
+                      dispersion: str = 'trended'):
+
+        """
+        Internal method, performs a negative binomial Wald test between two conditions on every row at once. \
+        Static class method. \
+        The mean of every condition is estimated from the normalized counts, and the dispersion is estimated \
+        with the method of moments and then either shrunk to a parametric trend or replaced by a shared value.
+
+        :param numer: a (features x samples) numpy array of raw counts of the numerator samples.
+        :param denom: a (features x samples) numpy array of raw counts of the denominator samples.
+        :param numer_sf: the size factors of the numerator samples.
+        :param denom_sf: the size factors of the denominator samples.
+        :param dispersion: 'trended' or 'shared'.
+        :return: a tuple of numpy arrays (log2 fold change, standard error, Wald statistic, p-value).
+        """
+        from scipy.stats import norm
+        groups = [(numer, numer_sf), (denom, denom_sf)]
+        means = [(counts / sf).mean(axis=1) for counts, sf in groups]
+        base_mean = (means[0] * numer.shape[1] + means[1] * denom.shape[1]) / (numer.shape[1] + denom.shape[1])
+        tested = base_mean > 0
+
+        # method-of-moments dispersion estimate, pooled over both conditions
+        dof = 0
+        excess_var = np.zeros_like(base_mean)
+        for (counts, sf), mean in zip(groups, means):
+            var = (counts / sf).var(axis=1, ddof=1)
+            excess_var += (var - mean * np.mean(1 / sf)) * (counts.shape[1] - 1)
+            dof += counts.shape[1] - 1
+        with np.errstate(divide='ignore', invalid='ignore'):
+            gene_disp = np.maximum(excess_var / dof / base_mean ** 2, 1e-8)
+        fit = tested & (gene_disp > 1e-8)
+        if not fit.any():
+            disp = np.full_like(base_mean, 1e-8)
+        elif dispersion == 'shared':
+            disp = np.full_like(base_mean, np.median(gene_disp[fit]))
+        else:
+            coefs = np.array([np.median(gene_disp[fit]), 0])
+            for _ in range(10):
+                design = np.column_stack([np.ones(fit.sum()), 1 / base_mean[fit]])
+                coefs = np.maximum(np.linalg.lstsq(design, gene_disp[fit], rcond=None)[0], 1e-8)
+                ratio = gene_disp / (coefs[0] + coefs[1] / base_mean)
+                new_fit = tested & (gene_disp > 1e-8) & (ratio > 1e-4) & (ratio < 15)
+                if np.array_equal(new_fit, fit) or not new_fit.any():
+                    break
+                fit = new_fit
+            with np.errstate(divide='ignore'):
+                disp = coefs[0] + coefs[1] / base_mean
+
+        # Wald test on the difference of the log means; a mean of 0 is floored to half a count
+        log_means = []
+        variances = []
+        for (counts, sf), mean in zip(groups, means):
+            mean = np.maximum(mean, 0.5 / sf.sum())
+            mu = mean[:, np.newaxis] * sf
+            info = (mu / (1 + disp[:, np.newaxis] * mu)).sum(axis=1)
+            log_means.append(np.log(mean))
+            variances.append(1 / info)
+        lfc = (log_means[0] - log_means[1]) / np.log(2)
+        lfc_se = np.sqrt(variances[0] + variances[1]) / np.log(2)
+        stat = lfc / lfc_se
+        pvals = 2 * norm.sf(np.abs(stat))
+        for arr in (lfc, lfc_se, stat, pvals):
+            arr[~tested] = np.nan
+        return lfc, lfc_se, stat, pvals
 
     def pairplot(self, sample_list: list = 'all', log2: bool = False):
 
@@ -1671,6 +2360,7 @@ class CountFilter(Filter):
            Example plot of pairplot()
 
         """
+        import seaborn as sns
         if sample_list == 'all':
             sample_df = self.df
         else:
@@ -1679,9 +2369,416 @@ class CountFilter(Filter):
             pairplt = sns.pairplot(np.log2(sample_df))
         else:
             pairplt = sns.pairplot(sample_df)
-        plt.show()
+        general._show_figures('pairplot')
         return pairplt
 
+    def correlation_heatmap(self, sample_list: list = 'all', method: str = 'pearson', log2: bool = False,
+                            float32: bool = False, scatter_samples: list = None, chunk_size: int = 2 ** 16):
+
+        """
+        Computes the pairwise correlation between all samples, and plots it as a heatmap. \
+        Unlike CountFilter.pairplot, which draws a full scatter plot for every pair of samples, \
+        the correlation matrix is computed in one vectorized pass, so it remains practical for hundreds of samples. \
+        Scatter plots can be drawn for a smaller subset of samples, as density (hexbin) plots. \
+        Can plot both single samples and average multiple replicates.
+
+        :type sample_list: 'all', list, or nested list.
+        :param sample_list: A list of the sample names and/or grouped sample names to be included in the heatmap. \
+        All specified samples must be present in the CountFilter object. \
+        To average multiple replicates of the same condition, they can be grouped in an inner list. \
+        Example input: \
+        [['SAMPLE1A', 'SAMPLE1B', 'SAMPLE1C'], ['SAMPLE2A', 'SAMPLE2B', 'SAMPLE2C'],'SAMPLE3' , 'SAMPLE6']
+        :type method: 'pearson' or 'spearman' (default 'pearson')
+        :param method: the correlation coefficient to compute.
+        :type log2: bool (default False)
+        :param log2: if True, the correlation will be calculated on log2(x + 1) of the data, and not on the raw data.
+        :type float32: bool (default False)
+        :param float32: if True, the correlation will be computed with 32-bit floats, which halves its memory usage.
+        :type scatter_samples: list of sample names or None (default None)
+        :param scatter_samples: if specified, a grid of hexbin scatter plots will be drawn for every pair of \
+        the specified samples. The sample names must appear in the heatmap \
+        (grouped samples are named by joining their names with ',').
+        :type chunk_size: positive int (default 2 ** 16)
+        :param chunk_size: the number of features processed at once.
+        :return: a tuple whose first element is a pandas DataFrame of the pairwise correlations between the samples, \
+        and second element is the matplotlib axis of the heatmap.
+        """
+        import matplotlib.pyplot as plt
+        assert method in {'pearson', 'spearman'}, f"'method' must be 'pearson' or 'spearman'. Instead got '{method}'"
+        assert isinstance(chunk_size, int) and chunk_size > 0, "'chunk_size' must be a positive integer!"
+        dtype = np.float32 if float32 else np.float64
+        sample_df = self.df if sample_list == 'all' else self._avg_subsamples(sample_list)
+        values = sample_df.values
+        if log2:
+            values = np.log2(values + 1)
+        corr_values = self._rank_columns(values, dtype) if method == 'spearman' else values
+        corr = pd.DataFrame(self._correlation_matrix(corr_values, dtype, chunk_size),
+                            index=sample_df.columns, columns=sample_df.columns)
+
+        fig = plt.figure(figsize=(9, 8))
+        ax = fig.add_subplot(1, 1, 1)
+        img = ax.imshow(corr.values, cmap='RdBu_r', vmin=-1, vmax=1, interpolation='nearest')
+        fig.colorbar(img, ax=ax, label=f'{method.capitalize()} correlation')
+        if corr.shape[0] <= 50:
+            ax.set_xticks(range(corr.shape[0]))
+            ax.set_xticklabels(corr.columns, rotation=90)
+            ax.set_yticks(range(corr.shape[0]))
+            ax.set_yticklabels(corr.columns)
+        ax.set_title(f'{method.capitalize()} correlation between samples', fontsize=18)
+
+        if scatter_samples is not None:
+            for sample in scatter_samples:
+                assert sample in corr.index, f"Sample '{sample}' does not appear in the correlation heatmap. "
+            self._hexbin_grid(pd.DataFrame(values, columns=sample_df.columns)[scatter_samples], corr, method)
+        general._show_figures('correlation_heatmap')
+        return corr, ax
+
+    @staticmethod
+    def _rank_columns(values: np.ndarray, dtype=np.float64) -> np.ndarray:
+
+        """
+        Internal method, ranks the values of every column of 'values' separately (averaging the ranks of ties), \
+        as required for Spearman correlation. Static class method. \
+        The ranks are written one column at a time into a single preallocated array of the requested dtype.
+
+        :param values: a 2D numpy array, where every column is a sample.
+        :param dtype: the dtype of the returned ranks.
+        :return: a 2D numpy array of the same shape as 'values'.
+        """
+        from scipy.stats import rankdata
+        ranks = np.empty(values.shape, dtype=dtype)
+        for j in range(values.shape[1]):
+            ranks[:, j] = rankdata(values[:, j])
+        return ranks
+
+    @staticmethod
+    def _correlation_matrix(values: np.ndarray, dtype=np.float64, chunk_size: int = 2 ** 16) -> np.ndarray:
+
+        """
+        Internal method, computes the Pearson correlation between all columns of 'values'. Static class method. \
+        The column means (and the largest deviation from them, used for scaling) are computed in a first pass. \
+        In a second pass, the cross-products of the centered and scaled columns are accumulated over chunks of rows. \
+        The diagonal of the accumulated matrix holds the sums of squared deviations from the means, \
+        which are used to normalize it. No more than 'chunk_size' rows are converted to 'dtype' at once.
+
+        :param values: a 2D numpy array, where every column is a sample.
+        :param dtype: the dtype used for the computation.
+        :param chunk_size: the number of rows processed at once.
+        :return: a (columns x columns) numpy array of correlations.
+        """
+        n_rows, n_cols = values.shape
+        col_sum = np.zeros(n_cols, dtype=np.float64)
+        col_min = np.full(n_cols, np.inf)
+        col_max = np.full(n_cols, -np.inf)
+        for start in range(0, n_rows, chunk_size):
+            chunk = values[start:start + chunk_size].astype(np.float64)
+            col_sum += chunk.sum(axis=0)
+            col_min = np.minimum(col_min, chunk.min(axis=0))
+            col_max = np.maximum(col_max, chunk.max(axis=0))
+        mean = col_sum / n_rows
+        # correlations do not depend on the scale of the columns; scaling them to [-1, 1] keeps float32 accurate
+        scale = np.maximum(col_max - mean, mean - col_min)
+        scale[scale == 0] = 1
+
+        cross = np.zeros((n_cols, n_cols), dtype=dtype)
+        mean, scale = mean.astype(dtype), scale.astype(dtype)
+        for start in range(0, n_rows, chunk_size):
+            chunk = (values[start:start + chunk_size].astype(dtype) - mean) / scale
+            cross += chunk.T @ chunk
+        sq_deviations = np.diag(cross).astype(np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = cross / np.sqrt(np.outer(sq_deviations, sq_deviations))
+        corr[:, sq_deviations == 0] = np.nan
+        corr[sq_deviations == 0, :] = np.nan
+        np.fill_diagonal(corr, 1)
+        return np.clip(corr, -1, 1).astype(dtype, copy=False)
+
+    @staticmethod
+    def _hexbin_grid(sample_df: pd.DataFrame, corr: pd.DataFrame, method: str, gridsize: int = 50):
+
+        """
+        Internal method, used by CountFilter.correlation_heatmap to draw a grid of hexbin scatter plots \
+        for every pair of the given samples. Static class method.
+
+        :param sample_df: a DataFrame whose columns are the samples to plot.
+        :param corr: the correlation matrix of the samples, used to annotate the plots.
+        :param method: the name of the correlation coefficient.
+        :param gridsize: the number of hexagons along the x axis of each plot.
+        :return: a 2D numpy array of the matplotlib axes of the grid.
+        """
+        import matplotlib.pyplot as plt
+        n_samples = sample_df.shape[1]
+        fig, axes = plt.subplots(n_samples, n_samples, figsize=(2.5 * n_samples, 2.5 * n_samples), squeeze=False)
+        for i, sample_y in enumerate(sample_df.columns):
+            for j, sample_x in enumerate(sample_df.columns):
+                ax = axes[i, j]
+                if i == j:
+                    ax.hist(sample_df[sample_x].values, bins=gridsize, color='grey')
+                else:
+                    ax.hexbin(sample_df[sample_x].values, sample_df[sample_y].values, gridsize=gridsize, bins='log',
+                              mincnt=1, cmap='Greys')
+                    ax.set_title(f'{method} r={corr.loc[sample_y, sample_x]:.3f}', fontsize=9)
+                if i == n_samples - 1:
+                    ax.set_xlabel(sample_x)
+                if j == 0:
+                    ax.set_ylabel(sample_y)
+        fig.tight_layout()
+        return axes
+
+    _MEMMAP_CHUNK_SIZE = 2 ** 16
+
+    def _row_chunks(self, chunk_size: int = None):
+
+        """
+        Internal method, iterates over the numeric values of the CountFilter in blocks of rows. \
+        When the CountFilter is backed by a memory-mapped file (see CountFilter.to_memmap), \
+        only one block at a time is read into memory.
+
+        :param chunk_size: the number of rows in every block. If None, CountFilter._MEMMAP_CHUNK_SIZE is used.
+        :return: a generator of 2D numpy arrays.
+        """
+        chunk_size = self._MEMMAP_CHUNK_SIZE if chunk_size is None else chunk_size
+        values = self.df.values
+        for start in range(0, values.shape[0], chunk_size):
+            yield np.asarray(values[start:start + chunk_size])
+
+    def _row_reduce(self, func, chunk_size: int = None) -> np.ndarray:
+
+        """
+        Internal method, applies a reduction function (such as numpy.max or numpy.sum) to every row of the CountFilter, \
+        streaming over blocks of rows.
+
+        :param func: a numpy reduction function which accepts the argument 'axis'.
+        :param chunk_size: the number of rows in every block.
+        :return: a numpy array with the result of the reduction for every row.
+        """
+        reduced = [func(chunk, axis=1) for chunk in self._row_chunks(chunk_size)]
+        return np.concatenate(reduced) if len(reduced) > 0 else np.zeros(0)
+
+    def _column_sums(self, chunk_size: int = None) -> pd.Series:
+
+        """
+        Internal method, computes the sum of every column of the CountFilter, streaming over blocks of rows.
+
+        :param chunk_size: the number of rows in every block.
+        :return: a pandas Series with the sum of every column.
+        """
+        sums = np.zeros(self.df.shape[1])
+        for chunk in self._row_chunks(chunk_size):
+            sums += chunk.sum(axis=0)
+        return pd.Series(sums, index=self.df.columns)
+
+    def _memmap_file(self) -> Union[Path, None]:
+
+        """
+        Internal method, returns the path of the memory-mapped file which backs the values of the CountFilter, \
+        or None if the values are held in memory.
+
+        :rtype: pathlib.Path or None
+        """
+        if self.df.shape[1] == 0 or len(set(self.df.dtypes)) != 1:
+            return None
+        base = self.df.values
+        while base is not None:
+            if isinstance(base, np.memmap):
+                return Path(base.filename)
+            base = base.base
+        return None
+
+    def _memmap_transform(self, func, suffix: str, chunk_size: int = None) -> pd.DataFrame:
+
+        """
+        Internal method, applies an element-wise transformation (such as a normalization) to the values \
+        of a memory-mapped CountFilter one block of rows at a time, \
+        and writes the results into a new memory-mapped file next to the original one \
+        (or in the temporary directory, if the directory of the original file is not writable), \
+        so that the transformed matrix is never held in memory as a whole. \
+        Every call writes to a new uniquely-named file, so earlier results and concurrent processes \
+        transforming the same file are never overwritten.
+
+        :param func: a function which receives a 2D numpy array of rows and returns the transformed rows.
+        :param suffix: the suffix added to the name of the new memory-mapped file.
+        :param chunk_size: the number of rows in every block.
+        :return: a DataFrame backed by the new memory-mapped file.
+        """
+        import tempfile
+        source = self._memmap_file()
+        try:
+            handle, fname = tempfile.mkstemp(suffix='.npy', prefix=f"{source.stem}{suffix}_", dir=source.parent)
+        except OSError:
+            handle, fname = tempfile.mkstemp(suffix='.npy', prefix=f"{source.stem}{suffix}_")
+        os.close(handle)
+        fname = Path(fname)
+        chunk_size = self._MEMMAP_CHUNK_SIZE if chunk_size is None else chunk_size
+        dtype = np.result_type(self.df.dtypes.iloc[0], np.float32)
+        mapped = np.lib.format.open_memmap(fname, mode='w+', dtype=dtype, shape=self.df.shape)
+        for start, chunk in zip(range(0, self.df.shape[0], chunk_size), self._row_chunks(chunk_size)):
+            mapped[start:start + chunk.shape[0]] = func(chunk)
+        mapped.flush()
+        del mapped
+        self._write_memmap_sidecar(fname, self.df.index, self.df.columns)
+        return CountFilter.from_memmap(fname).df
+
+    @staticmethod
+    def _npy_header(dtype, shape: tuple, size: int) -> bytes:
+
+        """
+        Internal method, returns a version 1.0 .npy file header of exactly 'size' bytes \
+        for a C-ordered array of the given dtype and shape. Static class method.
+
+        :param dtype: the dtype of the array.
+        :param shape: the shape of the array.
+        :param size: the total size of the header in bytes, including the magic string.
+        :rtype: bytes
+        """
+        import struct
+        header = repr({'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)), 'fortran_order': False,
+                       'shape': tuple(shape)})
+        prefix = np.lib.format.magic(1, 0)
+        header_len = size - len(prefix) - 2
+        assert len(header) < header_len, "The .npy header is too long!"
+        return prefix + struct.pack('<H', header_len) + (header.ljust(header_len - 1) + '\n').encode('latin1')
+
+    @staticmethod
+    def _memmap_sidecar_path(fname: Path) -> Path:
+
+        """
+        Internal method, returns the path of the .json file that holds the feature names, sample names \
+        and metadata of a memory-mapped count matrix. Static class method.
+
+        :param fname: the path of the memory-mapped .npy file.
+        :rtype: pathlib.Path
+        """
+        return fname.with_suffix('.json')
+
+    def _write_memmap_sidecar(self, fname: Path, index, columns):
+
+        """
+        Internal method, writes the .json file that accompanies a memory-mapped count matrix.
+
+        :param fname: the path of the memory-mapped .npy file.
+        :param index: the names of the features.
+        :param columns: the names of the samples.
+        """
+        import json
+        sidecar = dict(index=[str(i) for i in index], index_name=self.df.index.name, columns=[str(c) for c in columns],
+                       fname=str(self.fname), **self._save_metadata())
+        with open(self._memmap_sidecar_path(fname), 'w') as f:
+            json.dump(sidecar, f)
+
+    def to_memmap(self, fname: Union[str, Path], chunk_size: int = None):
+
+        """
+        Writes the numeric values of the CountFilter to a memory-mapped .npy file, \
+        and returns a new CountFilter whose values are backed by that file instead of being held in memory. \
+        The feature names, sample names and metadata are saved separately, in a .json file next to it. \
+        Reductions used by filtering and normalization (such as row maxima, row sums and library sizes) \
+        stream over the memory-mapped file in blocks of rows. \
+        Normalization methods write their results block by block into a new memory-mapped file next to this one \
+        (for example 'counts_rpm.npy'), and return a CountFilter backed by it. \
+        Filtering methods do not keep a view of the shared file: \
+        the features they keep are read into memory, and the filtered CountFilter is held in memory. \
+        To keep a large filtered result on disk, call to_memmap() on it. \
+        Copies of a memory-mapped CountFilter share the read-only file instead of reading it into memory. \
+        Several processes can open the same file with CountFilter.from_memmap() without each holding a copy.
+
+        :param fname: the path of the .npy file. The suffix '.npy' will be added if it is missing.
+        :type fname: str or pathlib.Path
+        :param chunk_size: the number of rows to write at a time.
+        :type chunk_size: positive int or None (default None)
+        :return: a new CountFilter, backed by the memory-mapped file.
+        :rtype: CountFilter
+
+        :Examples:
+            >>> from rnalysis import filtering
+            >>> c = filtering.CountFilter('tests/counted.csv')
+            >>> c_mapped = c.to_memmap('tests/counted.npy')
+
+        """
+        fname = Path(fname)
+        if fname.suffix != '.npy':
+            fname = fname.with_name(fname.name + '.npy')
+        chunk_size = self._MEMMAP_CHUNK_SIZE if chunk_size is None else chunk_size
+        dtype = np.result_type(*self.df.dtypes)
+        assert np.issubdtype(dtype, np.number), "Only numeric CountFilter objects can be memory-mapped!"
+        mapped = np.lib.format.open_memmap(fname, mode='w+', dtype=dtype, shape=self.df.shape)
+        for start, chunk in zip(range(0, self.df.shape[0], chunk_size), self._row_chunks(chunk_size)):
+            mapped[start:start + chunk.shape[0]] = chunk
+        mapped.flush()
+        del mapped
+        self._write_memmap_sidecar(fname, self.df.index, self.df.columns)
+        return CountFilter.from_memmap(fname)
+
+    @staticmethod
+    def from_memmap(fname: Union[str, Path]):
+
+        """
+        Opens a count matrix which was saved by CountFilter.to_memmap() or CountFilter.csv_to_memmap() \
+        as a read-only, memory-mapped CountFilter. Static class method.
+
+        :param fname: the path of the memory-mapped .npy file.
+        :type fname: str or pathlib.Path
+        :rtype: CountFilter
+
+        :Examples:
+            >>> from rnalysis import filtering
+            >>> c = filtering.CountFilter.from_memmap('tests/counted.npy')
+
+        """
+        import json
+        fname = Path(fname)
+        with open(CountFilter._memmap_sidecar_path(fname)) as f:
+            sidecar = json.load(f)
+        values = np.load(fname, mmap_mode='r')
+        index = pd.Index(sidecar.pop('index'), name=sidecar.pop('index_name'))
+        df = pd.DataFrame(values, index=index, columns=sidecar.pop('columns'), copy=False)
+        return CountFilter._load_from_metadata(Path(sidecar.pop('fname')), df, sidecar)
+
+    @staticmethod
+    def csv_to_memmap(csv_fname: Union[str, Path], fname: Union[str, Path], chunk_size: int = None,
+                      dtype: str = 'float64'):
+
+        """
+        Converts a count matrix .csv file into a memory-mapped .npy file, reading the .csv file once, \
+        in blocks of rows, so that count matrices larger than the available memory can be used. \
+        Returns a read-only CountFilter backed by the memory-mapped file (see CountFilter.to_memmap()). \
+        Static class method.
+
+        :param csv_fname: the path of the .csv file. The first column should contain the feature names.
+        :type csv_fname: str or pathlib.Path
+        :param fname: the path of the .npy file. The suffix '.npy' will be added if it is missing.
+        :type fname: str or pathlib.Path
+        :param chunk_size: the number of rows to read at a time.
+        :type chunk_size: positive int or None (default None)
+        :param dtype: the numpy data type in which to store the values.
+        :type dtype: str or numpy.dtype (default 'float64')
+        :rtype: CountFilter
+
+        :Examples:
+            >>> from rnalysis import filtering
+            >>> c = filtering.CountFilter.csv_to_memmap('tests/counted.csv', 'tests/counted.npy')
+
+        """
+        csv_fname, fname = Path(csv_fname), Path(fname)
+        if fname.suffix != '.npy':
+            fname = fname.with_name(fname.name + '.npy')
+        chunk_size = CountFilter._MEMMAP_CHUNK_SIZE if chunk_size is None else chunk_size
+        header = pd.read_csv(csv_fname, index_col=0, nrows=0, encoding='ISO-8859-1')
+        # the number of rows is only known after the .csv file was read, so the rows are written after a fixed-size
+        # space for the .npy header, which is written last
+        header_size = 128
+        index = []
+        with open(fname, 'wb') as f:
+            f.seek(header_size)
+            for chunk in pd.read_csv(csv_fname, index_col=0, chunksize=chunk_size, encoding='ISO-8859-1'):
+                f.write(np.ascontiguousarray(chunk.values, dtype=dtype).tobytes())
+                index.extend(chunk.index)
+            f.seek(0)
+            f.write(CountFilter._npy_header(dtype, (len(index), header.shape[1]), header_size))
+        CountFilter((csv_fname, header))._write_memmap_sidecar(fname, pd.Index(index, name=header.index.name),
+                                                                header.columns)
+        return CountFilter.from_memmap(fname)
+
     def _rpm_assertions(self, threshold: float = 1):
 
         """
@@ -1708,25 +2805,76 @@ class CountFilter(Filter):
         Example input: \
         [['SAMPLE1A', 'SAMPLE1B', 'SAMPLE1C'], ['SAMPLE2A', 'SAMPLE2B', 'SAMPLE2C'],'SAMPLE3' , 'SAMPLE6'] \
         and the resulting output will be a DataFrame containing the following columns: \
-        ['SAMPLE1', 'SAMPLE2', 'SAMPLE3', 'SAMPLE6']
-        :return: a pandas DataFrame containing samples/averaged subsamples according to the specified sample_list.
+        ['SAMPLE1A,SAMPLE1B,SAMPLE1C', 'SAMPLE2A,SAMPLE2B,SAMPLE2C', 'SAMPLE3', 'SAMPLE6']
+        :return: a pandas DataFrame containing samples/averaged subsamples according to the specified sample_list, \
+        with the same index as the CountFilter.
 
         """
-        samples_df = pd.DataFrame()
+        groups = {}
         for sample in sample_list:
             if isinstance(sample, str):
-                samples_df[sample] = self.df[sample].values
-            elif isinstance(sample, (list, str, tuple)):
-                samples_df[",".join(sample)] = self.df[sample].mean(axis=1).values
+                groups[sample] = [sample]
+            elif isinstance(sample, (list, tuple)):
+                groups[",".join(sample)] = list(sample)
+        return self._group_stat(self.df, groups, 'mean')
 
-        return samples_df
+    @staticmethod
+    def _group_stat(df: pd.DataFrame, groups: Dict[str, list], stat: str = 'mean') -> pd.DataFrame:
+
+        """
+        Computes a statistic over groups of columns of a DataFrame for all rows and groups at once, \
+        keeping the DataFrame's index. The mean is computed with a single matrix multiplication \
+        by a (samples x groups) membership matrix, so a sample may belong to more than one group. \
+        For the SEM, the deviations of every member sample from its group's mean are computed first, \
+        and their squares are then summed per group the same way, which stays accurate for large counts. \
+        Static class method.
+
+        :param df: the DataFrame whose columns are grouped.
+        :param groups: a dictionary where the keys are the names of the groups, \
+        and the values are lists of the column names (or column numbers) that belong to each group.
+        :param stat: the statistic to compute for every group.
+        :type stat: 'mean', 'sem' (standard error of the mean) or 'median' (default 'mean')
+        :return: a DataFrame with the same index as df, and one column for every group.
+        """
+        assert stat in {'mean', 'sem', 'median'}, f"Invalid statistic '{stat}'. "
+        membership = np.zeros((df.shape[1], len(groups)))
+        for j, members in enumerate(groups.values()):
+            if isinstance(members, np.ndarray):
+                membership[members, j] = 1
+                continue
+            members = [members] if isinstance(members, (str, int)) else members
+            for member in members:
+                if isinstance(member, str):
+                    assert member in df.columns, f"Sample '{member}' does not appear in the CountFilter object!"
+                    membership[df.columns.get_loc(member), j] = 1
+                else:
+                    membership[member, j] = 1
+        sizes = membership.sum(axis=0)
+        assert np.all(sizes > 0), "Every group must contain at least one sample!"
+        values = df.values
+
+        if stat == 'mean':
+            res = values @ membership / sizes
+        elif stat == 'sem':
+            mean = values @ membership / sizes
+            member_cols, member_groups = np.nonzero(membership)
+            deviations = values[:, member_cols] - mean[:, member_groups]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                var = (deviations ** 2) @ (member_groups[:, None] == np.arange(len(groups))) / (sizes - 1)
+            res = np.sqrt(var / sizes)
+        else:
+            res = np.column_stack([np.median(values[:, membership[:, j].astype(bool)], axis=1)
+                                   for j in range(len(groups))])
+        return pd.DataFrame(res, index=df.index, columns=list(groups.keys()))
 
     def normalize_to_rpm(self, special_counter_fname: str, inplace: bool = True):
 
         """
         Normalizes the reads in the CountFilter to reads per million (RPM). \
         Uses a table of feature counts (ambiguous, no feature, not aligned, etc) from HTSeq's output. \
-        Divides each column in the CountFilter object by (total reads + ambiguous + no feature)*10^-6 .
+        Divides each column in the CountFilter object by (total reads + ambiguous + no feature)*10^-6 . \
+        If the CountFilter is memory-mapped (see CountFilter.to_memmap), the normalized values are written \
+        block by block into a new memory-mapped file with the suffix '_rpm' next to the original file.
 
         :param special_counter_fname: the .csv file which contains feature information about the RNA library \
         (ambiguous, no feature, not aligned, etc).
@@ -1743,17 +2891,22 @@ class CountFilter(Filter):
 
         """
         suffix = '_rpm'
-        new_df = self.df.copy()
         if isinstance(special_counter_fname, (str, Path)):
             features = general.load_csv(special_counter_fname, 0)
         elif isinstance(special_counter_fname, pd.DataFrame):
             features = special_counter_fname
         else:
             raise TypeError("Invalid type for 'special_counter_fname'!")
-        for column in new_df.columns:
-            norm_factor = (new_df[column].sum() + features.loc[r'__ambiguous', column] + features.loc[
-                r'__no_feature', column] + features.loc[r'__alignment_not_unique', column]) / (10 ** 6)
-            new_df[column] /= norm_factor
+        column_sums = self._column_sums()
+        norm_factors = np.array([(column_sums[column] + features.loc[r'__ambiguous', column] + features.loc[
+            r'__no_feature', column] + features.loc[r'__alignment_not_unique', column]) / (10 ** 6)
+                                 for column in self.df.columns])
+        if self._memmap_file() is not None:
+            new_df = self._memmap_transform(lambda chunk: chunk / norm_factors, suffix)
+        else:
+            new_df = self.df.copy()
+            for column, norm_factor in zip(new_df.columns, norm_factors):
+                new_df[column] /= norm_factor
         return self._inplace(new_df, opposite=False, inplace=inplace, suffix=suffix, printout_operation='normalize')
 
     def normalize_with_scaling_factors(self, scaling_factor_fname: Union[str, Path], inplace: bool = True):
@@ -1761,7 +2914,9 @@ class CountFilter(Filter):
         """
         Normalizes the reads in the CountFilter using pre-calculated scaling factors. \
         Receives a table of sample names and their corresponding size factors, \
-        and divides each column in the CountFilter by the corresponding scaling factor.
+        and divides each column in the CountFilter by the corresponding scaling factor. \
+        If the CountFilter is memory-mapped (see CountFilter.to_memmap), the normalized values are written \
+        block by block into a new memory-mapped file with the suffix '_sizefactor' next to the original file.
 
         :type scaling_factor_fname: str or pathlib.Path
         :param scaling_factor_fname: the .csv file which contains size factors for the different libraries.
@@ -1778,16 +2933,20 @@ class CountFilter(Filter):
 
         """
         suffix = '_sizefactor'
-        new_df = self.df.copy()
         if isinstance(scaling_factor_fname, (str, Path)):
             size_factors = general.load_csv(scaling_factor_fname)
         elif isinstance(scaling_factor_fname, pd.DataFrame):
             size_factors = scaling_factor_fname
         else:
             raise TypeError("Invalid type for 'scaling_factor_fname'!")
-        for column in new_df.columns:
-            norm_factor = size_factors[column].values
-            new_df[column] /= norm_factor
+        if self._memmap_file() is not None:
+            norm_factors = np.array([size_factors[column].values[0] for column in self.df.columns])
+            new_df = self._memmap_transform(lambda chunk: chunk / norm_factors, suffix)
+        else:
+            new_df = self.df.copy()
+            for column in new_df.columns:
+                norm_factor = size_factors[column].values
+                new_df[column] /= norm_factor
         return self._inplace(new_df, opposite=False, inplace=inplace, suffix=suffix, printout_operation='normalize')
 
     def filter_low_reads(self, threshold: float = 5, opposite: bool = False, inplace: bool = True):
@@ -1816,7 +2975,7 @@ class CountFilter(Filter):
 
         """
         self._rpm_assertions(threshold=threshold)
-        new_df = self.df.loc[[True if max(vals) > threshold else False for gene, vals in self.df.iterrows()]]
+        new_df = self.df.loc[self._row_reduce(np.max) > threshold]
         suffix = f"_filt{threshold}reads"
         return self._inplace(new_df, opposite, inplace, suffix)
 
@@ -1846,8 +3005,9 @@ class CountFilter(Filter):
 
         """
         self._rpm_assertions(threshold=threshold)
-        high_expr = self.df.loc[[True if max(vals) > threshold else False for gene, vals in self.df.iterrows()]]
-        low_expr = self.df.loc[[False if max(vals) > threshold else True for gene, vals in self.df.iterrows()]]
+        is_high = self._row_reduce(np.max) > threshold
+        high_expr = self.df.loc[is_high]
+        low_expr = self.df.loc[~is_high]
         return self._inplace(high_expr, opposite=False, inplace=False, suffix=f'_below{threshold}reads'), \
                self._inplace(low_expr, opposite=False, inplace=False, suffix=f'_above{threshold}reads')
 
@@ -1876,11 +3036,13 @@ class CountFilter(Filter):
 
         """
         self._rpm_assertions(threshold=threshold)
-        new_df = self.df.loc[self.df.sum(axis=1) >= threshold]
+        new_df = self.df.loc[self._row_reduce(np.sum) >= threshold]
         suffix = f"_filt{threshold}sum"
         return self._inplace(new_df, opposite, inplace, suffix)
 
-    def clustergram(self, sample_names: list = 'all', metric: str = 'euclidean', linkage: str = 'average'):
+    def clustergram(self, sample_names: list = 'all', metric: str = 'euclidean', linkage: str = 'average',
+                    top_n_features: int = None, row_linkage: np.ndarray = None, col_linkage: np.ndarray = None,
+                    max_rows: int = 2000):
 
         """
         Performs hierarchical clustering and plots a clustergram on the base-2 log of a given set of samples.
@@ -1896,8 +3058,28 @@ class CountFilter(Filter):
         :type linkage: 'single', 'average', 'complete', 'weighted', 'centroid', 'median' or 'ward'.
         :param linkage: the linkage method to use in the clustergram. \
         For all possible inputs and their meaning see scipy.cluster.hierarchy.linkage documentation online.
-
-        :return: A seaborn clustermap object.
+        :type top_n_features: positive int or None (default None)
+        :param top_n_features: if specified, only the 'top_n_features' features with the highest variance \
+        (of their base-2 log) across the given samples will be clustered and plotted. \
+        Clustering all features requires memory quadratic in the number of features.
+        :type row_linkage: numpy.ndarray or None (default None)
+        :param row_linkage: a precomputed linkage matrix for the features (rows), \
+        for example from a previous clustergram of the same features: 'clustering.dendrogram_row.linkage'. \
+        If None, the linkage will be computed.
+        :type col_linkage: numpy.ndarray or None (default None)
+        :param col_linkage: a precomputed linkage matrix for the samples (columns), \
+        for example from a previous clustergram of the same samples: 'clustering.dendrogram_col.linkage'. \
+        If None, the linkage will be computed.
+        :type max_rows: positive int or None (default 2000)
+        :param max_rows: the maximal number of rows to draw. If more features are clustered, \
+        they will be sorted in the order of the row dendrogram and split into 'max_rows' consecutive bins, \
+        and the mean of every bin will be drawn instead of the individual features. \
+        In that case the row dendrogram is not drawn. If None, all features will be drawn.
+
+        :return: A seaborn clustermap object. \
+        The row and column linkages are available as its attributes 'row_linkage' and 'col_linkage' \
+        (and, when the rows were not binned, also as 'dendrogram_row.linkage' and 'dendrogram_col.linkage'), \
+        and can be passed to later calls to skip the clustering.
 
 
         .. figure::  clustergram.png
@@ -1907,23 +3089,89 @@ class CountFilter(Filter):
            Example plot of clustergram()
 
         """
+        import matplotlib.pyplot as plt
+        import seaborn as sns
         assert isinstance(metric, str) and isinstance(linkage, str), "Linkage and Metric must be strings!"
         metrics = ['braycurtis', 'canberra', 'chebyshev', 'cityblock', 'correlation', 'cosine', 'dice', 'euclidean',
                    'hamming', 'jaccard', 'jensenshannon', 'kulsinski', 'mahalanobis', 'matching', 'minkowski',
                    'rogerstanimoto', 'russellrao', 'seuclidean', 'sokalmichener', 'sokalsneath', 'sqeuclidean', 'yule']
         linkages = ['single', 'complete', 'average', 'weighted', 'centroid', 'median', 'ward']
         assert metric in metrics and linkage in linkages
+        assert max_rows is None or (isinstance(max_rows, int) and max_rows > 0), \
+            f"'max_rows' must be a positive integer or None. Instead got {max_rows}"
 
         if sample_names == 'all':
             sample_names = list(self.df.columns)
-        print('Calculating clustergram...')
+        data = np.log2(self.df[sample_names] + 1)
+        if top_n_features is not None:
+            data = data.iloc[self._top_variable_features(data.values, top_n_features)]
+        for this_linkage, size in zip((row_linkage, col_linkage), data.shape):
+            if this_linkage is not None:
+                assert np.shape(this_linkage) == (size - 1, 4), \
+                    f"Invalid linkage matrix shape {np.shape(this_linkage)}, expected {(size - 1, 4)}. "
+
+        _LOGGER.info('Calculating clustergram...')
+        if row_linkage is None:
+            row_linkage = self._clustergram_linkage(data.values, metric, linkage)
+        if col_linkage is None:
+            col_linkage = self._clustergram_linkage(data.values.T, metric, linkage)
         plt.style.use('seaborn-whitegrid')
-        clustering = sns.clustermap(np.log2(self.df[sample_names] + 1), method=linkage, metric=metric,
-                                    cmap=sns.color_palette("RdBu_r", 10), yticklabels=False)
-        plt.show()
+        if max_rows is not None and data.shape[0] > max_rows:
+            _LOGGER.debug('Drawing %d features in %d bins.', data.shape[0], max_rows)
+            clustering = sns.clustermap(self._bin_rows(data, row_linkage, max_rows), row_cluster=False,
+                                        col_linkage=col_linkage, cmap=sns.color_palette("RdBu_r", 10),
+                                        yticklabels=False, rasterized=True)
+        else:
+            clustering = sns.clustermap(data, row_linkage=row_linkage, col_linkage=col_linkage,
+                                        cmap=sns.color_palette("RdBu_r", 10), yticklabels=False, rasterized=True)
+        clustering.row_linkage = row_linkage
+        clustering.col_linkage = col_linkage
+        general._show_figures('clustergram')
         return clustering
 
-    def plot_expression(self, features: list, sample_grouping: dict, count_unit: str = 'Reads per million'):
+    @staticmethod
+    def _bin_rows(data: pd.DataFrame, row_linkage: np.ndarray, n_bins: int) -> pd.DataFrame:
+        """
+        Internal method, used by CountFilter.clustergram to reduce the number of rows drawn. Static class method. \
+        Sorts the rows of 'data' in the order of the leaves of 'row_linkage', \
+        splits them into 'n_bins' consecutive bins of (nearly) equal size, and averages every bin.
+
+        :param data: a DataFrame whose rows were clustered.
+        :param row_linkage: the linkage matrix of the rows of 'data'.
+        :param n_bins: the number of bins.
+        :return: a DataFrame with 'n_bins' rows, indexed by the first feature of every bin.
+        """
+        from scipy.cluster.hierarchy import leaves_list
+        order = leaves_list(row_linkage)
+        bins = np.array_split(np.arange(len(order)), n_bins)
+        starts = np.array([this_bin[0] for this_bin in bins])
+        sizes = np.array([len(this_bin) for this_bin in bins])
+        values = np.add.reduceat(data.values[order], starts, axis=0) / sizes[:, None]
+        return pd.DataFrame(values, index=data.index[order[starts]], columns=data.columns)
+
+    @staticmethod
+    def _clustergram_linkage(data: np.ndarray, metric: str, linkage: str) -> np.ndarray:
+        """
+        Internal method, used to compute the hierarchical clustering for CountFilter.clustergram. \
+        Static class method. If the optional package 'fastcluster' is installed, it will be used instead of scipy. \
+        For euclidean 'single', 'centroid', 'median' and 'ward' linkages, fastcluster clusters the data \
+        without computing the pairwise distance matrix, and therefore with memory linear in the number of rows.
+
+        :param data: a 2D numpy array, whose rows will be clustered.
+        :param metric: the distance metric to use.
+        :param linkage: the linkage method to use.
+        :return: a linkage matrix, in the format of scipy.cluster.hierarchy.linkage.
+        """
+        try:
+            import fastcluster
+        except ImportError:
+            from scipy.cluster import hierarchy
+            return hierarchy.linkage(data, method=linkage, metric=metric)
+        if metric == 'euclidean' and linkage in {'single', 'centroid', 'median', 'ward'}:
+            return fastcluster.linkage_vector(data, method=linkage, metric=metric)
+        return fastcluster.linkage(data, method=linkage, metric=metric)
+
+    def plot_expression(self, features: list, sample_grouping: dict = None, count_unit: str = 'Reads per million'):
 
         """
         Plot the average expression and standard error of the specified features under the specified conditions.
@@ -1937,7 +3185,8 @@ class CountFilter(Filter):
         a list of the numbers of columns to be used as samples of that condition. \
         For example, if the first 3 columns are replicates of the condition 'condition 1' and \
         the last 3 column are replicates of the condition 'condition 2', then sample_grouping should be: \
-        {'condition 1':[0, 1, 2], 'condition 2':[3, 4, 5]}
+        {'condition 1':[0, 1, 2], 'condition 2':[3, 4, 5]}. \
+        If None, the conditions of the experimental design set by CountFilter.set_design() will be used.
         :type count_unit: str, default 'Reads per million'
         :param count_unit: The unit of the count data. Will be displayed in the y axis.
 
@@ -1948,10 +3197,18 @@ class CountFilter(Filter):
            Example plot of plot_expression()
 
         """
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+        from grid_strategy import strategies
         plt.style.use('seaborn-white')
         if isinstance(features, str):
             features = [features]
         assert isinstance(features, list), "'features' must be a string or list of strings!"
+        if sample_grouping is None:
+            sample_grouping = self._design_groups()
+
+        means = self._group_stat(self.df.loc[features], sample_grouping, 'mean')
+        sems = self._group_stat(self.df.loc[features], sample_grouping, 'sem')
 
         g = strategies.SquareStrategy()
         subplots = g.get_grid(len(features))
@@ -1961,10 +3218,8 @@ class CountFilter(Filter):
         ylims = []
         for subplot, feature in zip(subplots, features):
             axes.append(f.add_subplot(subplot))
-            mean = [self.df.loc[feature].iloc[ind].mean() if isinstance(ind, int) else self.df.loc[feature][ind].mean()
-                    for ind in sample_grouping.values()]
-            sem = [self.df.loc[feature].iloc[ind].sem() if isinstance(ind, int) else self.df.loc[feature][ind].sem() for
-                   ind in sample_grouping.values()]
+            mean = means.loc[feature].values
+            sem = sems.loc[feature].values
             axes[-1].bar(np.arange(len(sample_grouping)), mean, yerr=sem)
             axes[-1].set_xticks(np.arange(len(sample_grouping)))
             axes[-1].set_xticklabels(list(sample_grouping.keys()))
@@ -1975,9 +3230,11 @@ class CountFilter(Filter):
         for ax in axes:
             ax.set_ylim((0.0, max(ylims)))
         f.tight_layout()
-        plt.show()
+        general._show_figures('plot_expression')
 
-    def pca(self, sample_names: list = 'all', n_components=3, sample_grouping: list = None, labels: bool = True):
+    def pca(self, sample_names: list = 'all', n_components=3, sample_grouping: list = None, labels: bool = True,
+            svd_solver: str = 'auto', top_n_features: int = None, batch_size: int = None, float32: bool = False,
+            random_seed: int = None):
 
         """
         runs and plots a PCA for a given set of samples.
@@ -1996,7 +3253,29 @@ class CountFilter(Filter):
         then the sample_grouping will be: \
         [1, 1, 1, 2, 2, 2, 2, 3]. \
         If 'triplicate', then sample_groupins will automatically group samples into triplicates. For example: \
-        [1, 1, 1, 2, 2, 2, 3, 3, 3, 4, 4, 4].
+        [1, 1, 1, 2, 2, 2, 3, 3, 3, 4, 4, 4]. \
+        If None and an experimental design was set, samples will be grouped by their condition.
+        :type labels: bool (default True)
+        :param labels: if True, the name of every sample will be written next to it in the PCA plot.
+        :type svd_solver: 'auto', 'full', 'arpack', 'randomized' or 'incremental' (default 'auto')
+        :param svd_solver: the SVD solver used to compute the PCA. \
+        'auto', 'full', 'arpack' and 'randomized' are passed on to sklearn.decomposition.PCA. \
+        'randomized' is much faster than 'full' on large matrices when n_components is small. \
+        'incremental' uses sklearn.decomposition.IncrementalPCA, which is fitted on batches of 'batch_size' samples. \
+        The per-feature means and standard deviations are computed first, \
+        and every batch of samples is then standardized on its own, \
+        so that the full standardized (samples x features) matrix is never allocated.
+        :type top_n_features: positive int or None (default None)
+        :param top_n_features: if specified, the PCA will be computed only on the 'top_n_features' features \
+        with the highest variance across the given samples.
+        :type batch_size: positive int or None (default None)
+        :param batch_size: the number of samples in each batch when svd_solver is 'incremental'. \
+        Must be at least n_components. If None, batches of 5 * n_components samples will be used.
+        :type float32: bool (default False)
+        :param float32: if True, the standardized matrix will be computed and stored as 32-bit floats, \
+        which halves its memory usage.
+        :type random_seed: non-negative int or None (default None)
+        :param random_seed: the random seed used by the 'arpack' and 'randomized' SVD solvers.
         :return: A tuple whose first element is an sklearn.decomposition.pca object, \
         and second element is a list of matplotlib.axis objects.
 
@@ -2007,15 +3286,26 @@ class CountFilter(Filter):
            Example plot of pca()
 
         """
+        assert svd_solver in {'auto', 'full', 'arpack', 'randomized', 'incremental'}, \
+            f"Invalid svd_solver '{svd_solver}'. "
+        general._assert_random_seed(random_seed)
         if sample_names == 'all':
             sample_names = list(self.df.columns)
-            srna_data = self.df.transpose()
+        if sample_grouping is None and self.design is not None:
+            condition_numbers = {condition: i + 1 for i, condition in enumerate(self.design.groups)}
+            sample_conditions = dict(zip(self.design.samples, self.design.conditions))
+            if all(sample in sample_conditions for sample in sample_names):
+                sample_grouping = [condition_numbers[sample_conditions[sample]] for sample in sample_names]
+        dtype = np.float32 if float32 else np.float64
+        if svd_solver == 'incremental':
+            pca_obj, pcomps = self._incremental_pca(self.df[sample_names].values, n_components, batch_size,
+                                                    top_n_features=top_n_features, dtype=dtype)
         else:
-            srna_data = self.df[sample_names].transpose()
-        srna_data_norm = StandardScaler().fit_transform(srna_data)
-
-        pca_obj = PCA(n_components=n_components)
-        pcomps = pca_obj.fit_transform(srna_data_norm)
+            from sklearn.decomposition import PCA
+            srna_data_norm = self._pca_standardize(self.df[sample_names].values, top_n_features=top_n_features,
+                                                   dtype=dtype)
+            pca_obj = PCA(n_components=n_components, svd_solver=svd_solver, random_state=random_seed)
+            pcomps = pca_obj.fit_transform(srna_data_norm)
         columns = [f'Principal component {i + 1}' for i in range(n_components)]
         principal_df = pd.DataFrame(data=pcomps, columns=columns)
         final_df = principal_df
@@ -2028,11 +3318,118 @@ class CountFilter(Filter):
             axes.append(CountFilter._plot_pca(
                 final_df=final_df[['Principal component 1', f'Principal component {2 + graph}', 'lib']],
                 pc1_var=pc_var[0], pc2_var=pc_var[1 + graph], sample_grouping=sample_grouping, labels=labels))
-
+        general._show_figures('pca', show=False)
         return pca_obj, axes
 
     @staticmethod
-    def _plot_pca(final_df: pd.DataFrame, pc1_var: float, pc2_var: float, sample_grouping: list):
+    def _top_variable_features(data: np.ndarray, top_n_features: int) -> np.ndarray:
+        """
+        Internal method, finds the features with the highest variance across samples in a single vectorized pass. \
+        Static class method.
+
+        :param data: a (features x samples) numpy array.
+        :param top_n_features: the number of features to keep.
+        :return: the sorted row positions of the 'top_n_features' features with the highest variance.
+        """
+        assert isinstance(top_n_features, int) and top_n_features > 0, \
+            f"'top_n_features' must be a positive integer. Instead got {top_n_features}"
+        if top_n_features >= data.shape[0]:
+            return np.arange(data.shape[0])
+        variances = np.var(data, axis=1)
+        return np.sort(np.argpartition(variances, -top_n_features)[-top_n_features:])
+
+    @staticmethod
+    def _pca_feature_stats(data: np.ndarray, dtype=np.float64, chunk_size: int = 4096):
+        """
+        Internal method, computes the mean and standard deviation of every feature across the samples, \
+        one chunk of features at a time. Static class method. \
+        Standard deviations of zero are replaced with 1, so that constant features are standardized to zero.
+
+        :param data: a (features x samples) numpy array.
+        :param dtype: dtype of the computation.
+        :param chunk_size: number of features to process at once.
+        :return: a tuple of two 1D arrays of length n_features: the means and the standard deviations.
+        """
+        n_features = data.shape[0]
+        means = np.empty(n_features, dtype=dtype)
+        stds = np.empty(n_features, dtype=dtype)
+        for start in range(0, n_features, chunk_size):
+            chunk = data[start:start + chunk_size].astype(dtype)
+            means[start:start + chunk_size] = chunk.mean(axis=1)
+            stds[start:start + chunk_size] = chunk.std(axis=1)
+        stds[stds == 0] = 1
+        return means, stds
+
+    @staticmethod
+    def _pca_standardize(data: np.ndarray, top_n_features: int = None, dtype=np.float64, chunk_size: int = 4096):
+        """
+        Internal method, used to prepare the data for CountFilter.pca. Static class method. \
+        Optionally keeps only the features with the highest variance, \
+        and then standardizes every feature to zero mean and unit variance across the samples \
+        (like sklearn.preprocessing.StandardScaler), one chunk of features at a time, \
+        directly into a single preallocated (samples x features) matrix of the requested dtype.
+
+        :param data: a (features x samples) numpy array.
+        :param top_n_features: if not None, only the 'top_n_features' features with the highest variance are kept.
+        :param dtype: dtype of the returned matrix.
+        :param chunk_size: number of features to standardize at once.
+        :return: a standardized (samples x features) numpy array.
+        """
+        if top_n_features is not None:
+            data = data[CountFilter._top_variable_features(data, top_n_features)]
+        means, stds = CountFilter._pca_feature_stats(data, dtype, chunk_size)
+        n_features = data.shape[0]
+        standardized = np.empty((data.shape[1], n_features), dtype=dtype)
+        for start in range(0, n_features, chunk_size):
+            stop = start + chunk_size
+            chunk = data[start:stop].astype(dtype)
+            standardized[:, start:stop] = ((chunk - means[start:stop, None]) / stds[start:stop, None]).T
+        return standardized
+
+    @staticmethod
+    def _incremental_pca(data: np.ndarray, n_components: int, batch_size: int = None, top_n_features: int = None,
+                         dtype=np.float64, chunk_size: int = 4096):
+        """
+        Internal method, fits an sklearn.decomposition.IncrementalPCA on batches of samples \
+        and returns the fitted object and the transformed samples. Static class method. \
+        Every batch of samples is standardized on its own using per-feature statistics computed beforehand, \
+        so at most one (batch_size x features) standardized matrix exists at any time.
+
+        :param data: a (features x samples) numpy array.
+        :param n_components: number of PCA components.
+        :param batch_size: number of samples in each batch. If None, 5 * n_components is used.
+        :param top_n_features: if not None, only the 'top_n_features' features with the highest variance are used.
+        :param dtype: dtype of the standardized batches.
+        :param chunk_size: number of features to process at once when computing the per-feature statistics.
+        :return: a tuple of the fitted IncrementalPCA object and a (samples x n_components) array.
+        """
+        from sklearn.decomposition import IncrementalPCA
+        if batch_size is None:
+            batch_size = 5 * n_components
+        assert isinstance(batch_size, int) and batch_size >= n_components, \
+            f"'batch_size' must be an integer no smaller than n_components ({n_components}). Instead got {batch_size}"
+        if top_n_features is not None:
+            data = data[CountFilter._top_variable_features(data, top_n_features)]
+        means, stds = CountFilter._pca_feature_stats(data, dtype, chunk_size)
+        n_samples = data.shape[1]
+        bounds = list(range(0, n_samples, batch_size)) + [n_samples]
+        # a final batch with fewer than n_components samples cannot be fitted on its own, so it joins the previous one
+        if len(bounds) > 2 and bounds[-1] - bounds[-2] < n_components:
+            del bounds[-2]
+        batches = list(zip(bounds[:-1], bounds[1:]))
+
+        def standardized_batch(start: int, stop: int):
+            return ((data[:, start:stop].astype(dtype) - means[:, None]) / stds[:, None]).T
+
+        pca_obj = IncrementalPCA(n_components=n_components, batch_size=batch_size)
+        for start, stop in batches:
+            pca_obj.partial_fit(standardized_batch(start, stop))
+        pcomps = np.vstack([pca_obj.transform(standardized_batch(start, stop)) for start, stop in batches])
+        return pca_obj, pcomps
+
+    @staticmethod
+    def _plot_pca(final_df: pd.DataFrame, pc1_var: float, pc2_var: float, sample_grouping: list,
+                  labels: bool = True):
         """
         Internal method, used to plot the results from CountFilter.pca. Static class method.
 
@@ -2044,9 +3441,11 @@ class CountFilter(Filter):
         ["1A_N2_25", "1B_N2_25", "1C_N2_25", "2A_rde4_25", "2B_rde4_25", "2C_rde4_25"], \
         then the sample_grouping will be: \
         [0,0,0,1,1,1]
+        :param labels: if True, the name of every sample will be written next to it in the plot.
         :return: an axis object containing the PCA plot.
 
         """
+        import matplotlib.pyplot as plt
         plt.style.use('seaborn-whitegrid')
 
         if sample_grouping is None:
@@ -2066,15 +3465,17 @@ class CountFilter(Filter):
         colors = [color_opts[i - 1] for i in sample_grouping]
 
         ax.scatter(final_df.iloc[:, 0], final_df.iloc[:, 1], c=colors, s=50)
-        for _, row in final_df.iterrows():
-            row[0] += 1
-            row[1] += 1
-            ax.text(*row)
+        if labels:
+            for _, row in final_df.iterrows():
+                row[0] += 1
+                row[1] += 1
+                ax.text(*row)
         ax.grid(True)
         return ax
 
     def scatter_sample_vs_sample(self, sample1: Union[str, List[str]], sample2: Union[str, List[str]],
-                                 xlabel: str = None, ylabel: str = None, title: str = None, highlight=None):
+                                 xlabel: str = None, ylabel: str = None, title: str = None, highlight=None,
+                                 density: bool = False, bins: int = 256):
 
         """
         Generate a scatter plot where every dot is a feature, the x value is log10 of reads \
@@ -2095,6 +3496,13 @@ class CountFilter(Filter):
         :param highlight: If specified, the points in the scatter corresponding to the names/features in 'highlight' \
         will be highlighted in red.
         :type highlight: Filter object or iterable of strings
+        :type density: bool (default False)
+        :param density: if True, the features will be drawn as a single density image (a 2D histogram) \
+        instead of individual points, while highlighted features are still drawn as points. \
+        Recommended for very large tables, since the time it takes to render the plot and the size of the saved \
+        figure will no longer grow with the number of features.
+        :type bins: positive int (default 256)
+        :param bins: number of bins along each axis of the density image, if density is True.
         :return: a matplotlib axis object.
 
         .. figure::  rpm_vs_rpm.png
@@ -2105,6 +3513,7 @@ class CountFilter(Filter):
 
 
         """
+        import matplotlib.pyplot as plt
         self._rpm_assertions()
         assert isinstance(sample1, (str, list, tuple, set)) and isinstance(sample2, (str, list, tuple, set))
         xvals = np.log10(self.df[sample1].values + 1) if isinstance(sample1, str) else np.log10(
@@ -2124,7 +3533,10 @@ class CountFilter(Filter):
         ax.set_xlabel(xlabel, fontsize=15)
         ax.set_ylabel(ylabel, fontsize=15)
         ax.set_title(title, fontsize=17)
-        ax.scatter(xvals, yvals, s=3, c='#6d7178')
+        if density:
+            self._density_scatter(ax, xvals, yvals, bins=bins)
+        else:
+            ax.scatter(xvals, yvals, s=3, c='#6d7178')
 
         if highlight is not None:
             highlight_features = highlight.index_set if issubclass(highlight.__class__,
@@ -2143,10 +3555,87 @@ class CountFilter(Filter):
                 isinstance(sample2, str) else np.log10(self.df[sample2].loc[highlight_features].mean(axis=1).values + 1)
 
             ax.scatter(xvals_highlight, yvals_highlight, s=3, c=np.array([[0.75, 0.1, 0.1]]))
-        plt.show()
+        general._show_figures('scatter_sample_vs_sample')
         return ax
 
-    def box_plot(self, samples='all', notch: bool = True, scatter: bool = False, ylabel: str = 'log10(RPM + 1)'):
+    def _box_violin_data(self, samples, subsample: int = None, random_seed: int = None) -> pd.DataFrame:
+
+        """
+        Internal method, used to prepare the data for CountFilter.box_plot and CountFilter.violin_plot. \
+        Averages grouped samples, optionally draws a random subsample of the features, \
+        and transforms the values to log10(x + 1).
+
+        :param samples: the 'samples' argument of box_plot/violin_plot.
+        :param subsample: if not None, the number of features to randomly draw (without replacement).
+        :param random_seed: the random seed used to draw the subsample.
+        :return: a DataFrame of log10(x + 1)-transformed values, where every column is a sample or sample group.
+        """
+        self._rpm_assertions()
+        general._assert_random_seed(random_seed)
+        samples_df = self.df if samples == 'all' else self._avg_subsamples(samples)
+        if subsample is not None:
+            assert isinstance(subsample, int) and subsample > 0, \
+                f"'subsample' must be a positive integer. Instead got {subsample}"
+            if subsample < samples_df.shape[0]:
+                rng = np.random.default_rng(random_seed)
+                samples_df = samples_df.iloc[np.sort(rng.choice(samples_df.shape[0], subsample, replace=False))]
+        return np.log10(samples_df + 1)
+
+    @staticmethod
+    def _box_stats(values: np.ndarray, labels: list) -> List[dict]:
+
+        """
+        Internal method, computes the box plot statistics of every column of 'values' in one vectorized pass, \
+        in the format of matplotlib.axes.Axes.bxp. Whiskers extend to the furthest data point within \
+        1.5 IQR of the box, and notches indicate the 95% confidence interval of the median. Static class method.
+
+        :param values: a 2D numpy array, where every column is a sample.
+        :param labels: the names of the samples.
+        :return: a list of dictionaries of box plot statistics, one for every sample.
+        """
+        q1, med, q3 = np.percentile(values, [25, 50, 75], axis=0)
+        iqr = q3 - q1
+        whislo = np.where(values >= q1 - 1.5 * iqr, values, np.inf).min(axis=0)
+        whishi = np.where(values <= q3 + 1.5 * iqr, values, -np.inf).max(axis=0)
+        notch_width = 1.57 * iqr / np.sqrt(values.shape[0])
+        mean = values.mean(axis=0)
+        return [dict(label=label, med=med[i], q1=q1[i], q3=q3[i], iqr=iqr[i], whislo=whislo[i], whishi=whishi[i],
+                     cilo=med[i] - notch_width[i], cihi=med[i] + notch_width[i], mean=mean[i], fliers=np.array([]))
+                for i, label in enumerate(labels)]
+
+    @staticmethod
+    def _violin_stats(values: np.ndarray, points: int = 100, smoothing: float = 2) -> List[dict]:
+
+        """
+        Internal method, estimates the density of every column of 'values' in the format of \
+        matplotlib.axes.Axes.violin. All columns are binned together in one vectorized pass into histograms \
+        with shared bins, which are then smoothed with a gaussian kernel. Static class method.
+
+        :param values: a 2D numpy array, where every column is a sample.
+        :param points: the number of bins of the density histograms.
+        :param smoothing: the standard deviation (in bins) of the gaussian kernel used to smooth the histograms.
+        :return: a list of dictionaries of violin plot statistics, one for every sample.
+        """
+        from scipy.ndimage import gaussian_filter1d
+        n_rows, n_cols = values.shape
+        vmin, vmax = values.min(axis=0), values.max(axis=0)
+        edges = np.linspace(vmin.min(), vmax.max() + np.finfo(float).eps, points + 1)
+        bin_idx = np.clip(np.searchsorted(edges, values, side='right') - 1, 0, points - 1)
+        counts = np.bincount((bin_idx + np.arange(n_cols) * points).ravel(), minlength=points * n_cols)
+        density = gaussian_filter1d(counts.reshape(n_cols, points).astype(float), smoothing, axis=1,
+                                    mode='constant') / (n_rows * (edges[1] - edges[0]))
+        coords = (edges[:-1] + edges[1:]) / 2
+        mean = values.mean(axis=0)
+        median = np.median(values, axis=0)
+        stats = []
+        for i in range(n_cols):
+            in_range = (coords >= vmin[i] - (edges[1] - edges[0])) & (coords <= vmax[i] + (edges[1] - edges[0]))
+            stats.append(dict(coords=coords[in_range], vals=density[i][in_range], mean=mean[i], median=median[i],
+                              min=vmin[i], max=vmax[i]))
+        return stats
+
+    def box_plot(self, samples='all', notch: bool = True, scatter: bool = False, ylabel: str = 'log10(RPM + 1)',
+                 summary: bool = False, subsample: int = None, random_seed: int = None):
 
         """
         Generates a box plot of the specified samples in the CountFilter object in log10 scale. \
@@ -2162,6 +3651,14 @@ class CountFilter(Filter):
         [['SAMPLE1A', 'SAMPLE1B', 'SAMPLE1C'], ['SAMPLE2A', 'SAMPLE2B', 'SAMPLE2C'],'SAMPLE3' , 'SAMPLE6']
         :type ylabel: str (default 'Log10(RPM + 1)')
         :param ylabel: the label of the Y axis.
+        :type summary: bool (default False)
+        :param summary: if True, the box plot statistics of all samples will be computed in one vectorized pass \
+        and drawn directly, without passing the data to seaborn. Outliers are not drawn. \
+        Recommended for CountFilter objects with many features or samples.
+        :type subsample: positive int or None (default None)
+        :param subsample: if specified, only a random subsample of 'subsample' features will be plotted.
+        :type random_seed: non-negative int or None (default None)
+        :param random_seed: the random seed used to draw the subsample.
         :return: a seaborn box plot object.
 
         .. figure::  ???.png
@@ -2172,25 +3669,27 @@ class CountFilter(Filter):
 
 
         """
-        self._rpm_assertions()
-        if samples == 'all':
-            samples_df = self.df
-        else:
-            samples_df = self._avg_subsamples(samples)
-
-        samples_df = np.log10(samples_df + 1)
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+        samples_df = self._box_violin_data(samples, subsample, random_seed)
         fig = plt.figure(figsize=(8, 8))
 
-        box = sns.boxplot(data=np.log10(samples_df + 1), notch=notch)
+        if summary:
+            box = fig.add_subplot(1, 1, 1)
+            box.bxp(self._box_stats(samples_df.values, list(samples_df.columns)), positions=range(samples_df.shape[1]),
+                    shownotches=notch, showfliers=False, patch_artist=True)
+        else:
+            box = sns.boxplot(data=samples_df, notch=notch)
         if scatter:
-            scat = sns.stripplot(data=np.log10(samples_df + 1), color='gray', size=2)
+            sns.stripplot(data=samples_df, color='gray', size=2)
         plt.style.use('seaborn-whitegrid')
         plt.xlabel("Samples")
         plt.ylabel(ylabel)
-        plt.show()
+        general._show_figures('box_plot')
         return box
 
-    def violin_plot(self, samples='all', ylabel: str = 'log10(RPM + 1)'):
+    def violin_plot(self, samples='all', ylabel: str = 'log10(RPM + 1)', summary: bool = False,
+                    subsample: int = None, random_seed: int = None):
 
         """
         Generates a violin plot of the specified samples in the CountFilter object in log10 scale. \
@@ -2206,6 +3705,14 @@ class CountFilter(Filter):
         [['SAMPLE1A', 'SAMPLE1B', 'SAMPLE1C'], ['SAMPLE2A', 'SAMPLE2B', 'SAMPLE2C'],'SAMPLE3' , 'SAMPLE6']
         :type ylabel: str (default 'Log10(RPM + 1)')
         :param ylabel: the label of the Y axis.
+        :type summary: bool (default False)
+        :param summary: if True, the densities and quartiles of all samples will be computed in one vectorized pass \
+        (densities are estimated from smoothed histograms instead of a KDE) and drawn directly, \
+        without passing the data to seaborn. Recommended for CountFilter objects with many features or samples.
+        :type subsample: positive int or None (default None)
+        :param subsample: if specified, only a random subsample of 'subsample' features will be plotted.
+        :type random_seed: non-negative int or None (default None)
+        :param random_seed: the random seed used to draw the subsample.
         :return: a seaborn violin object.
 
         .. figure::  violin.png
@@ -2216,20 +3723,26 @@ class CountFilter(Filter):
 
 
         """
-        self._rpm_assertions()
-        if samples == 'all':
-            samples_df = self.df
-        else:
-            samples_df = self._avg_subsamples(samples)
-
-        samples_df = np.log10(samples_df + 1)
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+        samples_df = self._box_violin_data(samples, subsample, random_seed)
         fig = plt.figure(figsize=(8, 8))
 
-        violin = sns.violinplot(data=samples_df)
+        if summary:
+            violin = fig.add_subplot(1, 1, 1)
+            positions = np.arange(samples_df.shape[1])
+            violin.violin(self._violin_stats(samples_df.values), positions=positions, widths=0.8, showextrema=False)
+            q1, med, q3 = np.percentile(samples_df.values, [25, 50, 75], axis=0)
+            violin.vlines(positions, q1, q3, color='k', linewidth=5)
+            violin.scatter(positions, med, color='white', s=10, zorder=3)
+            violin.set_xticks(positions)
+            violin.set_xticklabels(samples_df.columns)
+        else:
+            violin = sns.violinplot(data=samples_df)
         plt.style.use('seaborn-whitegrid')
         plt.xlabel("Samples")
         plt.ylabel(ylabel)
-        plt.show()
+        general._show_figures('violin_plot')
         return violin
 
     # TODO: add ranksum test
@@ -2258,7 +3771,9 @@ class CountFilter(Filter):
         the '.csv' suffix.
         :param uncounted_fname: counted_fname: str. Name under which to save the combined uncounted data. \
         Does not need to include the '.csv' suffix.
-        :param input_format: the file format of the input files. Default is '.txt'.
+        :param input_format: the file format of the input files. Default is '.txt'. \
+        Files compressed with gzip, bzip2, xz or zstd (for example 'sample1.txt.gz') are read as well, \
+        and are decompressed while they are read.
         :return: an CountFilter object containing the combined count data from all individual htcount .txt files in the \
         specified folder.
 
@@ -2289,8 +3804,11 @@ class CountFilter(Filter):
         folder = Path(folder_path)
         df = pd.DataFrame()
         for item in folder.iterdir():
-            if item.is_file() and item.suffix == input_format:
-                df = pd.concat([df, pd.read_csv(item, sep='\t', index_col=0, names=[item.stem])], axis=1)
+            uncompressed = general._strip_compression_suffix(item)
+            if item.is_file() and uncompressed.suffix == input_format:
+                with general._open_input(item) as source:
+                    sample = pd.read_csv(source, sep='\t', index_col=0, names=[uncompressed.stem])
+                df = pd.concat([df, sample], axis=1)
         assert not df.empty, f"Error: no valid files with suffix {file_suffix} were found in the folder {folder_path}!"
 
         uncounted = df.loc[
@@ -4,15 +4,198 @@ reading and updating the settings file, identifying type of input variables, etc
 This module is used mainly by other modules.
 """
 
+import numpy as np
 import pandas as pd
 from pathlib import Path
 import os
 import re
+import sys
 import time
+import logging
+import threading
 import subprocess
+import contextlib
+import importlib.util
 import yaml
 from typing import Union, List, Set, Dict, Tuple
-from rnalysis import __path__, __attr_file_key__, __biotype_file_key__
+from rnalysis import __path__, __attr_file_key__, __biotype_file_key__, __go_cache_dir_key__, \
+    __enrichment_plot_key__, __profile_key__
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """
+    A logging handler that writes to the current sys.stdout, \
+    so that messages reach notebooks and other environments which replace sys.stdout after import. \
+    Unless it was installed explicitly through set_verbosity(), it only writes messages \
+    when the application did not configure logging handlers of its own, since those already receive the messages.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.explicit = False
+
+    def emit(self, record):
+        if self.explicit or not _logging_configured():
+            super().emit(record)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+_LOGGER = logging.getLogger('rnalysis')
+_STDOUT_HANDLER = _StdoutHandler()
+if not _LOGGER.handlers:
+    _LOGGER.addHandler(logging.NullHandler())
+    _LOGGER.addHandler(_STDOUT_HANDLER)
+    _LOGGER.setLevel(logging.INFO)
+
+_VERBOSITY_LEVELS = {'silent': logging.CRITICAL + 10, 'warning': logging.WARNING, 'info': logging.INFO,
+                     'debug': logging.DEBUG}
+_PROGRESS = {'callback': None, 'interval': 1.0}
+
+
+def _logging_configured() -> bool:
+    """
+    Returns True if messages of the 'rnalysis' logger propagate to a logger with handlers, \
+    meaning the application configured logging of its own.
+    """
+    logger = _LOGGER
+    while logger.propagate and logger.parent is not None:
+        logger = logger.parent
+        if logger.handlers:
+            return True
+    return False
+
+
+def set_verbosity(level: str = 'info'):
+    """
+    Sets how much RNAlysis reports about the operations it performs. \
+    RNAlysis reports through the 'rnalysis' logger of the Python logging module, \
+    so its messages can also be redirected or formatted using the logging module. \
+    By default, messages are printed to stdout only if no logging handlers were configured; \
+    calling this function prints them to stdout regardless.
+
+    :param level: 'silent' reports nothing. 'warning' reports only problems. \
+    'info' reports the results of filtering operations and the progress of long computations. \
+    'debug' reports additional details.
+    :type level: 'silent', 'warning', 'info' or 'debug' (default 'info')
+
+    :Examples:
+    >>> from rnalysis import general
+    >>> general.set_verbosity('silent')
+    """
+    assert level in _VERBOSITY_LEVELS, f"Invalid verbosity level '{level}'. " \
+                                       f"Valid levels are: {list(_VERBOSITY_LEVELS.keys())}"
+    _LOGGER.setLevel(_VERBOSITY_LEVELS[level])
+    _STDOUT_HANDLER.explicit = True
+    if _STDOUT_HANDLER not in _LOGGER.handlers:
+        _LOGGER.addHandler(_STDOUT_HANDLER)
+
+
+def get_verbosity() -> str:
+    """
+    Returns the current verbosity level of RNAlysis (see general.set_verbosity()).
+
+    :rtype: 'silent', 'warning', 'info' or 'debug'
+    """
+    level = _LOGGER.getEffectiveLevel()
+    for name, value in sorted(_VERBOSITY_LEVELS.items(), key=lambda item: item[1]):
+        if level <= value:
+            return name
+    return 'silent'
+
+
+def set_progress_callback(callback=None, min_interval: float = 1.0):
+    """
+    Sets a function to be called with progress updates during long computations \
+    (such as randomization tests and enrichment analyses), and how often progress updates are reported. \
+    Progress is reported at most once every 'min_interval' seconds, and once more when the computation ends.
+
+    :param callback: a function that receives the keyword arguments 'desc' (description of the computation), \
+    'done' and 'total' (number of steps), 'elapsed' and 'eta' (in seconds). \
+    If None, progress will only be reported through the logger.
+    :type callback: callable or None (default None)
+    :param min_interval: the minimal time in seconds between two progress updates.
+    :type min_interval: non-negative float (default 1.0)
+
+    :Examples:
+    >>> from rnalysis import general
+    >>> general.set_progress_callback(lambda desc, done, total, elapsed, eta: print(f'{done}/{total}'), 5)
+    """
+    assert callback is None or callable(callback), f"'callback' must be callable or None. Instead got {callback}"
+    assert isinstance(min_interval, (int, float)) and min_interval >= 0, \
+        f"'min_interval' must be a non-negative number. Instead got {min_interval}"
+    _PROGRESS['callback'] = callback
+    _PROGRESS['interval'] = min_interval
+
+
+class _Progress:
+    """
+    A throttled progress reporter for long computations. \
+    Reports through the logger and the progress callback (see general.set_progress_callback()) \
+    at most once every 'min_interval' seconds, and when the computation ends. \
+    When neither is enabled, updates return immediately.
+    """
+    __slots__ = {'desc': 'description of the computation', 'total': 'total number of steps',
+                 'done': 'number of steps done', 'start': 'start time', 'last': 'time of the last report',
+                 'callback': 'progress callback', 'log': 'whether to report through the logger',
+                 'enabled': 'whether to report at all'}
+
+    def __init__(self, total: int, desc: str):
+        self.desc = desc
+        self.total = total
+        self.done = 0
+        self.callback = _PROGRESS['callback']
+        self.log = _LOGGER.isEnabledFor(logging.INFO)
+        self.enabled = self.log or self.callback is not None
+        self.start = self.last = time.perf_counter()
+
+    def update(self, n: int = 1):
+        """
+        Marks 'n' more steps as done, and reports the progress if enough time passed since the last report.
+        """
+        if not self.enabled:
+            return
+        self.done += n
+        now = time.perf_counter()
+        if self.done < self.total and now - self.last < _PROGRESS['interval']:
+            return
+        self.last = now
+        elapsed = now - self.start
+        eta = elapsed * (self.total - self.done) / self.done if self.done > 0 else np.nan
+        if self.log:
+            _LOGGER.info("%s: %d/%d (%.0f%%), %.1fs elapsed, ETA %.1fs", self.desc, self.done, self.total,
+                         100 * self.done / self.total, elapsed, eta)
+        if self.callback is not None:
+            self.callback(desc=self.desc, done=self.done, total=self.total, elapsed=elapsed, eta=eta)
+
+
+def _wait_with_progress(async_result, desc: str, poll_interval: float = 0.25):
+    """
+    Waits for an ipyparallel AsyncResult to finish, reporting the number of completed tasks through _Progress, \
+    and returns its result.
+
+    :param async_result: the ipyparallel AsyncResult to wait for.
+    :param desc: description of the computation.
+    :param poll_interval: the time in seconds to wait between two checks of the completed tasks.
+    """
+    progress = _Progress(len(async_result.msg_ids), desc)
+    if progress.enabled:
+        done = 0
+        finished = False
+        while not finished:
+            async_result.wait(poll_interval)
+            finished = async_result.ready()
+            completed = async_result.progress
+            if completed > done:
+                progress.update(completed - done)
+                done = completed
+    return async_result.result()
 
 
 def _start_ipcluster(n_engines: int = 'default'):
@@ -53,7 +236,7 @@ def start_parallel_session(n_engines: int = 'default'):
     Starting parallel session...
     Parallel session started successfully
     """
-    print("Starting parallel session...")
+    _LOGGER.info("Starting parallel session...")
     _stop_ipcluster()
     time.sleep(1)
     stream = _start_ipcluster(n_engines)
@@ -62,7 +245,7 @@ def start_parallel_session(n_engines: int = 'default'):
         line = stream.stderr.readline()
         if 'Engines appear to have started successfully' in str(line):
             break
-    print('Parallel session started successfully')
+    _LOGGER.info('Parallel session started successfully')
 
 
 def parse_wbgene_string(string):
@@ -127,44 +310,89 @@ def parse_gene_name_string(string):
     return set(re.findall(r'[a-z]{3,4}-[A-Z,0-9,.]{1,4}', string))
 
 
+_SETTINGS_FILE_ENV_VAR = 'RNALYSIS_SETTINGS_FILE'
+_SETTINGS_ENV_OVERRIDES = {__attr_file_key__: 'RNALYSIS_ATTR_REF_TABLE',
+                           __biotype_file_key__: 'RNALYSIS_BIOTYPE_REF_TABLE',
+                           __go_cache_dir_key__: 'RNALYSIS_GO_CACHE_DIR'}
+_SETTINGS_CACHE = {'path': None, 'signature': None, 'settings': None, 'reported': {}}
+
+
 def _get_settings_file_path():
     """
-    Generates the full path of the settings.yaml file.
+    Generates the full path of the settings.yaml file. \
+    If the environment variable RNALYSIS_SETTINGS_FILE is set, its value is used as the path of the settings file \
+    (for example, to give every worker of a cluster job its own settings file).
     :returns: the path of the settings.yaml file.
     :rtype: pathlib.Path
     """
     # return Path(os.path.join(os.path.dirname(__file__), 'settings.yaml'))
+    env_path = os.environ.get(_SETTINGS_FILE_ENV_VAR)
+    if env_path:
+        return Path(env_path)
     return Path(os.path.join(__path__[0], 'settings.yaml'))
 
 
+def _settings_file_signature(settings_pth: Path):
+    """
+    Internal function, returns a signature of the settings file which changes whenever the file is modified or replaced.
+
+    :param settings_pth: the path of the settings file.
+    :return: a tuple of (modification time, size, inode), or None if the settings file does not exist.
+    """
+    try:
+        stat = os.stat(settings_pth)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
 def _load_settings_file():
     """
-    loads and parses the settings.yaml file into a dictionary.
+    loads and parses the settings.yaml file into a dictionary. \
+    The parsed settings are cached, and the file is parsed again only if it was modified since it was last read.
     :rtype: dict
     """
     settings_pth = _get_settings_file_path()
-    if not settings_pth.exists():
-        return dict()
-    with open(settings_pth) as f:
-        settings = yaml.safe_load(f)
-        if settings is None:
-            settings = dict()
-        return settings
+    signature = _settings_file_signature(settings_pth)
+    if _SETTINGS_CACHE['path'] == settings_pth and _SETTINGS_CACHE['signature'] == signature and \
+            _SETTINGS_CACHE['settings'] is not None:
+        return dict(_SETTINGS_CACHE['settings'])
+    if signature is None:
+        settings = dict()
+    else:
+        with open(settings_pth) as f:
+            settings = yaml.safe_load(f)
+            if settings is None:
+                settings = dict()
+    _SETTINGS_CACHE.update(path=settings_pth, signature=signature, settings=settings)
+    return dict(settings)
 
 
 def _update_settings_file(value: str, key: str):
     """
-    Receives a key and a value, and updates/adds the key and value to the settings.yaml file.
+    Receives a key and a value, and updates/adds the key and value to the settings.yaml file. \
+    The file is replaced atomically, so that other processes never read a partially-written settings file.
     :param value: the value to be added/updated (such as Reference Table path)
     :type value: str
     :param key: the key to be added/updated (such as __attr_file_key__)
     :type key: str
     """
+    import tempfile
     settings_pth = _get_settings_file_path()
     out = _load_settings_file()
     out[key] = value
-    with open(settings_pth, 'w') as f:
-        yaml.safe_dump(out, f)
+    mode = os.stat(settings_pth).st_mode & 0o777 if settings_pth.exists() else 0o644
+    fd, tmp_pth = tempfile.mkstemp(prefix=f'.{settings_pth.name}.', suffix='.tmp', dir=settings_pth.parent)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            yaml.safe_dump(out, f)
+        os.chmod(tmp_pth, mode)
+        os.replace(tmp_pth, settings_pth)
+    except BaseException:
+        if os.path.exists(tmp_pth):
+            os.remove(tmp_pth)
+        raise
+    _SETTINGS_CACHE.update(path=settings_pth, signature=_settings_file_signature(settings_pth), settings=out)
 
 
 def reset_settings_file():
@@ -173,16 +401,19 @@ def reset_settings_file():
     """
     settings_pth = _get_settings_file_path()
     if not settings_pth.exists():
-        print("No local settings file exists. ")
+        _LOGGER.info("No local settings file exists. ")
     else:
         settings_pth.unlink()
-        print(f"Local settings file was deleted. ")
+        _LOGGER.info("Local settings file was deleted. ")
+    _SETTINGS_CACHE.update(path=None, signature=None, settings=None)
 
 
 def _read_value_from_settings(key):
     """
     Attempt to read the value corresponding to a given key from the settings.yaml file. \
-    If the key was not previously defined, the user will be prompted to define it.
+    If the key was not previously defined, the user will be prompted to define it. \
+    Reference Table paths and the GO dictionary cache directory can be overridden by the environment variables \
+    RNALYSIS_ATTR_REF_TABLE, RNALYSIS_BIOTYPE_REF_TABLE and RNALYSIS_GO_CACHE_DIR.
 
     :type key: str
     :param key: the key in the settings file whose value to read.
@@ -190,6 +421,9 @@ def _read_value_from_settings(key):
     :return:
     The path of the reference table.
     """
+    env_value = _read_env_override(key)
+    if env_value is not None:
+        return env_value
     settings = _load_settings_file()
     if key not in settings:
         _update_settings_file(input(f'Please insert the full path of {key}:\n'), key)
@@ -197,6 +431,54 @@ def _read_value_from_settings(key):
     return settings[key]
 
 
+def _read_env_override(key):
+    """
+    Internal function, returns the value of the environment variable which overrides the given settings key, \
+    or None if the key has no such environment variable or it is not set.
+
+    :type key: str
+    :param key: the key in the settings file.
+    """
+    env_var = _SETTINGS_ENV_OVERRIDES.get(key)
+    if env_var is None:
+        return None
+    return os.environ.get(env_var) or None
+
+
+def _read_optional_value_from_settings(key, default=None):
+    """
+    Attempt to read the value corresponding to a given key from the settings.yaml file. \
+    Unlike _read_value_from_settings, the user will not be prompted if the key was not previously defined.
+
+    :type key: str
+    :param key: the key in the settings file whose value to read.
+    :param default: the value to return if the key was not previously defined.
+
+    :return:
+    The value saved in the settings file, or 'default' if the key was not previously defined.
+    """
+    env_value = _read_env_override(key)
+    if env_value is not None:
+        return env_value
+    settings = _load_settings_file()
+    return settings.get(key, default)
+
+
+def _report_setting(description: str, key: str, value):
+    """
+    Internal function, logs the value of a setting that is used. \
+    The value is logged at the INFO level only the first time it is used, or when it changes, \
+    and at the DEBUG level otherwise.
+
+    :param description: a description of the setting, such as 'Attribute Reference Table used'.
+    :param key: the key of the setting in the settings file.
+    :param value: the value of the setting.
+    """
+    level = logging.DEBUG if _SETTINGS_CACHE['reported'].get(key) == value else logging.INFO
+    _SETTINGS_CACHE['reported'][key] = value
+    _LOGGER.log(level, '%s: %s', description, value)
+
+
 def set_attr_ref_table_path(path: str = None):
     """
     Defines/updates the Attribute Reference Table path in the settings file.
@@ -212,7 +494,7 @@ def set_attr_ref_table_path(path: str = None):
     if path is None:
         path = input("Please write the new Attribute Reference Table Path:\n")
     _update_settings_file(path, __attr_file_key__)
-    print(f'Attribute Reference Table path set as: {path}')
+    _LOGGER.info('Attribute Reference Table path set as: %s', path)
 
 
 def set_biotype_ref_table_path(path: str = None):
@@ -230,12 +512,14 @@ def set_biotype_ref_table_path(path: str = None):
     if path is None:
         path = input("Please write the new Attribute Reference Table Path:\n")
     _update_settings_file(path, __biotype_file_key__)
-    print(f'Biotype Reference Table path set as: {path}')
+    _LOGGER.info('Biotype Reference Table path set as: %s', path)
 
 
 def read_biotype_ref_table_path():
     """
-    Reads the Biotype Reference Table path from the settings file.
+    Reads the Biotype Reference Table path from the settings file, \
+    or from the environment variable RNALYSIS_BIOTYPE_REF_TABLE if it is set. \
+    The path is printed only the first time it is used, or when it changes.
 
     :returns: the path of the Biotype Reference Table that is saved in the settings file.
     :rtype: str
@@ -246,13 +530,15 @@ def read_biotype_ref_table_path():
     Biotype Reference Table used: my_biotype_reference_table_path
     """
     pth = _read_value_from_settings(__biotype_file_key__)
-    print(f'Biotype Reference Table used: {pth}')
+    _report_setting('Biotype Reference Table used', __biotype_file_key__, pth)
     return pth
 
 
 def read_attr_ref_table_path():
     """
-    Reads the Attribute Reference Table path from the settings file.
+    Reads the Attribute Reference Table path from the settings file, \
+    or from the environment variable RNALYSIS_ATTR_REF_TABLE if it is set. \
+    The path is printed only the first time it is used, or when it changes.
 
     :returns: the path of the Attribute Reference Table that is saved in the settings file.
     :rtype: str
@@ -263,19 +549,582 @@ def read_attr_ref_table_path():
     Attribute Reference Table used: my_attribute_reference_table_path
     """
     pth = _read_value_from_settings(__attr_file_key__)
-    print(f'Attribute Reference Table used: {pth}')
+    _report_setting('Attribute Reference Table used', __attr_file_key__, pth)
     return pth
 
 
+def set_go_cache_dir(path: str = None):
+    """
+    Defines/updates the directory in which GO/Tissue/Phenotype dictionaries are cached, in the settings file. \
+    Cached dictionaries are used by enrichment.FeatureSet.go_enrichment() \
+    instead of fetching the dictionaries from the internet in every new session.
+    :param path: the path of the directory you wish to use for caching. \
+    If None, the cache directory will be reset to the default directory inside the package folder.
+    :type path: str or pathlib.Path
+
+    :Examples:
+    >>> from rnalysis import general
+    >>> path="my_cache_directory"
+    >>> general.set_go_cache_dir(path)
+    GO dictionary cache directory set as: my_cache_directory
+    """
+    if path is None:
+        path = str(_get_default_go_cache_dir())
+    _update_settings_file(str(path), __go_cache_dir_key__)
+    _LOGGER.info('GO dictionary cache directory set as: %s', path)
+
+
+def _get_default_go_cache_dir():
+    """
+    Generates the full path of the default GO dictionary cache directory.
+    :returns: the path of the default GO dictionary cache directory.
+    :rtype: pathlib.Path
+    """
+    return Path(os.path.join(__path__[0], 'go_dictionary_cache'))
+
+
+def read_go_cache_dir():
+    """
+    Reads the GO dictionary cache directory from the settings file, \
+    or from the environment variable RNALYSIS_GO_CACHE_DIR if it is set. \
+    If no directory was previously defined, returns the default directory inside the package folder.
+
+    :returns: the path of the GO dictionary cache directory.
+    :rtype: pathlib.Path
+
+    :Examples:
+    >>> from rnalysis import general
+    >>> my_path = general.read_go_cache_dir()
+    """
+    return Path(_read_optional_value_from_settings(__go_cache_dir_key__, _get_default_go_cache_dir()))
+
+
+def set_enrichment_plotting(plot: bool = True):
+    """
+    Defines/updates in the settings file whether enrichment functions should plot their results by default. \
+    Disabling plotting is useful when running many enrichment analyses on headless machines. \
+    The setting can be overridden in each call using the enrichment functions' 'plot' argument.
+    :param plot: if True, enrichment functions will plot their results by default. If False, they will not.
+    :type plot: bool (default True)
+
+    :Examples:
+    >>> from rnalysis import general
+    >>> general.set_enrichment_plotting(False)
+    Enrichment results will not be plotted by default.
+    """
+    assert isinstance(plot, bool), f"'plot' must be True or False. Instead got {type(plot)}"
+    _update_settings_file(plot, __enrichment_plot_key__)
+    _LOGGER.info(f"Enrichment results will {'' if plot else 'not '}be plotted by default.")
+
+
+def read_enrichment_plotting():
+    """
+    Reads from the settings file whether enrichment functions should plot their results by default. \
+    If the setting was not previously defined, enrichment results are plotted by default.
+
+    :returns: True if enrichment results should be plotted by default, False otherwise.
+    :rtype: bool
+    """
+    return bool(_read_optional_value_from_settings(__enrichment_plot_key__, True))
+
+
+def _get_enrichment_plotting(plot):
+    """
+    Returns the predefined enrichment plotting setting from the settings file if plot is None, \
+    otherwise returns 'plot' unchanged.
+
+    :param plot: the 'plot' argument from an enrichment module function
+    :type plot: bool or None
+    :rtype: bool
+    """
+    if plot is None:
+        return read_enrichment_plotting()
+    assert isinstance(plot, bool), f"'plot' must be True, False or None. Instead got {type(plot)}"
+    return plot
+
+
+def set_profiling(enabled: bool = True):
+    """
+    Defines/updates in the settings file whether the operations of RNAlysis should be profiled in every session. \
+    When enabled, the wall time, number of rows in and out, and peak memory (if tracemalloc is tracing) \
+    of every Filter and FeatureSet method call are recorded into a session-wide profile, \
+    which can be retrieved with general.get_session_profile(). \
+    To profile a single block of code instead, use the general.profile() context manager.
+    :param enabled: if True, every session will be profiled. If False, sessions will not be profiled.
+    :type enabled: bool (default True)
+
+    :Examples:
+    >>> from rnalysis import general
+    >>> general.set_profiling(True)
+    RNAlysis operations will be profiled in every session.
+    """
+    assert isinstance(enabled, bool), f"'enabled' must be True or False. Instead got {type(enabled)}"
+    _update_settings_file(enabled, __profile_key__)
+    _PROFILE_STATE['settings_read'] = True
+    session = _PROFILE_STATE['session']
+    if enabled and session is None:
+        _PROFILE_STATE['session'] = ProfileReport()
+        _PROFILE_STATE['reports'].append(_PROFILE_STATE['session'])
+    elif not enabled and session is not None:
+        _PROFILE_STATE['reports'].remove(session)
+        _PROFILE_STATE['session'] = None
+    _LOGGER.info(f"RNAlysis operations will {'' if enabled else 'not '}be profiled in every session.")
+
+
+def read_profiling():
+    """
+    Reads from the settings file whether the operations of RNAlysis should be profiled in every session. \
+    If the setting was not previously defined, sessions are not profiled.
+
+    :returns: True if every session should be profiled, False otherwise.
+    :rtype: bool
+    """
+    return bool(_read_optional_value_from_settings(__profile_key__, False))
+
+
+def get_session_profile():
+    """
+    Returns the session-wide profile, which is recorded when profiling was enabled with general.set_profiling().
+
+    :returns: the session-wide profile, or None if profiling is not enabled.
+    :rtype: general.ProfileReport or None
+    """
+    _read_profiling_settings()
+    return _PROFILE_STATE['session']
+
+
+class ProfileReport:
+    """
+    A record of profiled RNAlysis operations, created by general.profile() or general.set_profiling().
+
+    **Attributes**
+
+    records: list of dicts
+        A record of every profiled call, in the order the calls ended.
+    """
+    __slots__ = {'records': 'a record of every profiled call', '_start': 'the time the profile started'}
+
+    def __init__(self):
+        self.records = []
+        self._start = time.perf_counter()
+
+    def __len__(self):
+        return len(self.records)
+
+    def __repr__(self):
+        return f"ProfileReport of {len(self.records)} calls"
+
+    def to_table(self) -> pd.DataFrame:
+        """
+        Returns the profiled calls as a table.
+
+        :returns: a pandas DataFrame with a row for every profiled call, and the columns 'name', 'depth' \
+        (the number of profiled calls it was nested in), 'start' and 'wall_time' (in seconds), \
+        'rows_in' and 'rows_out', and 'peak_memory_mb' (the peak memory allocated during the call, \
+        or NaN if tracemalloc was not tracing).
+        :rtype: pandas.DataFrame
+        """
+        columns = ['name', 'depth', 'start', 'wall_time', 'rows_in', 'rows_out', 'peak_memory_mb']
+        table = pd.DataFrame(self.records, columns=columns + ['thread'])[columns]
+        table['start'] -= self._start
+        return table.sort_values('start', kind='stable').reset_index(drop=True)
+
+    def summary(self) -> pd.DataFrame:
+        """
+        Returns the profiled calls summarized by operation, sorted by their total wall time.
+
+        :returns: a pandas DataFrame indexed by operation name, with the columns 'calls', 'total_time', \
+        'mean_time' and 'max_peak_memory_mb'.
+        :rtype: pandas.DataFrame
+        """
+        table = self.to_table()
+        summary = table.groupby('name').agg(calls=('wall_time', 'size'), total_time=('wall_time', 'sum'),
+                                            mean_time=('wall_time', 'mean'),
+                                            max_peak_memory_mb=('peak_memory_mb', 'max'))
+        return summary.sort_values('total_time', ascending=False)
+
+    def save_csv(self, fname: Union[str, Path]):
+        """
+        Saves the table of profiled calls (see ProfileReport.to_table()) to a .csv file.
+
+        :param fname: the path of the .csv file.
+        :type fname: str or pathlib.Path
+        """
+        self.to_table().to_csv(fname, index=False)
+
+    def save_chrome_trace(self, fname: Union[str, Path]):
+        """
+        Saves the profiled calls in the Chrome trace event format, \
+        which can be viewed in chrome://tracing, Perfetto or speedscope.
+
+        :param fname: the path of the .json file.
+        :type fname: str or pathlib.Path
+        """
+        import json
+        events = []
+        for record in sorted(self.records, key=lambda rec: rec['start']):
+            args = {key: record[key] for key in ('rows_in', 'rows_out', 'peak_memory_mb') if
+                    record[key] is not None and not np.isnan(record[key])}
+            events.append({'name': record['name'], 'cat': 'rnalysis', 'ph': 'X', 'pid': os.getpid(),
+                           'tid': record['thread'], 'ts': (record['start'] - self._start) * 10 ** 6,
+                           'dur': record['wall_time'] * 10 ** 6, 'args': args})
+        with open(fname, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+_PROFILE_STATE = {'reports': [], 'session': None, 'settings_read': False}
+_PROFILE_THREAD_STATE = threading.local()
+
+
+@contextlib.contextmanager
+def profile(memory: bool = False):
+    """
+    A context manager that profiles every Filter and FeatureSet method call made inside it \
+    (as well as loading of .csv files), recording its wall time, the number of rows in and out, \
+    and optionally its peak memory. \
+    Outside of a profiling context (and when profiling is not enabled in the settings file), \
+    operations are not instrumented.
+
+    :param memory: if True, the peak memory allocated during every call will be recorded using tracemalloc. \
+    Tracing memory allocations slows down the profiled code considerably.
+    :type memory: bool (default False)
+    :return: a ProfileReport, to which the profiled calls will be recorded.
+
+    :Examples:
+        >>> from rnalysis import general, filtering
+        >>> with general.profile() as prof:
+        ...     d = filtering.DESeqFilter('tests/test_deseq.csv')
+        ...     d.filter_significant(0.1)
+        >>> prof.save_chrome_trace('my_trace.json')
+        >>> table = prof.to_table()
+
+    """
+    import tracemalloc
+    start_tracing = memory and not tracemalloc.is_tracing()
+    if start_tracing:
+        tracemalloc.start()
+    report = ProfileReport()
+    _PROFILE_STATE['reports'].append(report)
+    try:
+        yield report
+    finally:
+        _PROFILE_STATE['reports'].remove(report)
+        if start_tracing:
+            tracemalloc.stop()
+
+
+def _read_profiling_settings():
+    """
+    Starts the session-wide profile if profiling is enabled in the settings file. \
+    The settings file is read only once per session.
+    """
+    if _PROFILE_STATE['settings_read']:
+        return
+    _PROFILE_STATE['settings_read'] = True
+    if read_profiling():
+        _PROFILE_STATE['session'] = ProfileReport()
+        _PROFILE_STATE['reports'].append(_PROFILE_STATE['session'])
+
+
+def _profile_thread_state():
+    """
+    Returns the profiling state of the current thread: the nesting depth of the running profiled calls ('depth'), \
+    and the stack of their peak memory allocations ('peaks'). \
+    Keeping them per thread lets profiled calls run concurrently in several threads.
+    """
+    state = _PROFILE_THREAD_STATE
+    if not hasattr(state, 'depth'):
+        state.depth = 0
+        state.peaks = []
+    return state
+
+
+def _count_rows(obj):
+    """
+    Returns the number of rows of a Filter object, FeatureSet, pandas DataFrame or Series, \
+    or None if the object has no rows.
+    """
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return obj.shape[0]
+    df = getattr(obj, 'df', None)
+    if isinstance(df, (pd.DataFrame, pd.Series)):
+        return df.shape[0]
+    gene_set = getattr(obj, 'gene_set', None)
+    if isinstance(gene_set, set):
+        return len(gene_set)
+    return None
+
+
+def _profiled(func, is_method: bool = False):
+    """
+    Wraps a function so that its calls are recorded by all active profiles. \
+    When no profile is active, the wrapper only checks a single list before calling the function. \
+    Nesting depth is tracked per thread. tracemalloc traces the whole process, \
+    so the peak memory of calls running concurrently in several threads includes the allocations of all of them.
+
+    :param func: the function to wrap.
+    :param is_method: if True, the first argument of the function is treated as the object it was called on.
+    :return: the wrapped function.
+    """
+    import functools
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _PROFILE_STATE['reports']:
+            if _PROFILE_STATE['settings_read']:
+                return func(*args, **kwargs)
+            _read_profiling_settings()
+            if not _PROFILE_STATE['reports']:
+                return func(*args, **kwargs)
+
+        import tracemalloc
+        obj = args[0] if is_method and args else None
+        name = f"{type(obj).__name__}.{func.__name__}" if obj is not None else func.__qualname__
+        rows_in = _count_rows(obj)
+        tracing = tracemalloc.is_tracing()
+        thread_state = _profile_thread_state()
+        peaks = thread_state.peaks
+        if tracing:
+            baseline, peak = tracemalloc.get_traced_memory()
+            if peaks:
+                peaks[-1] = max(peaks[-1], peak)
+            tracemalloc.reset_peak()
+            peaks.append(0)
+        depth = thread_state.depth
+        thread_state.depth += 1
+        result = None
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+            return result
+        finally:
+            wall_time = time.perf_counter() - start
+            thread_state.depth -= 1
+            peak_memory = np.nan
+            if tracing:
+                peak = max(peaks.pop(), tracemalloc.get_traced_memory()[1])
+                if peaks:
+                    peaks[-1] = max(peaks[-1], peak)
+                tracemalloc.reset_peak()
+                peak_memory = (peak - baseline) / 2 ** 20
+            rows_out = _count_rows(result)
+            if rows_out is None:
+                rows_out = _count_rows(obj)
+            record = dict(name=name, depth=depth, start=start, wall_time=wall_time, rows_in=rows_in,
+                          rows_out=rows_out, peak_memory_mb=peak_memory, thread=threading.get_ident())
+            for report in tuple(_PROFILE_STATE['reports']):
+                report.records.append(record)
+
+    return wrapper
+
+
+def _profile_methods(*private_names: str):
+    """
+    A class decorator that makes all public methods of a class (including static methods and class methods), \
+    as well as the specified private methods, be recorded by general.profile().
+
+    :param private_names: names of private methods to profile as well.
+    :type private_names: str
+    """
+
+    def decorator(cls):
+        for attr_name, attr in list(vars(cls).items()):
+            if attr_name.startswith('_') and attr_name not in private_names:
+                continue
+            if isinstance(attr, staticmethod):
+                setattr(cls, attr_name, staticmethod(_profiled(attr.__func__)))
+            elif isinstance(attr, classmethod):
+                setattr(cls, attr_name, classmethod(_profiled(attr.__func__)))
+            elif callable(attr) and not isinstance(attr, type):
+                setattr(cls, attr_name, _profiled(attr, is_method=True))
+        return cls
+
+    return decorator
+
+
+_COMPRESSION_SUFFIXES = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz', '.zst': 'zstd'}
+_PYARROW_COMPRESSIONS = ('gzip', 'bz2', 'zstd')
+
+
+def _get_compression(filename: Union[str, Path]) -> Union[str, None]:
+    """
+    Internal function, returns the compression of a file according to its suffix \
+    ('gzip', 'bz2', 'xz' or 'zstd'), or None if the file is not compressed.
+
+    :param filename: the path of the file.
+    """
+    return _COMPRESSION_SUFFIXES.get(Path(filename).suffix.lower())
+
+
+def _strip_compression_suffix(filename: Union[str, Path]) -> Path:
+    """
+    Internal function, removes the compression suffix (such as '.gz') from a file path, if it has one. \
+    For example, 'counts.csv.gz' becomes 'counts.csv'.
+
+    :param filename: the path of the file.
+    :rtype: pathlib.Path
+    """
+    filename = Path(filename)
+    return filename.with_suffix('') if _get_compression(filename) is not None else filename
+
+
+def _open_compressed(filename: Union[str, Path], compression: str):
+    """
+    Internal function, opens a compressed file as a binary stream which decompresses the file while it is read, \
+    without decompressing the entire file into memory or to the disk. \
+    zstd-compressed files require either the optional package 'zstandard' or the optional package 'pyarrow'.
+
+    :param filename: the path of the file.
+    :param compression: 'gzip', 'bz2', 'xz' or 'zstd'.
+    :return: a readable binary file object.
+    """
+    if compression == 'gzip':
+        import gzip
+        return gzip.open(filename, 'rb')
+    elif compression == 'bz2':
+        import bz2
+        return bz2.open(filename, 'rb')
+    elif compression == 'xz':
+        import lzma
+        return lzma.open(filename, 'rb')
+    elif compression == 'zstd':
+        try:
+            import zstandard
+            return zstandard.ZstdDecompressor().stream_reader(open(filename, 'rb'), closefd=True)
+        except ImportError:
+            try:
+                import pyarrow as pa
+            except ImportError:
+                _import_optional('zstandard', "Reading zstd-compressed files")
+            return pa.input_stream(str(filename), compression='zstd')
+    raise ValueError(f"Unknown compression '{compression}'.")
+
+
+@contextlib.contextmanager
+def _open_input(filename: Union[str, Path]):
+    """
+    Internal context manager, yields 'filename' unchanged if the file is not compressed, \
+    and otherwise yields a binary stream that decompresses the file while it is read.
+
+    :param filename: the path of the file.
+    """
+    compression = _get_compression(filename)
+    if compression is None:
+        yield filename
+    else:
+        with _open_compressed(filename, compression) as stream:
+            yield stream
+
+
+def _read_header_line(filename: Union[str, Path], encoding: str = 'ISO-8859-1') -> str:
+    """
+    Internal function, returns the first line of a (possibly compressed) text file, without the newline character.
+
+    :param filename: the path of the file.
+    :param encoding: the encoding of the file.
+    """
+    with _open_input(filename) as source:
+        if isinstance(source, (str, Path)):
+            with open(source, encoding=encoding) as f:
+                return f.readline().rstrip('\r\n')
+        # decompressing streams do not always support readline(), so the file is read in chunks up to the first newline
+        line = b''
+        while b'\n' not in line:
+            chunk = source.read(2 ** 16)
+            if not chunk:
+                break
+            line += chunk
+        return line.split(b'\n')[0].decode(encoding).rstrip('\r')
+
+
+_CSV_ENGINES = ('auto', 'pyarrow', 'c', 'python')
+_PYARROW_MIN_FILE_SIZE = 2 ** 20
+_CSV_NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>',
+                  'N/A', 'NA', 'NULL', 'NaN', 'n/a', 'nan', 'null']
+
+
+def _resolve_usecols(usecols, header: List[str]) -> Union[List[str], None]:
+    """
+    Internal function, translates the 'usecols' argument of load_csv() into a list of column names, \
+    ordered by their order in the file.
+
+    :param usecols: None, a column name or position, a list of column names and/or positions, or a callable \
+    which receives a column name and returns True if the column should be loaded.
+    :param header: the column names of the csv file.
+    :return: a list of column names, or None if all columns should be loaded.
+    """
+    if usecols is None:
+        return None
+    if callable(usecols):
+        return [col for col in header if usecols(col)]
+    if isinstance(usecols, (str, int)):
+        usecols = [usecols]
+    selected = set()
+    for col in usecols:
+        if isinstance(col, (int, np.integer)) and not isinstance(col, bool):
+            assert 0 <= col < len(header), \
+                f"Column position {col} is out of range for a file with {len(header)} columns!"
+            selected.add(header[col])
+        elif col in header:
+            selected.add(col)
+        else:
+            raise ValueError(f"The column '{col}' in 'usecols' is not a column in the loaded csv file!")
+    return [col for col in header if col in selected]
+
+
+def _read_csv_pyarrow(filename: Union[str, Path], header: List[str], usecols: Union[List[str], None],
+                      encoding: str) -> pd.DataFrame:
+    """
+    Internal function, reads a csv file with the multi-threaded csv reader of pyarrow. \
+    The column names are taken from 'header' (as parsed by pandas), and missing values are parsed \
+    the same way as in pandas.read_csv, so that the result does not depend on the reader used. \
+    gzip, bz2 and zstd-compressed files are decompressed by pyarrow while they are read.
+
+    :param filename: name of the csv file to be loaded.
+    :param header: the column names of the csv file, as parsed by pandas.
+    :param usecols: a list of column names to load, or None to load all columns.
+    :param encoding: the encoding of the csv file.
+    :return: a pandas DataFrame with a RangeIndex.
+    """
+    import pyarrow as pa
+    from pyarrow import csv
+    read_options = csv.ReadOptions(column_names=header, skip_rows=1, encoding=encoding, use_threads=True)
+
+    compression = _get_compression(filename)
+
+    def read(column_types: dict):
+        convert_options = csv.ConvertOptions(null_values=_CSV_NA_VALUES, strings_can_be_null=True,
+                                             include_columns=usecols, column_types=column_types)
+        if compression is None or compression in _PYARROW_COMPRESSIONS:
+            return csv.read_csv(str(filename), read_options=read_options, convert_options=convert_options)
+        with _open_compressed(filename, compression) as stream:
+            return csv.read_csv(stream, read_options=read_options, convert_options=convert_options)
+
+    table = read({})
+    # pandas.read_csv does not parse dates unless requested to, so date-like columns are read again as strings
+    temporal = {field.name: pa.string() for field in table.schema if pa.types.is_temporal(field.type)}
+    if temporal:
+        table = read(temporal)
+    df = table.to_pandas()
+    text_columns = df.columns[df.dtypes == object]
+    if len(text_columns) > 0:
+        df[text_columns] = df[text_columns].fillna(np.nan)
+    return df
+
+
+@_profiled
 def load_csv(filename: str, idx_col: int = None, drop_columns: Union[str, List[str]] = False, squeeze=False,
-             comment: str = None):
+             comment: str = None, dtype: Union[str, type, dict] = None, usecols=None, engine: str = 'auto'):
     """
     loads a csv df into a pandas dataframe.
 
     :type filename: str or pathlib.Path
-    :param filename: name of the csv file to be loaded
+    :param filename: name of the csv file to be loaded. Files compressed with gzip ('.gz'), bzip2 ('.bz2'), \
+    xz ('.xz') or zstd ('.zst') are decompressed while they are read. \
+    zstd-compressed files require the optional package 'zstandard' or 'pyarrow'.
     :type idx_col: int, default None
-    :param idx_col: number of column to be used as index. default is None, meaning no column will be used as index.
+    :param idx_col: number of column to be used as index. default is None, meaning no column will be used as index. \
+    If 'usecols' is specified, the number refers to the position of the column among the loaded columns.
     :type drop_columns: str, list of str, or False (default False)
     :param drop_columns: if a string or list of strings are specified, \
     the columns of the same name/s will be dropped from the loaded DataFrame.
@@ -284,15 +1133,63 @@ def load_csv(filename: str, idx_col: int = None, drop_columns: Union[str, List[s
     :type comment: str (optional)
     :param comment: Indicates remainder of line should not be parsed. \
     If found at the beginning of a line, the line will be ignored altogether. This parameter must be a single character.
+    :type dtype: 'compact', a type, dict of column names and types, or None (default None)
+    :param dtype: the data types of the loaded columns. If None, the types will be inferred by pandas. \
+    If 'compact', the inferred types will be downcast by compact_dtypes() to reduce the memory footprint of the table. \
+    Otherwise, the value is passed on to pandas.read_csv.
+    :type usecols: list of column names and/or column positions, a callable, or None (default None)
+    :param usecols: if specified, only these columns will be loaded from the csv file. \
+    If a callable is given, it will receive every column name and should return True for the columns to load.
+    :type engine: 'auto', 'pyarrow', 'c' or 'python' (default 'auto')
+    :param engine: the csv reader to use. 'pyarrow' reads the file with multiple threads and requires \
+    the optional package 'pyarrow'. If 'auto', 'pyarrow' will be used for files larger than 1MB \
+    if it is installed, and the pandas 'c' reader will be used otherwise. \
+    If the pyarrow reader cannot parse the file, or if 'comment' is specified, the pandas 'c' reader is used instead.
     :return: a pandas dataframe of the csv file
     """
     assert isinstance(filename,
                       (str, Path)), f"Filename must be of type str or pathlib.Path, is instead {type(filename)}."
+    assert isinstance(engine, str) and engine.lower() in _CSV_ENGINES, \
+        f"Invalid engine '{engine}'. 'engine' must be one of {_CSV_ENGINES}."
+    engine = engine.lower()
+    compact = isinstance(dtype, str) and dtype == 'compact'
     encoding = 'ISO-8859-1'
-    if idx_col is not None:
-        df = pd.read_csv(filename, index_col=idx_col, encoding=encoding, squeeze=squeeze, comment=comment)
-    else:
-        df = pd.read_csv(filename, encoding=encoding, squeeze=squeeze, comment=comment)
+    read_dtype = None if compact else dtype
+    with _open_input(filename) as source:
+        header = list(pd.read_csv(source, encoding=encoding, comment=comment, nrows=0).columns)
+    usecols = _resolve_usecols(usecols, header)
+
+    if engine == 'auto':
+        engine = 'c'
+        if comment is None and os.path.getsize(filename) >= _PYARROW_MIN_FILE_SIZE and \
+                importlib.util.find_spec('pyarrow') is not None:
+            engine = 'pyarrow'
+    elif engine == 'pyarrow':
+        _import_optional('pyarrow.csv', "Reading csv files with engine='pyarrow'")
+        if comment is not None:
+            _LOGGER.debug("The pyarrow csv reader does not support comments; using the pandas 'c' reader instead.")
+            engine = 'c'
+
+    df = None
+    if engine == 'pyarrow':
+        try:
+            df = _read_csv_pyarrow(filename, header, usecols, encoding)
+        except Exception as e:
+            _LOGGER.debug("The pyarrow csv reader failed to parse '%s' (%s); using the pandas 'c' reader instead.",
+                          filename, e)
+        else:
+            if read_dtype is not None:
+                df = df.astype(read_dtype)
+            if idx_col is not None:
+                df.set_index(df.columns[idx_col], inplace=True)
+                if str(df.index.name).startswith('Unnamed: '):
+                    df.index.name = None
+    if df is None:
+        with _open_input(filename) as source:
+            df = pd.read_csv(source, index_col=idx_col, encoding=encoding, comment=comment, dtype=read_dtype,
+                             usecols=usecols, engine='c' if engine == 'pyarrow' else engine)
+    if squeeze and df.shape[1] == 1:
+        df = df.squeeze('columns')
     if drop_columns:
         if isinstance(drop_columns, str):
             drop_columns = [drop_columns]
@@ -304,9 +1201,79 @@ def load_csv(filename: str, idx_col: int = None, drop_columns: Union[str, List[s
                     df.drop('genes', axis=1, inplace=True)
                 else:
                     raise IndexError(f"The argument {i} in 'drop_columns' is not a column in the loaded csv file!")
+    if compact:
+        df = compact_dtypes(df)
     return df
 
 
+_UINT32_MAX = np.iinfo(np.uint32).max
+
+
+def _compact_series(series: pd.Series, category_ratio: float) -> pd.Series:
+    """
+    Internal function, downcasts a single column to the most compact data type that represents it without loss.
+
+    :param series: the column to downcast.
+    :param category_ratio: the largest ratio of unique values to rows for which text columns become categorical.
+    :return: the downcast column, or the original column if it cannot be downcast.
+    """
+    values = series.values
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_categorical_dtype(series):
+        return series
+    elif pd.api.types.is_integer_dtype(series):
+        if len(values) == 0:
+            return series.astype(np.uint32)
+        minimum, maximum = values.min(), values.max()
+        if minimum >= 0 and maximum <= _UINT32_MAX:
+            return series.astype(np.uint32)
+        if np.iinfo(np.int32).min <= minimum and maximum <= np.iinfo(np.int32).max:
+            return series.astype(np.int32)
+    elif pd.api.types.is_float_dtype(series):
+        # only values which float32 represents exactly (such as 0/1 flags, integers and halves) are downcast.
+        # statistics such as p-values and fold changes would be rounded to ~7 significant digits, \
+        # which can move them across filtering thresholds, so they are kept as float64
+        if np.array_equal(values.astype(np.float32).astype(values.dtype), values, equal_nan=True):
+            return series.astype(np.float32)
+    elif pd.api.types.is_object_dtype(series):
+        n_unique = series.nunique(dropna=True)
+        if len(series) > 0 and n_unique <= category_ratio * len(series):
+            return series.astype('category')
+    return series
+
+
+def compact_dtypes(df: Union[pd.DataFrame, pd.Series], category_ratio: float = 0.5):
+    """
+    Downcasts the columns of a DataFrame to compact data types, in order to reduce its memory footprint. \
+    Non-negative integer columns (such as read counts) are converted to uint32, \
+    floating point columns whose values float32 represents exactly (such as 0/1 attribute flags) \
+    are converted to float32, and text columns with repeating labels (such as biotypes) are converted to 'category'. \
+    Columns are only converted when no information is lost: integers outside the range of uint32/int32, \
+    floating point columns that float32 would round (such as most p-values, fold changes and normalized values), \
+    and text columns of mostly unique values keep their original types.
+
+    :type df: pandas DataFrame or Series
+    :param df: the table to downcast.
+    :type category_ratio: float between 0 and 1 (default 0.5)
+    :param category_ratio: text columns will be converted to 'category' only if their number of unique values \
+    is at most this fraction of their number of rows.
+    :return: a new DataFrame or Series with compact data types.
+
+    :Examples:
+        >>> from rnalysis import general
+        >>> df = general.compact_dtypes(general.load_csv('tests/counted.csv', 0))
+        >>> df.dtypes.unique()
+        array([dtype('uint32')], dtype=object)
+
+    """
+    assert isinstance(df, (pd.DataFrame, pd.Series)), f"'df' must be a pandas DataFrame or Series, " \
+                                                      f"is instead {type(df)}."
+    assert isinstance(category_ratio, (int, float)) and 0 <= category_ratio <= 1, \
+        "'category_ratio' must be a number between 0 and 1!"
+    if isinstance(df, pd.Series):
+        return _compact_series(df, category_ratio)
+    return pd.DataFrame({col: _compact_series(df[col], category_ratio) for col in df.columns}, index=df.index)
+
+
 def _remove_unindexed_rows(df: pd.DataFrame):
     """
     removes rows which have no WBGene index.
@@ -320,7 +1287,7 @@ def _remove_unindexed_rows(df: pd.DataFrame):
 def _check_is_df(inp):
     """
     checks whether an input file is a pandas DataFrame, a string that represent a path of a .csv file, a Path object \
-    of a .csv file, or an invalid input.
+    of a .csv file, or an invalid input. Compressed .csv files (such as '.csv.gz') are also recognized.
 
     :param inp: the input we wish to test
     :return: True if pandas DataFrame, False if a string/Path object that leads to a .csv file.\
@@ -328,11 +1295,8 @@ def _check_is_df(inp):
     """
     if isinstance(inp, pd.DataFrame):
         return True
-    elif isinstance(inp, str):
-        if inp[-4::] == '.csv':
-            return False
-    elif isinstance(inp, Path):
-        if inp.suffix == '.csv':
+    elif isinstance(inp, (str, Path)):
+        if _strip_compression_suffix(inp).suffix == '.csv':
             return False
     raise ValueError("The input is neither a pandas DataFrame or a csv file")
 
@@ -356,6 +1320,137 @@ def save_to_csv(df: pd.DataFrame, filename: str, suffix: str = None, index: bool
     df.to_csv(new_fname, header=True)
 
 
+_TABLE_FORMATS = {'parquet': '.parquet', 'feather': '.feather', 'hdf5': '.h5'}
+_TABLE_SUFFIXES = {'.parquet': 'parquet', '.pq': 'parquet', '.feather': 'feather', '.arrow': 'feather',
+                   '.h5': 'hdf5', '.hdf5': 'hdf5', '.hdf': 'hdf5'}
+_TABLE_DEFAULT_COMPRESSION = {'parquet': 'snappy', 'feather': 'lz4', 'hdf5': 'zlib'}
+_TABLE_METADATA_KEY = 'rnalysis'
+
+
+def _import_optional(module: str, purpose: str):
+    """
+    Imports an optional dependency, and raises an informative ImportError if it is not installed.
+
+    :param module: the name of the module to import.
+    :param purpose: a description of what the module is needed for, used in the error message.
+    :return: the imported module.
+    """
+    import importlib
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        raise ImportError(f"{purpose} requires the optional package '{module.split('.')[0]}', "
+                          f"which is not installed. ")
+
+
+def save_table(df: Union[pd.DataFrame, pd.Series], filename: Union[str, Path], file_format: str = 'parquet',
+               compression: Union[str, None] = 'default', metadata: dict = None) -> Path:
+    """
+    Saves a pandas DataFrame or Series to a binary columnar file, which keeps its dtypes \
+    and is much faster to read and write than a .csv file. \
+    Requires the optional package 'pyarrow' for 'parquet' and 'feather' files, and 'tables' for 'hdf5' files.
+
+    :param df: the DataFrame or Series to save.
+    :param filename: the path of the saved file. If it does not end with a suffix of the chosen format, \
+    the default suffix of the format ('.parquet', '.feather' or '.h5') will be added.
+    :type filename: str or pathlib.Path
+    :param file_format: the file format to save in.
+    :type file_format: 'parquet', 'feather' or 'hdf5' (default 'parquet')
+    :param compression: the compression codec. If 'default', 'snappy' is used for parquet files, \
+    'lz4' for feather files and 'zlib' for hdf5 files. If None, the file will not be compressed. \
+    Uncompressed feather files can be memory-mapped without copying when loaded.
+    :type compression: str, 'default' or None (default 'default')
+    :param metadata: optional. A JSON-serializable dictionary to store alongside the table. \
+    It can be read back with general.load_table().
+    :type metadata: dict or None (default None)
+    :return: the path of the saved file.
+    :rtype: pathlib.Path
+    """
+    import json
+    assert file_format in _TABLE_FORMATS, \
+        f"Invalid file format '{file_format}'. Supported formats are: {list(_TABLE_FORMATS.keys())}"
+    assert isinstance(df, (pd.DataFrame, pd.Series)), f"'df' must be a DataFrame or Series. Instead got {type(df)}"
+    fname = Path(filename)
+    if _TABLE_SUFFIXES.get(fname.suffix.lower()) != file_format:
+        fname = fname.with_name(fname.name + _TABLE_FORMATS[file_format])
+    if compression == 'default':
+        compression = _TABLE_DEFAULT_COMPRESSION[file_format]
+    metadata = dict() if metadata is None else dict(metadata)
+    metadata['series'] = isinstance(df, pd.Series)
+    if isinstance(df, pd.Series):
+        metadata['series_name'] = df.name
+        df = df.to_frame(name=str(df.name) if df.name is not None else 'values')
+    encoded = json.dumps(metadata, default=lambda obj: obj.item() if hasattr(obj, 'item') else str(obj))
+
+    if file_format == 'hdf5':
+        _import_optional('tables', "Saving hdf5 files")
+        with pd.HDFStore(fname, mode='w', complevel=0 if compression is None else 5, complib=compression) as store:
+            store.put('df', df, format='table')
+            store.get_storer('df').attrs[_TABLE_METADATA_KEY] = encoded
+        return fname
+
+    pa = _import_optional('pyarrow', f"Saving {file_format} files")
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    table = table.replace_schema_metadata({**table.schema.metadata, _TABLE_METADATA_KEY.encode(): encoded.encode()})
+    if file_format == 'parquet':
+        from pyarrow import parquet
+        parquet.write_table(table, fname, compression='none' if compression is None else compression)
+    else:
+        from pyarrow import feather
+        feather.write_feather(table, fname, compression='uncompressed' if compression is None else compression)
+    return fname
+
+
+def load_table(filename: Union[str, Path], columns: List[str] = None, memory_map: bool = False):
+    """
+    Loads a table saved by general.save_table(), and the metadata saved alongside it. \
+    The file format is inferred from the file's suffix.
+
+    :param filename: the path of the file to load.
+    :type filename: str or pathlib.Path
+    :param columns: optional. If specified, only these columns (and the index) will be read from the file.
+    :type columns: list of str or None (default None)
+    :param memory_map: if True, parquet and feather files will be read through a memory map. \
+    Uncompressed feather files are then used without being copied into memory first. \
+    Ignored for hdf5 files.
+    :type memory_map: bool (default False)
+    :return: a tuple of the loaded DataFrame (or Series, if a Series was saved) and the metadata dictionary.
+    """
+    import json
+    fname = Path(filename)
+    assert fname.suffix.lower() in _TABLE_SUFFIXES, \
+        f"Cannot infer the file format of '{fname}'. Supported suffixes are: {list(_TABLE_SUFFIXES.keys())}"
+    file_format = _TABLE_SUFFIXES[fname.suffix.lower()]
+    columns = None if columns is None else list(columns)
+
+    if file_format == 'hdf5':
+        _import_optional('tables', "Loading hdf5 files")
+        with pd.HDFStore(fname, mode='r') as store:
+            metadata = json.loads(store.get_storer('df').attrs[_TABLE_METADATA_KEY])
+            df = store.select('df', columns=columns)
+    else:
+        pa = _import_optional('pyarrow', f"Loading {file_format} files")
+        if file_format == 'parquet':
+            from pyarrow import parquet
+            schema = parquet.read_schema(fname, memory_map=memory_map)
+        else:
+            schema = pa.ipc.open_file(pa.memory_map(str(fname)) if memory_map else pa.OSFile(str(fname))).schema
+        if columns is not None:
+            index_columns = [col for col in schema.pandas_metadata['index_columns'] if isinstance(col, str)]
+            columns = columns + [col for col in index_columns if col not in columns]
+        if file_format == 'parquet':
+            table = parquet.read_table(fname, columns=columns, memory_map=memory_map, use_pandas_metadata=True)
+        else:
+            from pyarrow import feather
+            table = feather.read_table(fname, columns=columns, memory_map=memory_map)
+        metadata = json.loads(schema.metadata[_TABLE_METADATA_KEY.encode()].decode())
+        df = table.to_pandas()
+
+    if metadata.pop('series'):
+        df = df.iloc[:, 0].rename(metadata.pop('series_name'))
+    return df, metadata
+
+
 def _get_biotype_ref_path(ref: Union[str, Path]):
     """
     Returns the predefined Biotype Reference Table path from the settings file if ref='predefined', \
@@ -416,3 +1511,205 @@ def _attr_table_assertions(ref_df: pd.DataFrame):
     assert ref_df.shape[
                0] >= 2, f"Attribute Reference Table must have at least two rows, found only  {ref_df.shape[0]}!"
     ref_df.rename(columns={ref_df.columns[0]: 'gene'}, inplace=True)
+
+
+def _assert_random_seed(random_seed):
+    """
+    Asserts that a random seed given by the user is either None or a non-negative integer.
+
+    :param random_seed: the random seed to check.
+    """
+    if random_seed is not None:
+        assert isinstance(random_seed, int) and random_seed >= 0, f"random_seed must be a non-negative integer. " \
+                                                                  f"Value {random_seed} invalid."
+
+
+def _spawn_seeds(random_seed, n: int) -> list:
+    """
+    Spawns n independent random seeds from a single random seed, using numpy.random.SeedSequence. \
+    Every spawned seed initiates its own independent random stream, \
+    so that every attribute/worker can be given its own stream, \
+    and results remain identical regardless of how the work is split between workers.
+
+    :param random_seed: a non-negative int, a numpy.random.SeedSequence, or None (fresh entropy).
+    :param n: number of seeds to spawn.
+    :rtype: list of numpy.random.SeedSequence
+    """
+    if not isinstance(random_seed, np.random.SeedSequence):
+        random_seed = np.random.SeedSequence(random_seed)
+    return random_seed.spawn(n)
+
+
+def _random_subsets(rng: np.random.Generator, population_size: int, subset_size: int, reps: int,
+                    max_chunk_elements: int = 2 ** 22):
+    """
+    Draws 'reps' random subsets of size 'subset_size' (without replacement) from range(population_size), \
+    in chunks of repetitions. The random numbers are drawn from 'rng' sequentially, \
+    so the subsets drawn do not depend on the chunk size.
+
+    :param rng: the random number generator to draw from.
+    :type rng: numpy.random.Generator
+    :param population_size: the size of the population to sample from.
+    :param subset_size: the size of each random subset.
+    :param reps: total number of random subsets to draw.
+    :param max_chunk_elements: the maximal number of random numbers to draw at once.
+    :return: a generator of 2D int arrays of shape (repetitions in chunk, subset_size).
+    """
+    assert 0 <= subset_size <= population_size, \
+        f"Cannot draw {subset_size} elements out of a population of {population_size}!"
+    chunk_size = max(1, max_chunk_elements // max(population_size, 1))
+    for start in range(0, reps, chunk_size):
+        this_chunk = min(chunk_size, reps - start)
+        if subset_size == 0:
+            yield np.empty((this_chunk, 0), dtype=np.int64)
+            continue
+        yield rng.random((this_chunk, population_size)).argpartition(subset_size - 1, axis=1)[:, :subset_size]
+
+
+_FIGURE_OUTPUT = {}
+_FIGURE_FORMATS = ('png', 'svg', 'pdf')
+
+
+@contextlib.contextmanager
+def figure_output(output_dir: Union[str, Path], formats: Union[str, Tuple[str, ...]] = 'png', dpi: int = 150,
+                  prefix: str = ''):
+    """
+    A context manager that makes all plotting functions of RNAlysis save their figures to files, \
+    instead of showing them. Inside the context, the non-interactive Agg backend is used \
+    (unless figures were already open when entering it, since switching backends would close them), \
+    and every figure is closed as soon as it was saved. \
+    Figures are named by their order of creation and the function that created them, \
+    for example '001_volcano_plot.png'. Figures which were open before entering the context are left untouched.
+
+    :param output_dir: the directory in which to save the figures. Will be created if it does not exist.
+    :type output_dir: str or pathlib.Path
+    :param formats: the file format/formats in which to save every figure.
+    :type formats: 'png', 'svg', 'pdf', or a tuple of them (default 'png')
+    :param dpi: the resolution of the saved figures, in dots per inch.
+    :type dpi: int (default 150)
+    :param prefix: a prefix added to the file names of all figures saved inside the context.
+    :type prefix: str (default '')
+    :return: a list, to which the paths of all saved figures will be appended.
+
+    :Examples:
+        >>> from rnalysis import general, filtering
+        >>> d = filtering.DESeqFilter('tests/test_deseq.csv')
+        >>> with general.figure_output('my_report', formats=('png', 'svg')) as saved:
+        ...     d.volcano_plot()
+        >>> [path.name for path in saved]
+        ['001_volcano_plot.png', '001_volcano_plot.svg']
+
+    """
+    import matplotlib.pyplot as plt
+    formats = (formats,) if isinstance(formats, str) else tuple(formats)
+    for fmt in formats:
+        assert fmt in _FIGURE_FORMATS, f"Invalid figure format '{fmt}'. Supported formats are: {_FIGURE_FORMATS}"
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    previous_output = dict(_FIGURE_OUTPUT)
+    previous_backend = plt.get_backend()
+    # switching backends closes all open figures, so the backend is only switched when no figures are open
+    switch_backend = previous_backend.lower() != 'agg' and len(plt.get_fignums()) == 0
+    if switch_backend:
+        plt.switch_backend('Agg')
+    saved = []
+    _FIGURE_OUTPUT.clear()
+    _FIGURE_OUTPUT.update(output_dir=output_dir, formats=formats, dpi=dpi, prefix=prefix, counter=0, saved=saved,
+                          existing_figures=set(plt.get_fignums()))
+    try:
+        yield saved
+    finally:
+        for num in set(plt.get_fignums()).difference(_FIGURE_OUTPUT['existing_figures']):
+            plt.close(num)
+        _FIGURE_OUTPUT.clear()
+        _FIGURE_OUTPUT.update(previous_output)
+        if switch_backend:
+            plt.switch_backend(previous_backend)
+
+
+def _show_figures(name: str, show: bool = True):
+    """
+    Called by all plotting functions of RNAlysis once their figures are complete. \
+    Inside a general.figure_output() context, saves every figure opened since the context was entered \
+    and then closes it. Otherwise, shows the figures with matplotlib.pyplot.show() if 'show' is True.
+
+    :param name: the name of the plotting function, used to name the saved files.
+    :type name: str
+    :param show: if True and not inside a general.figure_output() context, matplotlib.pyplot.show() will be called.
+    :type show: bool (default True)
+    """
+    import matplotlib.pyplot as plt
+    if not _FIGURE_OUTPUT:
+        if show:
+            plt.show()
+        return
+    for num in sorted(set(plt.get_fignums()).difference(_FIGURE_OUTPUT['existing_figures'])):
+        fig = plt.figure(num)
+        _FIGURE_OUTPUT['counter'] += 1
+        for fmt in _FIGURE_OUTPUT['formats']:
+            path = _FIGURE_OUTPUT['output_dir'].joinpath(
+                f"{_FIGURE_OUTPUT['prefix']}{_FIGURE_OUTPUT['counter']:03d}_{name}.{fmt}")
+            fig.savefig(path, format=fmt, dpi=_FIGURE_OUTPUT['dpi'], bbox_inches='tight')
+            _FIGURE_OUTPUT['saved'].append(path)
+        plt.close(fig)
+
+
+def _render_figure_job(job: tuple):
+    """
+    Runs a single plotting job of general.render_figures() inside a general.figure_output() context.
+
+    :param job: a tuple of (plotting function, keyword arguments, output_dir, formats, dpi, prefix).
+    :return: a list of the paths of the saved figures.
+    """
+    func, kwargs, output_dir, formats, dpi, prefix = job
+    with figure_output(output_dir, formats=formats, dpi=dpi, prefix=prefix) as saved:
+        func(**kwargs)
+    return saved
+
+
+def render_figures(jobs: list, output_dir: Union[str, Path], formats: Union[str, Tuple[str, ...]] = 'png',
+                   dpi: int = 150, processes: int = None):
+    """
+    Renders many figures to files, in parallel worker processes. \
+    Every job is a plotting function (for example a bound method such as my_filter.volcano_plot), \
+    optionally paired with a dictionary of keyword arguments to call it with. \
+    Every job is run inside a general.figure_output() context, \
+    and the files it saves are prefixed by the job's number (for example 'job002_001_pca.png').
+
+    :param jobs: the plotting jobs to run.
+    :type jobs: list of callables, or of (callable, dict of keyword arguments) tuples
+    :param output_dir: the directory in which to save the figures. Will be created if it does not exist.
+    :type output_dir: str or pathlib.Path
+    :param formats: the file format/formats in which to save every figure.
+    :type formats: 'png', 'svg', 'pdf', or a tuple of them (default 'png')
+    :param dpi: the resolution of the saved figures, in dots per inch.
+    :type dpi: int (default 150)
+    :param processes: the number of worker processes. If None, the number of CPUs will be used. \
+    If 1, the jobs will be rendered one by one in the current process.
+    :type processes: positive int or None (default None)
+    :return: a list of the paths of all saved figures, ordered by job.
+
+    :Examples:
+        >>> from rnalysis import general, filtering
+        >>> c = filtering.CountFilter('tests/counted.csv')
+        >>> d = filtering.DESeqFilter('tests/test_deseq.csv')
+        >>> paths = general.render_figures([d.volcano_plot, (c.pca, {'n_components': 2})], 'my_report')
+
+    """
+    assert processes is None or (isinstance(processes, int) and processes > 0), \
+        f"'processes' must be a positive integer or None. Instead got {processes}"
+    parsed_jobs = []
+    for i, job in enumerate(jobs):
+        func, kwargs = job if isinstance(job, tuple) else (job, {})
+        assert callable(func), f"Job number {i} is not callable: {func}"
+        parsed_jobs.append((func, kwargs, output_dir, formats, dpi, f'job{i:03d}_'))
+
+    if processes == 1 or len(parsed_jobs) <= 1:
+        results = [_render_figure_job(job) for job in parsed_jobs]
+    else:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn')) as pool:
+            results = list(pool.map(_render_figure_job, parsed_jobs))
+    return [path for paths in results for path in paths]
@@ -12,10 +12,12 @@ with open('HISTORY.rst') as history_file:
     history = history_file.read()
 
 requirements = ['numpy', 'pandas', 'matplotlib', 'seaborn', 'tissue_enrichment_analysis', 'statsmodels', 'scikit-learn',
-                'ipyparallel', 'grid_strategy', 'Distance', 'pyyaml', 'UpSetPlot', 'matplotlib-venn']
+                'ipyparallel', 'grid_strategy', 'Distance', 'pyyaml', 'UpSetPlot', 'matplotlib-venn', 'scipy']
 # requirements = ['numpy', 'pandas', 'matplotlib', 'seaborn', 'tissue_enrichment_analysis', 'statsmodels',
 # 'scikit-learn', 'matplotlib-venn', 'simple-venn']
 
+extras_requirements = {'io': ['pyarrow', 'tables'], 'zstd': ['zstandard']}
+
 setup_requirements = ['pytest-runner', ]
 
 test_requirements = ['pytest', ]
@@ -42,6 +44,7 @@ setup(
                 'The package includes various methods for filtering, data visualisation, exploratory analyses, '
                 'enrichment anslyses and clustering.',
     install_requires=requirements,
+    extras_require=extras_requirements,
     license="MIT license",
     long_description=readme + '\n\n' + history,
     include_package_data=True,
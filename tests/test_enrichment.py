@@ -3,6 +3,8 @@ from rnalysis import general
 
 general.start_parallel_session()
 import matplotlib
+import tissue_enrichment_analysis as tea
+import statsmodels.stats.multitest as multitest
 from rnalysis.enrichment import *
 
 matplotlib.use('Agg')
@@ -348,3 +350,169 @@ def test_randomization_all_attributes():
     attrs_truth = ['attribute1', 'attribute2', 'attribute3', 'attribute4']
     attrs = en._enrichment_get_attrs('all', 'attr_ref_table_for_tests.csv')
     assert attrs == attrs_truth
+
+
+def test_fetch_go_dictionary_disk_cache(monkeypatch, tmp_path):
+    truth = pd.DataFrame({'wbid': ['WBGene00000001', 'WBGene00000002'], 'term1': [1, 0]})
+    calls = []
+
+    def mock_fetch(analysis):
+        calls.append(analysis)
+        return truth
+
+    monkeypatch.setattr(general, 'read_go_cache_dir', lambda: tmp_path)
+    monkeypatch.setattr(tea, 'fetch_dictionary', mock_fetch)
+    monkeypatch.setattr(FeatureSet, '_go_dicts', {})
+    res = FeatureSet._fetch_go_dictionary('tissue')
+    assert calls == ['tissue']
+    assert FeatureSet._go_dict_cache_path('tissue').exists()
+    assert res.equals(truth)
+
+    # a fresh process only has the on-disk cache
+    monkeypatch.setattr(FeatureSet, '_go_dicts', {})
+    res_cached = FeatureSet._fetch_go_dictionary('tissue', offline=True)
+    assert calls == ['tissue']
+    assert res_cached.equals(truth)
+    assert FeatureSet._go_dict_cache_path('tissue').suffix == '.parquet'
+    assert list(tmp_path.iterdir()) == [FeatureSet._go_dict_cache_path('tissue')]
+
+
+def test_fetch_go_dictionary_offline_no_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(general, 'read_go_cache_dir', lambda: tmp_path)
+    monkeypatch.setattr(FeatureSet, '_go_dicts', {})
+    with pytest.raises(FileNotFoundError):
+        FeatureSet._fetch_go_dictionary('go', offline=True)
+
+
+def test_calc_hypergeometric_pval():
+    # enrichment: P(X >= 3) when drawing 4 out of 10, with 5 successes in the background
+    assert np.isclose(FeatureSet._calc_hypergeometric_pval(10, 5, 4, 3), (10 * 5 + 5) / 210)
+    # depletion: P(X <= 0)
+    assert np.isclose(FeatureSet._calc_hypergeometric_pval(10, 5, 4, 0), 5 / 210)
+    pvals = FeatureSet._calc_hypergeometric_pval(10, np.array([5, 5]), 4, np.array([3, 0]))
+    assert np.isclose(pvals, [55 / 210, 5 / 210]).all()
+
+
+def test_enrich_many_hypergeometric_matches_single_set():
+    genes_1 = {'WBGene00000041', 'WBGene00002074', 'WBGene00000105', 'WBGene00000106', 'WBGene00199484',
+               'WBGene00001436', 'WBGene00000137', 'WBGene00001996', 'WBGene00014208', 'WBGene00001133'}
+    genes_2 = {'WBGene00048865', 'WBGene00000864', 'WBGene00000105', 'WBGene00001996', 'WBGene00011910'}
+    attrs = ['attribute1', 'attribute2', 'attribute4']
+    sets = [FeatureSet(genes_1, 'first'), FeatureSet(genes_2, 'second')]
+    res = enrich_many(sets, attrs, biotype='all', attr_ref_path='attr_ref_table_for_tests.csv',
+                      biotype_ref_path='biotype_ref_table_for_tests.csv')
+    assert list(res['set'].unique()) == ['first', 'second']
+    for en in sets:
+        truth = en.enrich_hypergeometric(attrs, biotype='all', attr_ref_path='attr_ref_table_for_tests.csv',
+                                         biotype_ref_path='biotype_ref_table_for_tests.csv')
+        set_res = res[res['set'] == en.set_name].set_index('name')
+        for col in ['samples', 'n obs', 'significant']:
+            assert np.all(set_res[col] == truth[col])
+        for col in ['n exp', 'log2_fold_enrichment', 'pval', 'padj']:
+            assert np.isclose(set_res[col], truth[col]).all()
+
+
+def test_enrich_many_randomization_reproducible():
+    genes = {'WBGene00000041', 'WBGene00002074', 'WBGene00000105', 'WBGene00000106', 'WBGene00199484',
+             'WBGene00001436', 'WBGene00000137', 'WBGene00001996', 'WBGene00014208', 'WBGene00001133'}
+    attrs = ['attribute1', 'attribute2']
+    kwargs = dict(method='randomization', reps=20000, biotype='all', attr_ref_path='attr_ref_table_for_tests.csv',
+                  biotype_ref_path='biotype_ref_table_for_tests.csv', random_seed=42)
+    res1 = enrich_many({'my set': genes}, attrs, **kwargs)
+    res2 = enrich_many({'my set': genes}, attrs, **kwargs)
+    assert res1.equals(res2)
+    hypergeom_res = enrich_many({'my set': genes}, attrs, biotype='all', attr_ref_path='attr_ref_table_for_tests.csv',
+                                biotype_ref_path='biotype_ref_table_for_tests.csv')
+    assert np.isclose(res1['pval'], hypergeom_res['pval'], atol=2 * 10 ** -3, rtol=0.25).all()
+
+
+def test_enrichment_no_plot(monkeypatch):
+    def raise_on_plot(*args, **kwargs):
+        raise AssertionError('results should not be plotted')
+
+    monkeypatch.setattr(FeatureSet, '_plot_enrich_randomization', staticmethod(raise_on_plot))
+    genes = {'WBGene00000041', 'WBGene00002074', 'WBGene00000105', 'WBGene00000106', 'WBGene00199484',
+             'WBGene00001436', 'WBGene00000137', 'WBGene00001996', 'WBGene00014208', 'WBGene00001133'}
+    en = FeatureSet(genes, 'my set')
+    res, fig = en.enrich_hypergeometric(['attribute1', 'attribute2'], biotype='all',
+                                        attr_ref_path='attr_ref_table_for_tests.csv',
+                                        biotype_ref_path='biotype_ref_table_for_tests.csv', return_fig=True,
+                                        plot=False)
+    assert fig is None
+    assert res.shape[0] == 2
+
+    monkeypatch.setattr(general, 'read_enrichment_plotting', lambda: False)
+    res_default = en.enrich_hypergeometric(['attribute1', 'attribute2'], biotype='all',
+                                           attr_ref_path='attr_ref_table_for_tests.csv',
+                                           biotype_ref_path='biotype_ref_table_for_tests.csv')
+    assert res.equals(res_default)
+
+
+def test_background_reuse():
+    genes = {'WBGene00000041', 'WBGene00002074', 'WBGene00000019', 'WBGene00000105', 'WBGene00000106', 'WBGene00199484',
+             'WBGene00001436', 'WBGene00000137', 'WBGene00001996', 'WBGene00014208'}
+    truth = general.load_csv('attr_ref_table_for_tests_biotype.csv', 0).sort_index()
+    bg = Background('protein_coding', attr_ref_path='attr_ref_table_for_tests.csv',
+                    biotype_ref_path='biotype_ref_table_for_tests.csv')
+    assert len(bg) == truth.shape[0]
+    assert np.all(bg.attr_ref_df.index == truth.index)
+    assert np.all(bg.int_index == truth.int_index)
+    assert np.all(bg.attr_counts[['attribute1', 'attribute2']] == truth[['attribute1', 'attribute2']].notna().sum())
+
+    en = FeatureSet(genes, 'test_set')
+    res, gene_set = en._enrichment_get_reference(biotype='all', background_genes=bg, attr_ref_path='nonexistent.csv',
+                                                 biotype_ref_path='nonexistent.csv')
+    assert res is bg.attr_ref_df
+    assert gene_set == genes.intersection(truth.index)
+
+    kwargs = dict(biotype='protein_coding', attr_ref_path='attr_ref_table_for_tests.csv',
+                  biotype_ref_path='biotype_ref_table_for_tests.csv', plot=False)
+    assert en.enrich_hypergeometric(['attribute1', 'attribute2'], **kwargs).equals(
+        en.enrich_hypergeometric(['attribute1', 'attribute2'], background_genes=bg, plot=False))
+
+
+def test_background_multiple_biotypes():
+    bg = Background(['protein_coding', 'pseudogene'], attr_ref_path='attr_ref_table_for_tests.csv',
+                    biotype_ref_path='biotype_ref_table_for_tests.csv')
+    biotype_df = general.load_csv('biotype_ref_table_for_tests.csv', 0)
+    attr_df = general.load_csv('attr_ref_table_for_tests.csv', 0)
+    truth = biotype_df[biotype_df['bioType'].isin(['protein_coding', 'pseudogene'])].index.intersection(
+        attr_df.index)
+    assert bg.gene_set == set(truth)
+
+
+def test_background_seeds_reproducible():
+    genes = {'WBGene00000041', 'WBGene00002074', 'WBGene00000105', 'WBGene00000106', 'WBGene00199484'}
+    kwargs = dict(attr_ref_path='attr_ref_table_for_tests.csv', biotype_ref_path='biotype_ref_table_for_tests.csv',
+                  random_seed=7)
+    bg_1 = Background('all', **kwargs)
+    bg_2 = Background('all', **kwargs)
+    res_1 = enrich_many({'set': genes}, ['attribute1', 'attribute2'], method='randomization', reps=100,
+                        background_genes=bg_1)
+    res_2 = enrich_many({'set': genes}, ['attribute1', 'attribute2'], method='randomization', reps=100,
+                        background_genes=bg_2)
+    assert res_1.equals(res_2)
+
+
+def test_enrichment_randomization_serial_parallel_identical():
+    genes = {'WBGene00000041', 'WBGene00002074', 'WBGene00000105', 'WBGene00000106', 'WBGene00199484',
+             'WBGene00001436', 'WBGene00000137', 'WBGene00001996', 'WBGene00014208', 'WBGene00001133'}
+    attrs = ['attribute1', 'attribute2', 'attribute4']
+    en = FeatureSet(gene_set=genes, set_name='test_set')
+    kwargs = dict(reps=2000, biotype='all', attr_ref_path='attr_ref_table_for_tests.csv',
+                  biotype_ref_path='biotype_ref_table_for_tests.csv', random_seed=12, plot=False)
+    res_serial = en.enrich_randomization(attrs, **kwargs)
+    res_parallel = en.enrich_randomization_parallel(attrs, **kwargs)
+    assert res_serial.equals(res_parallel)
+    # every attribute has its own random stream, so results don't depend on which other attributes are tested
+    res_single = en.enrich_randomization(attrs[:1], **kwargs)
+    assert res_single.loc['attribute1', 'pval'] == res_serial.loc['attribute1', 'pval']
+
+
+def test_enrichment_get_attrs_compressed(tmp_path):
+    import gzip
+    pth = tmp_path.joinpath('attr_ref_table_for_tests.csv.gz')
+    pth.write_bytes(gzip.compress(Path('attr_ref_table_for_tests.csv').read_bytes()))
+    en = FeatureSet(gene_set={'WBGene00000041', 'WBGene00002074'}, set_name='test_set')
+    assert en._enrichment_get_attrs('all', pth) == ['attribute1', 'attribute2', 'attribute3', 'attribute4']
+    assert en._enrichment_get_attrs([0, 2], pth) == ['attribute1', 'attribute3']
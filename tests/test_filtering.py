@@ -5,6 +5,9 @@ from pathlib import Path
 from rnalysis import general
 from rnalysis.filtering import *
 import os
+import matplotlib
+
+matplotlib.use('Agg')
 
 
 def test_deseqfilter_api():
@@ -491,6 +494,29 @@ def test_fc_randomization():
         raise AssertionError(f'Enrichment test failed with the numpy.random state: \n{random_state}')
 
 
+def test_fc_randomization_random_seed():
+    fc1 = FoldChangeFilter("fc_1.csv", 'a', 'b')
+    fc2 = FoldChangeFilter("fc_2.csv", "c", "d")
+    res1 = fc1.randomization_test(fc2, reps=1000, random_seed=3)
+    res2 = fc1.randomization_test(fc2, reps=1000, random_seed=3)
+    assert res1.equals(res2)
+
+
+def test_fc_randomization_nan_reference():
+    fc1 = FoldChangeFilter("fc_1.csv", 'a', 'b')
+    fc2 = FoldChangeFilter("fc_2.csv", "c", "d")
+    fc2_nan = FoldChangeFilter("fc_2.csv", "c", "d")
+    fc2_nan.df = fc2_nan.df.copy()
+    fc2_nan.df.iloc[0] = np.nan
+    res = fc1.randomization_test(fc2_nan, reps=1000, random_seed=3)
+    assert np.isfinite(res[['expected fold change', 'pval']].values).all()
+    # randomizations which drew the missing fold change average the other drawn fold changes
+    rng = np.random.default_rng(3)
+    idx = next(general._random_subsets(rng, fc2.df.shape[0], fc1.df.shape[0], 1000))
+    truth = np.mean([fc2.df.iloc[[i for i in row if i != 0]].mean() for row in idx])
+    assert np.isclose(res['expected fold change'].iloc[0], truth)
+
+
 def test_fcfilter_filter_abs_fc():
     truth = general.load_csv('fcfilter_abs_fold_change_truth.csv', 0)
     truth = truth.squeeze()
@@ -697,3 +723,545 @@ def test_sort_descending():
     c = CountFilter('counted.csv')
     c.sort(by='cond3', ascending=False, inplace=True)
     assert c.df['cond3'].is_monotonic_decreasing
+
+
+def test_pca_standardize():
+    from sklearn.preprocessing import StandardScaler
+    data = CountFilter('counted.csv').df.values
+    truth = StandardScaler().fit_transform(data.T)
+    assert np.isclose(CountFilter._pca_standardize(data, chunk_size=7), truth).all()
+    res_32 = CountFilter._pca_standardize(data, dtype=np.float32)
+    assert res_32.dtype == np.float32
+    assert np.isclose(res_32, truth, atol=1e-5).all()
+
+    top = np.argsort(data.var(axis=1))[-5:]
+    truth_top = StandardScaler().fit_transform(data[np.sort(top)].T)
+    assert np.isclose(CountFilter._pca_standardize(data, top_n_features=5), truth_top).all()
+
+
+def test_pca_solvers():
+    c = CountFilter('counted.csv')
+    exact, _ = c.pca(n_components=2, labels=False)
+    randomized, _ = c.pca(n_components=2, svd_solver='randomized', random_seed=0)
+    incremental, _ = c.pca(n_components=2, svd_solver='incremental', float32=True)
+    assert np.isclose(exact.explained_variance_ratio_, randomized.explained_variance_ratio_).all()
+    assert np.isclose(exact.explained_variance_ratio_, incremental.explained_variance_ratio_, atol=1e-4).all()
+    top_n, _ = c.pca(n_components=2, top_n_features=5)
+    assert top_n.n_features_in_ == 5
+    matplotlib.pyplot.close('all')
+
+
+def test_clustergram_linkage():
+    c = CountFilter('counted.csv')
+    clustering = c.clustergram(top_n_features=10)
+    assert clustering.data2d.shape == (10, c.shape[1])
+    row_linkage = clustering.dendrogram_row.linkage
+    col_linkage = clustering.dendrogram_col.linkage
+    clustering_2 = c.clustergram(top_n_features=10, row_linkage=row_linkage, col_linkage=col_linkage)
+    assert np.all(clustering_2.dendrogram_row.linkage == row_linkage)
+    assert np.all(clustering_2.dendrogram_col.linkage == col_linkage)
+    with pytest.raises(AssertionError):
+        c.clustergram(row_linkage=row_linkage)
+    matplotlib.pyplot.close('all')
+
+
+def test_clustergram_max_rows():
+    from scipy.cluster.hierarchy import leaves_list
+    c = CountFilter('counted.csv')
+    clustering = c.clustergram(max_rows=5)
+    assert clustering.data2d.shape == (5, c.shape[1])
+    assert clustering.row_linkage.shape == (c.shape[0] - 1, 4)
+    ordered = np.log2(c.df + 1).values[leaves_list(clustering.row_linkage)]
+    bins = np.array_split(ordered, 5)
+    assert np.isclose(clustering.data.values, np.array([this_bin.mean(axis=0) for this_bin in bins])).all()
+    assert c.clustergram(max_rows=None).data2d.shape == c.shape
+    matplotlib.pyplot.close('all')
+
+
+def test_density_scatter():
+    import matplotlib.pyplot as plt
+    rng = np.random.default_rng(0)
+    xvals = rng.normal(size=10000)
+    yvals = rng.normal(size=10000)
+    xvals[0] = np.nan
+    _, ax = plt.subplots()
+    img = Filter._density_scatter(ax, xvals, yvals, bins=32)
+    assert img.get_array().shape == (32, 32)
+    assert img.get_array().sum() == 9999
+    plt.close('all')
+
+
+def test_volcano_plot_density():
+    import matplotlib.pyplot as plt
+    d = DESeqFilter('test_deseq.csv')
+    d.volcano_plot(alpha=10 ** -100, density=True, bins=16)
+    ax = plt.gca()
+    assert len(ax.images) == 1
+    n_significant = ((d.df['padj'] <= 10 ** -100) & (d.df['log2FoldChange'] != 0)).sum()
+    assert ax.collections[0].get_offsets().shape[0] == n_significant
+    plt.close('all')
+
+
+def test_box_stats():
+    from matplotlib.cbook import boxplot_stats
+    values = np.log10(CountFilter('counted.csv').df.values + 1)
+    res = CountFilter._box_stats(values, list(range(values.shape[1])))
+    truth = boxplot_stats(values)
+    for res_col, truth_col in zip(res, truth):
+        for key in ['med', 'q1', 'q3', 'whislo', 'whishi', 'cilo', 'cihi', 'mean']:
+            assert np.isclose(res_col[key], truth_col[key])
+
+
+def test_violin_stats():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(5000, 3)) + np.arange(3)
+    stats = CountFilter._violin_stats(values, points=200)
+    assert len(stats) == 3
+    for i, stat in enumerate(stats):
+        assert np.isclose(np.trapz(stat['vals'], stat['coords']), 1, atol=0.05)
+        assert np.isclose(stat['coords'][np.argmax(stat['vals'])], i, atol=0.3)
+        assert np.isclose(stat['median'], np.median(values[:, i]))
+
+
+def test_box_violin_summary():
+    import matplotlib.pyplot as plt
+    c = CountFilter('counted.csv')
+    assert len(c._box_violin_data('all', subsample=5, random_seed=0)) == 5
+    c.box_plot(summary=True)
+    c.violin_plot(summary=True, subsample=10, random_seed=0)
+    plt.close('all')
+
+
+def test_correlation_matrix():
+    values = CountFilter('counted.csv').df.values
+    truth = np.corrcoef(values, rowvar=False)
+    assert np.isclose(CountFilter._correlation_matrix(values, chunk_size=3), truth).all()
+    assert np.isclose(CountFilter._correlation_matrix(values, dtype=np.float32), truth, atol=1e-5).all()
+    offset = values + 1e8
+    assert np.isclose(CountFilter._correlation_matrix(offset, chunk_size=3), truth).all()
+    assert np.isclose(CountFilter._correlation_matrix(values * 1e4, dtype=np.float32), truth, atol=1e-5).all()
+
+
+def test_rank_columns():
+    from scipy.stats import rankdata
+    values = CountFilter('counted.csv').df.values
+    ranks = CountFilter._rank_columns(values, np.float32)
+    assert ranks.dtype == np.float32
+    assert np.array_equal(ranks, rankdata(values, axis=0).astype(np.float32))
+
+
+def test_correlation_heatmap():
+    import matplotlib.pyplot as plt
+    c = CountFilter('counted.csv')
+    corr, _ = c.correlation_heatmap(method='spearman', scatter_samples=list(c.columns[:2]))
+    assert corr.equals(corr.T)
+    assert np.isclose(corr.values, c.df.corr(method='spearman').values).all()
+    plt.close('all')
+    corr32, _ = c.correlation_heatmap(method='spearman', float32=True, chunk_size=4)
+    assert np.isclose(corr32.values, corr.values, atol=1e-5).all()
+    plt.close('all')
+
+
+def test_correlation_heatmap_scatter_values(monkeypatch):
+    import matplotlib.pyplot as plt
+    c = CountFilter('counted.csv')
+    calls = []
+    monkeypatch.setattr(CountFilter, '_hexbin_grid', staticmethod(lambda sample_df, *args: calls.append(sample_df)))
+    c.correlation_heatmap(method='spearman', log2=True, scatter_samples=list(c.columns[:2]))
+    plotted = calls[0]
+    assert np.isclose(plotted.values, np.log2(c.df[list(c.columns[:2])].values + 1)).all()
+    plt.close('all')
+
+
+def test_group_stat():
+    df = CountFilter('counted.csv').df
+    cols = list(df.columns)
+    groups = {'a': cols[:2], 'b': [2, 3], 'c': cols[1:4], 'd': cols[0]}
+    for stat in ['mean', 'sem', 'median']:
+        res = CountFilter._group_stat(df, groups, stat)
+        assert list(res.columns) == ['a', 'b', 'c', 'd']
+        assert res.index.equals(df.index)
+        for name, members in groups.items():
+            members = [members] if isinstance(members, str) else members
+            sub = df[members] if isinstance(members[0], str) else df.iloc[:, members]
+            truth = getattr(sub, stat)(axis=1)
+            if stat == 'sem' and sub.shape[1] == 1:
+                assert res[name].isna().all() or np.isclose(res[name], 0).all()
+            else:
+                assert np.isclose(res[name], truth).all()
+
+
+def test_group_stat_sem_large_values():
+    df = pd.DataFrame([[1e8 + 1, 1e8 + 2, 1e8 + 3, 5], [1e12, 1e12 + 4, 1e12 + 8, 1e12]],
+                      index=['g1', 'g2'], columns=['a', 'b', 'c', 'd'])
+    res = CountFilter._group_stat(df, {'abc': ['a', 'b', 'c'], 'cd': ['c', 'd']}, 'sem')
+    assert np.allclose(res['abc'], df[['a', 'b', 'c']].sem(axis=1))
+    assert np.allclose(res['cd'], df[['c', 'd']].sem(axis=1))
+
+
+def test_avg_subsamples_keeps_index():
+    c = CountFilter('counted.csv')
+    cols = list(c.columns)
+    res = c._avg_subsamples([cols[:2], cols[2]])
+    assert res.index.equals(c.df.index)
+    assert list(res.columns) == [','.join(cols[:2]), cols[2]]
+    assert np.isclose(res[','.join(cols[:2])], c.df[cols[:2]].mean(axis=1)).all()
+
+
+def test_sample_sheet_api():
+    design = SampleSheet(['a1', 'a2', 'b1', 'b2', 'a3'], ['a', 'a', 'b', 'b', 'a'])
+    assert design.groups == {'a': ['a1', 'a2', 'a3'], 'b': ['b1', 'b2']}
+    assert design.replicates == [1, 2, 1, 2, 3]
+    indices = design.group_indices(['b2', 'a1', 'a2', 'a3', 'b1'])
+    assert list(indices['a']) == [1, 2, 3]
+    assert list(indices['b']) == [4, 0]
+    assert design.group_indices(['b2', 'a1', 'a2', 'a3', 'b1']) is indices
+    with pytest.raises(AssertionError):
+        design.group_indices(['a1', 'a2', 'b1'])
+    assert SampleSheet.from_dict(design.groups).groups == design.groups
+    assert SampleSheet.from_triplicates(['x', 'y', 'z', 'w', 'v', 'u']).groups == {'x': ['x', 'y', 'z'],
+                                                                                   'w': ['w', 'v', 'u']}
+
+
+def test_sample_sheet_from_csv():
+    design = SampleSheet.from_csv('test_sample_sheet.csv')
+    assert design.groups == {'cond1': ['cond1_rep1', 'cond1_rep2'], 'cond2': ['cond2_rep1', 'cond2_rep2'],
+                             'cond3': ['cond3_rep1', 'cond3_rep2']}
+    assert design.replicates == ['A', 'B', 'A', 'B', 'A', 'B']
+
+
+def test_countfilter_design():
+    groups = {'cond1': ['cond1_rep1', 'cond1_rep2'], 'cond2': ['cond2_rep1', 'cond2_rep2'],
+              'cond3': ['cond3_rep1', 'cond3_rep2']}
+    c = CountFilter('counted_fold_change.csv', design=groups)
+    assert c.triplicates == list(groups.values())
+    means = c.condition_means()
+    for cond, samples in groups.items():
+        assert np.isclose(means[cond], c.df[samples].mean(axis=1)).all()
+
+    fc = c.fold_change('cond1', 'cond2')
+    truth = c.fold_change(groups['cond1'], groups['cond2'])
+    assert fc.numerator == 'cond1' and fc.denominator == 'cond2'
+    assert np.isclose(fc.df, truth.df).all()
+
+    c_filtered = c.filter_low_reads(threshold=5, inplace=False)
+    assert c_filtered.design is c.design
+
+    with pytest.raises(AssertionError):
+        CountFilter('counted_fold_change.csv', design={'cond1': ['cond1_rep1', 'not_a_sample']})
+    with pytest.raises(AssertionError):
+        CountFilter('counted_fold_change.csv').condition_means()
+
+
+def test_fold_change_matrix():
+    groups = {'cond1': ['cond1_rep1', 'cond1_rep2'], 'cond2': ['cond2_rep1', 'cond2_rep2'],
+              'cond3': ['cond3_rep1', 'cond3_rep2']}
+    c = CountFilter('counted_fold_change.csv', design=groups)
+    res = c.fold_change_matrix()
+    assert list(res.columns) == ['cond1 vs cond2', 'cond1 vs cond3', 'cond2 vs cond3']
+    for col in res.columns:
+        numer, denom = col.split(' vs ')
+        truth = c.fold_change(numer, denom)
+        assert np.isclose(res[col], np.log2(truth.df)).all()
+
+    res = c.fold_change_matrix('control', control='cond3')
+    assert list(res.columns) == ['cond1 vs cond3', 'cond2 vs cond3']
+
+    res = c.fold_change_matrix([('cond1_rep1', ['cond2_rep1', 'cond2_rep2'])])
+    truth = c.fold_change('cond1_rep1', ['cond2_rep1', 'cond2_rep2'])
+    assert np.isclose(res.iloc[:, 0], np.log2(truth.df)).all()
+
+    filters = c.fold_change_matrix('control', control='cond1', return_filters=True)
+    fc = filters['cond2 vs cond1']
+    assert isinstance(fc, FoldChangeFilter)
+    assert fc.numerator == 'cond2' and fc.denominator == 'cond1'
+    assert np.isclose(fc.df, c.fold_change('cond2', 'cond1').df).all()
+
+    with pytest.raises(AssertionError):
+        CountFilter('counted_fold_change.csv').fold_change_matrix()
+
+
+def test_differential_expression_welch():
+    from scipy.stats import ttest_ind
+    groups = {'cond1': ['cond1_rep1', 'cond1_rep2'], 'cond2': ['cond2_rep1', 'cond2_rep2'],
+              'cond3': ['cond3_rep1', 'cond3_rep2']}
+    c = CountFilter('counted_fold_change.csv', design=groups)
+    d = c.differential_expression('cond1', 'cond2', test='welch')
+    assert isinstance(d, DESeqFilter)
+    assert list(d.columns) == ['baseMean', 'log2FoldChange', 'lfcSE', 'stat', 'pvalue', 'padj']
+    assert d.df.index.equals(c.df.index)
+
+    norm = c.df / CountFilter._size_factors(c.df.values.astype(float))
+    log_norm = np.log2(norm + 1)
+    truth = ttest_ind(log_norm[groups['cond1']], log_norm[groups['cond2']], axis=1, equal_var=False)
+    valid = ~np.isnan(truth.pvalue)
+    assert np.isclose(d.df['stat'][valid], truth.statistic[valid]).all()
+    assert np.isclose(d.df['pvalue'][valid], truth.pvalue[valid]).all()
+    assert (d.df['padj'][valid] >= d.df['pvalue'][valid]).all()
+
+
+def test_size_factors():
+    counts = np.array([[10, 20, 40], [5, 10, 20], [100, 200, 400], [0, 3, 7]], dtype=float)
+    sf = CountFilter._size_factors(counts)
+    assert np.isclose(sf, [0.5, 1, 2]).all()
+
+
+def test_differential_expression_wald():
+    rng = np.random.default_rng(42)
+    n_genes, n_reps = 2000, 4
+    mu = rng.lognormal(4, 1.5, n_genes)
+    true_lfc = np.zeros(n_genes)
+    true_lfc[:200] = rng.choice([-2, 2], 200)
+    disp = 0.05 + 1 / mu
+    sf = rng.uniform(0.5, 2, 2 * n_reps)
+
+    def nb(mean):
+        return rng.negative_binomial(1 / disp, 1 / (1 + disp * mean))
+
+    counts = np.column_stack([nb(mu * 2 ** true_lfc * s) if i < n_reps else nb(mu * s)
+                              for i, s in enumerate(sf)])
+    cols = [f'a{i}' for i in range(n_reps)] + [f'b{i}' for i in range(n_reps)]
+    df = pd.DataFrame(counts, columns=cols, index=[f'gene{i}' for i in range(n_genes)])
+    c = CountFilter((Path('simulated.csv'), df), design={'a': cols[:n_reps], 'b': cols[n_reps:]})
+    for dispersion in ['trended', 'shared']:
+        d = c.differential_expression('a', 'b', dispersion=dispersion)
+        sig = d.df['padj'] < 0.05
+        assert sig[:200].mean() > 0.8
+        assert sig[200:].mean() < 0.05
+        assert np.corrcoef(d.df['log2FoldChange'][:200], true_lfc[:200])[0, 1] > 0.9
+
+    with pytest.raises(AssertionError):
+        c.differential_expression('a', ['b0'])
+    with pytest.raises(AssertionError):
+        c.differential_expression('a', 'b', test='invalid')
+
+
+@pytest.mark.parametrize('file_format', ['parquet', 'feather', 'hdf5'])
+def test_save_load_roundtrip(tmp_path, file_format):
+    pytest.importorskip('tables' if file_format == 'hdf5' else 'pyarrow')
+    objs = [CountFilter('counted_fold_change.csv', design={'a': ['cond1_rep1', 'cond1_rep2'],
+                                                           'b': ['cond2_rep1', 'cond2_rep2', 'cond3_rep1']}),
+            DESeqFilter('test_deseq.csv'), FoldChangeFilter('fc_1.csv', 'num', 'denom'), Filter('counted.csv')]
+    for i, obj in enumerate(objs):
+        for compression in ['default', None]:
+            path = obj.save(tmp_path.joinpath(f'obj{i}'), file_format=file_format, compression=compression)
+            assert path.exists()
+            loaded = Filter.load(path)
+            assert type(loaded) == type(obj)
+            assert loaded.fname == obj.fname
+            if isinstance(obj.df, pd.Series):
+                pd.testing.assert_series_equal(loaded.df, obj.df)
+            else:
+                pd.testing.assert_frame_equal(loaded.df, obj.df)
+    loaded = Filter.load(tmp_path.joinpath(f'obj2{path.suffix}'))
+    assert loaded.numerator == 'num' and loaded.denominator == 'denom'
+    loaded = Filter.load(tmp_path.joinpath(f'obj0{path.suffix}'), memory_map=True)
+    assert loaded.design.groups == objs[0].design.groups
+
+
+@pytest.mark.parametrize('file_format', ['parquet', 'feather', 'hdf5'])
+def test_load_columns(tmp_path, file_format):
+    pytest.importorskip('tables' if file_format == 'hdf5' else 'pyarrow')
+    d = DESeqFilter('test_deseq.csv')
+    path = d.save(tmp_path.joinpath('deseq'), file_format=file_format)
+    loaded = Filter.load(path, columns=['log2FoldChange', 'padj'])
+    assert isinstance(loaded, DESeqFilter)
+    pd.testing.assert_frame_equal(loaded.df, d.df[['log2FoldChange', 'padj']])
+
+    c = CountFilter('counted_fold_change.csv', design={'a': ['cond1_rep1', 'cond1_rep2']})
+    path = c.save(tmp_path.joinpath('counts'), file_format=file_format)
+    with pytest.warns(UserWarning):
+        loaded = Filter.load(path, columns=['cond2_rep1', 'cond2_rep2'])
+    assert loaded.design is None
+    assert loaded.columns == ['cond2_rep1', 'cond2_rep2']
+
+
+def test_memmap_roundtrip(tmp_path):
+    c = CountFilter('counted_fold_change.csv', design={'a': ['cond1_rep1', 'cond1_rep2']})
+    mapped = c.to_memmap(tmp_path.joinpath('counts'), chunk_size=4)
+    assert tmp_path.joinpath('counts.npy').exists() and tmp_path.joinpath('counts.json').exists()
+    base = mapped.df.values
+    while base is not None and not isinstance(base, np.memmap):
+        base = base.base
+    assert isinstance(base, np.memmap)
+    pd.testing.assert_frame_equal(mapped.df, c.df)
+    assert mapped.fname == c.fname
+    assert mapped.design.groups == c.design.groups
+
+    reopened = CountFilter.from_memmap(tmp_path.joinpath('counts.npy'))
+    pd.testing.assert_frame_equal(reopened.df, c.df)
+
+
+def test_memmap_streaming_filters(tmp_path):
+    c = CountFilter('counted.csv')
+    mapped = CountFilter.csv_to_memmap('counted.csv', tmp_path.joinpath('counts.npy'), chunk_size=5)
+    assert np.allclose(mapped.df.values, c.df.values)
+    assert list(mapped.df.index) == list(c.df.index)
+    CountFilter._MEMMAP_CHUNK_SIZE, original_chunk_size = 3, CountFilter._MEMMAP_CHUNK_SIZE
+    try:
+        for method, kwargs in [('filter_low_reads', dict(threshold=5)), ('filter_by_row_sum', dict(threshold=5)),
+                               ('normalize_to_rpm', dict(special_counter_fname='uncounted.csv'))]:
+            truth = getattr(c, method)(inplace=False, **kwargs)
+            res = getattr(mapped, method)(inplace=False, **kwargs)
+            assert np.allclose(res.df.values, truth.df.values)
+            assert list(res.df.index) == list(truth.df.index)
+        high, low = mapped.split_by_reads(5)
+        high_truth, low_truth = c.split_by_reads(5)
+        assert list(high.df.index) == list(high_truth.df.index)
+        assert list(low.df.index) == list(low_truth.df.index)
+    finally:
+        CountFilter._MEMMAP_CHUNK_SIZE = original_chunk_size
+
+
+def test_compact_dtype_filters():
+    c = CountFilter('counted.csv')
+    compact = CountFilter('counted.csv', dtype='compact')
+    assert all(dtype == np.uint32 for dtype in compact.df.dtypes)
+    for method, kwargs in [('filter_low_reads', dict(threshold=5)), ('filter_by_row_sum', dict(threshold=5)),
+                           ('normalize_to_rpm', dict(special_counter_fname='uncounted.csv')),
+                           ('filter_biotype', dict(biotype='protein_coding', ref='biotype_ref_table_for_tests.csv')),
+                           ('filter_by_attribute', dict(attributes='attribute1', ref='attr_ref_table_for_tests.csv'))]:
+        truth = getattr(c, method)(inplace=False, **kwargs)
+        res = getattr(compact, method)(inplace=False, **kwargs)
+        assert np.allclose(res.df.values, truth.df.values)
+        assert list(res.df.index) == list(truth.df.index)
+    assert compact.biotypes(ref='biotype_ref_table_for_tests.csv').equals(
+        c.biotypes(ref='biotype_ref_table_for_tests.csv'))
+
+    d = DESeqFilter('test_deseq.csv', dtype='compact')
+    truth = DESeqFilter('test_deseq.csv')
+    assert d.df['log2FoldChange'].dtype == np.float64
+    assert d.df.equals(truth.df)
+    assert list(d.filter_significant(0.05, inplace=False).df.index) == \
+           list(truth.filter_significant(0.05, inplace=False).df.index)
+    fc = FoldChangeFilter('fc_1.csv', 'a', 'b', dtype='compact')
+    assert fc.df.equals(FoldChangeFilter('fc_1.csv', 'a', 'b').df)
+
+
+def test_memory_usage():
+    c = CountFilter('counted.csv')
+    compact = CountFilter('counted.csv', dtype='compact')
+    report = c.memory_usage()
+    assert list(report.index) == ['Index'] + c.columns + ['Total']
+    assert report.loc['Total', 'bytes'] == c.df.memory_usage(deep=True).sum()
+    assert report.loc['cond1', 'dtype'] == 'int64'
+    compact_report = compact.memory_usage()
+    assert compact_report.loc['cond1', 'dtype'] == 'uint32'
+    assert compact_report.loc['cond1', 'bytes'] * 2 == report.loc['cond1', 'bytes']
+    assert compact_report.loc['Total', 'bytes'] < report.loc['Total', 'bytes']
+
+    fc = FoldChangeFilter('fc_1.csv', 'a', 'b')
+    fc_report = fc.memory_usage()
+    assert list(fc_report.index) == ['Index', 'Fold Change', 'Total']
+    assert fc_report.loc['Total', 'bytes'] == fc.df.memory_usage(deep=True)
+
+
+def test_filter_compressed_input(tmp_path):
+    import gzip
+    pth = tmp_path.joinpath('test_deseq.csv.gz')
+    pth.write_bytes(gzip.compress(Path('test_deseq.csv').read_bytes()))
+    d = DESeqFilter(pth)
+    truth = DESeqFilter('test_deseq.csv')
+    assert d.fname == tmp_path.joinpath('test_deseq.csv')
+    assert np.all(d.df.fillna(0) == truth.df.fillna(0))
+    assert d.filter_significant(inplace=False).df.equals(truth.filter_significant(inplace=False).df)
+
+
+def test_count_filter_from_folder_compressed(tmp_path):
+    import bz2
+    import gzip
+    truth = CountFilter.from_folder('test_count_from_folder')
+    tmp_path.joinpath('file1.txt.gz').write_bytes(gzip.compress(Path('test_count_from_folder/file1.txt').read_bytes()))
+    tmp_path.joinpath('file2.txt.bz2').write_bytes(bz2.compress(Path('test_count_from_folder/file2.txt').read_bytes()))
+    tmp_path.joinpath('file3.csv.gz').write_bytes(gzip.compress(b'not a count file'))
+    c = CountFilter.from_folder(tmp_path)
+    assert sorted(c.columns) == ['file1', 'file2']
+    pd.testing.assert_frame_equal(c.df[truth.columns].sort_index(), truth.df.sort_index())
+
+
+def test_incremental_pca_batches():
+    data = CountFilter('counted.csv').df.values
+    standardized = CountFilter._pca_standardize(data)
+    single, pcomps = CountFilter._incremental_pca(data, 2, batch_size=4)
+    from sklearn.decomposition import PCA
+    exact = PCA(n_components=2).fit(standardized)
+    assert np.isclose(single.explained_variance_ratio_, exact.explained_variance_ratio_).all()
+    assert np.isclose(np.abs(pcomps), np.abs(exact.transform(standardized))).all()
+
+    # the last batch of a single sample is merged into the previous batch
+    batched, pcomps = CountFilter._incremental_pca(data, 2, batch_size=3)
+    assert batched.n_samples_seen_ == data.shape[1]
+    assert np.isclose(pcomps, batched.transform(standardized)).all()
+    with pytest.raises(AssertionError):
+        CountFilter._incremental_pca(data, 2, batch_size=1)
+
+
+def _memmap_base(df):
+    base = df.values
+    while base is not None and not isinstance(base, np.memmap):
+        base = base.base
+    return base
+
+
+def test_memmap_normalization_stays_on_disk(tmp_path):
+    c = CountFilter('counted.csv')
+    mapped = c.to_memmap(tmp_path.joinpath('counts.npy'))
+    CountFilter._MEMMAP_CHUNK_SIZE, original_chunk_size = 3, CountFilter._MEMMAP_CHUNK_SIZE
+    try:
+        rpm = mapped.normalize_to_rpm('uncounted.csv', inplace=False)
+        sizefactor = mapped.normalize_with_scaling_factors('scaling_factors.csv', inplace=False)
+    finally:
+        CountFilter._MEMMAP_CHUNK_SIZE = original_chunk_size
+    assert rpm._memmap_file().parent == tmp_path and rpm._memmap_file().name.startswith('counts_rpm_')
+    assert sizefactor._memmap_file().parent == tmp_path
+    assert sizefactor._memmap_file().name.startswith('counts_sizefactor_')
+    assert np.allclose(rpm.df.values, c.normalize_to_rpm('uncounted.csv', inplace=False).df.values)
+    assert np.allclose(sizefactor.df.values,
+                       c.normalize_with_scaling_factors('scaling_factors.csv', inplace=False).df.values)
+    assert mapped._memmap_file() == tmp_path.joinpath('counts.npy')
+    assert c._memmap_file() is None
+
+    # copies share the read-only memory-mapped file
+    copied = mapped.__copy__()
+    assert _memmap_base(copied.df) is not None
+    assert copied.df is not mapped.df
+
+    mapped.normalize_to_rpm('uncounted.csv', inplace=True)
+    assert mapped._memmap_file().name.startswith('counts_rpm_')
+    assert mapped._memmap_file() != rpm._memmap_file()
+    assert np.allclose(mapped.df.values, rpm.df.values)
+
+
+def test_memmap_normalization_keeps_earlier_results(tmp_path):
+    c = CountFilter('counted.csv')
+    mapped = c.to_memmap(tmp_path.joinpath('counts.npy'))
+    scaling_factors = pd.read_csv('scaling_factors.csv')
+    scaling_factors.to_csv(tmp_path.joinpath('sf2.csv'), index=False)
+    scaling_factors.iloc[:, :] = scaling_factors.values * 2
+    scaling_factors.to_csv(tmp_path.joinpath('sf1.csv'), index=False)
+    first = mapped.normalize_with_scaling_factors(tmp_path.joinpath('sf1.csv'), inplace=False)
+    first_values = np.array(first.df.values)
+    second = mapped.normalize_with_scaling_factors(tmp_path.joinpath('sf2.csv'), inplace=False)
+    assert first._memmap_file() != second._memmap_file()
+    assert np.array_equal(first.df.values, first_values)
+    assert np.allclose(first.df.values * 2, second.df.values)
+
+
+def test_csv_to_memmap_single_pass(tmp_path, monkeypatch):
+    calls = []
+    original_read_csv = pd.read_csv
+
+    def read_csv(*args, **kwargs):
+        calls.append(kwargs.get('nrows'))
+        return original_read_csv(*args, **kwargs)
+
+    monkeypatch.setattr(pd, 'read_csv', read_csv)
+    mapped = CountFilter.csv_to_memmap('counted.csv', tmp_path.joinpath('counts'), chunk_size=5, dtype='uint32')
+    monkeypatch.undo()
+    # one read of the header line, and one read of the whole file
+    assert calls == [0, None]
+    truth = CountFilter('counted.csv')
+    assert mapped.df.dtypes.unique() == [np.uint32]
+    assert np.all(mapped.df.values == truth.df.values)
+    assert list(mapped.df.index) == list(truth.df.index)
+    assert np.load(tmp_path.joinpath('counts.npy')).shape == truth.shape
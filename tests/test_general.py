@@ -3,7 +3,10 @@ import numpy as np
 import pandas as pd
 from pathlib import Path
 from rnalysis.general import *
-from rnalysis.general import _check_is_df,_remove_unindexed_rows
+from rnalysis.general import _check_is_df,_remove_unindexed_rows, _read_header_line, _get_settings_file_path, \
+    _load_settings_file, _get_attr_ref_path, _SETTINGS_CACHE, _wait_with_progress
+import logging
+import yaml
 
 
 def test_is_df_dataframe():
@@ -80,3 +83,364 @@ def test_parse_gene_name_string():
     string = 'saeg-2 \\\ lin-15B cyp-23A1lin-15A WBGene12345678\n GHF5H.3'
     truth = {'saeg-2', 'lin-15B', 'cyp-23A1', 'lin-15A'}
     assert truth == parse_gene_name_string(string)
+
+
+def test_random_subsets_chunk_invariant():
+    from rnalysis.general import _random_subsets
+    subsets = np.vstack(list(_random_subsets(np.random.default_rng(3), 50, 7, 100)))
+    subsets_chunked = np.vstack(list(_random_subsets(np.random.default_rng(3), 50, 7, 100, max_chunk_elements=150)))
+    assert subsets.shape == (100, 7)
+    assert np.all(subsets == subsets_chunked)
+    assert all(len(set(row)) == 7 for row in subsets)
+    assert subsets.min() >= 0 and subsets.max() < 50
+
+
+def test_figure_output(tmp_path):
+    import matplotlib.pyplot as plt
+    from rnalysis import filtering
+    d = filtering.DESeqFilter('test_deseq.csv')
+    existing_fig = plt.figure()
+    with figure_output(tmp_path, formats=('png', 'svg')) as saved:
+        d.volcano_plot()
+        d.volcano_plot(density=True)
+    assert [path.name for path in saved] == ['001_volcano_plot.png', '001_volcano_plot.svg',
+                                             '002_volcano_plot.png', '002_volcano_plot.svg']
+    assert all(path.exists() for path in saved)
+    assert plt.get_fignums() == [existing_fig.number]
+    plt.close('all')
+
+
+def test_render_figures(tmp_path):
+    from rnalysis import filtering
+    d = filtering.DESeqFilter('test_deseq.csv')
+    c = filtering.CountFilter('counted.csv')
+    jobs = [d.volcano_plot, (c.pca, {'n_components': 3})]
+    for processes in [1, 2]:
+        paths = render_figures(jobs, tmp_path.joinpath(str(processes)), formats='pdf', processes=processes)
+        assert [path.name for path in paths] == ['job000_001_volcano_plot.pdf', 'job001_001_pca.pdf',
+                                                 'job001_002_pca.pdf']
+        assert all(path.exists() for path in paths)
+
+
+def test_import_skips_heavy_modules():
+    import subprocess
+    import sys
+    heavy_modules = ['sklearn', 'seaborn', 'matplotlib.pyplot', 'grid_strategy', 'tissue_enrichment_analysis',
+                     'statsmodels', 'ipyparallel', 'upsetplot', 'matplotlib_venn', 'scipy.stats']
+    code = "import sys\n" \
+           "import rnalysis.filtering, rnalysis.enrichment\n" \
+           f"print(','.join(mod for mod in {heavy_modules} if mod in sys.modules))"
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    assert out.strip() == ''
+
+
+def test_profile(tmp_path):
+    import json
+    from rnalysis import filtering
+    with profile() as prof:
+        d = filtering.DESeqFilter('test_deseq.csv')
+        d.filter_significant(alpha=10 ** -100)
+    filtering.DESeqFilter('test_deseq.csv')
+    table = prof.to_table()
+    n_rows = load_csv('test_deseq.csv').shape[0]
+    assert list(table['name']) == ['DESeqFilter.__init__', 'load_csv', 'DESeqFilter.filter_significant',
+                                   'DESeqFilter._inplace']
+    assert list(table['depth']) == [0, 1, 0, 1]
+    assert (table['wall_time'] > 0).all()
+    assert table['rows_in'].iloc[2] == n_rows
+    assert table['rows_out'].iloc[2] == d.shape[0] < n_rows
+    assert table['peak_memory_mb'].isna().all()
+    assert table.loc[0, 'wall_time'] >= table.loc[1, 'wall_time']
+
+    summary = prof.summary()
+    assert summary.loc['DESeqFilter.__init__', 'calls'] == 1
+
+    prof.save_chrome_trace(tmp_path.joinpath('trace.json'))
+    with open(tmp_path.joinpath('trace.json')) as f:
+        events = json.load(f)['traceEvents']
+    assert [event['name'] for event in events] == list(table['name'])
+    assert all(event['ph'] == 'X' for event in events)
+
+
+def test_profile_memory():
+    from rnalysis import filtering
+    c = filtering.CountFilter('counted.csv')
+    with profile(memory=True) as prof:
+        c.filter_low_reads(threshold=5, inplace=False)
+        c.normalize_with_scaling_factors('scaling_factors.csv', inplace=False)
+    table = prof.to_table()
+    assert (table['peak_memory_mb'] > 0).all()
+    assert len(prof) == len(table)
+
+
+def test_profile_threads():
+    import threading
+    from rnalysis.general import _profiled
+    barrier = threading.Barrier(2)
+
+    @_profiled
+    def inner():
+        barrier.wait(timeout=10)
+
+    @_profiled
+    def outer():
+        inner()
+
+    with profile() as prof:
+        threads = [threading.Thread(target=outer) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    table = prof.to_table()
+    assert sorted(zip(table['name'].str.split('.').str[-1], table['depth'])) == [('inner', 1), ('inner', 1),
+                                                                                ('outer', 0), ('outer', 0)]
+
+
+def test_set_verbosity(capsys):
+    from rnalysis import filtering
+    assert get_verbosity() == 'info'
+    try:
+        set_verbosity('silent')
+        assert get_verbosity() == 'silent'
+        filtering.CountFilter('counted.csv').filter_low_reads(threshold=5)
+        assert capsys.readouterr().out == ''
+        set_verbosity('info')
+        filtering.CountFilter('counted.csv').filter_low_reads(threshold=5)
+        assert capsys.readouterr().out.startswith('Filtered ')
+        with pytest.raises(AssertionError):
+            set_verbosity('loud')
+    finally:
+        set_verbosity('info')
+
+
+def test_logging_handlers():
+    import subprocess
+    import sys
+    code = "import logging, sys\n" \
+           "from rnalysis import general\n" \
+           "assert general._LOGGER.propagate\n" \
+           "assert any(isinstance(h, logging.NullHandler) for h in general._LOGGER.handlers)\n" \
+           "general._LOGGER.info('default')\n" \
+           "logging.basicConfig(stream=sys.stderr, format='%(message)s')\n" \
+           "general._LOGGER.info('configured')\n" \
+           "general.set_verbosity('info')\n" \
+           "general._LOGGER.info('explicit')\n"
+    res = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert res.stdout.split() == ['default', 'explicit']
+    assert res.stderr.split() == ['configured', 'explicit']
+
+
+def test_progress_callback():
+    from rnalysis.general import _Progress
+    calls = []
+
+    def callback(desc, done, total, elapsed, eta):
+        calls.append((desc, done, total, eta))
+
+    try:
+        set_verbosity('silent')
+        set_progress_callback(callback, 0)
+        progress = _Progress(5, 'test')
+        for _ in range(5):
+            progress.update()
+        assert [call[1] for call in calls] == [1, 2, 3, 4, 5]
+        assert calls[-1][0] == 'test' and calls[-1][2] == 5 and calls[-1][3] == 0
+
+        calls.clear()
+        set_progress_callback(callback, 3600)
+        progress = _Progress(5, 'test')
+        for _ in range(5):
+            progress.update()
+        assert [call[1] for call in calls] == [5]
+
+        calls.clear()
+        set_progress_callback(None)
+        progress = _Progress(5, 'test')
+        progress.update(5)
+        assert not progress.enabled
+        assert calls == []
+    finally:
+        set_progress_callback(None)
+        set_verbosity('info')
+
+
+def test_wait_with_progress():
+    class FakeAsyncResult:
+        msg_ids = ['a', 'b', 'c']
+
+        def __init__(self):
+            self.progress = 0
+
+        def wait(self, timeout):
+            self.progress += 1
+
+        def ready(self):
+            return self.progress == len(self.msg_ids)
+
+        def result(self):
+            return [self.progress]
+
+    calls = []
+    try:
+        set_progress_callback(lambda desc, done, total, elapsed, eta: calls.append((desc, done, total)), 0)
+        assert _wait_with_progress(FakeAsyncResult(), 'test', 0) == [3]
+        assert calls == [('test', 1, 3), ('test', 2, 3), ('test', 3, 3)]
+    finally:
+        set_progress_callback(None)
+
+
+def test_compact_dtypes():
+    df = pd.DataFrame({'counts': [0, 5, 2 ** 20, 7], 'negative': [-1, 0, 1, 2], 'huge': [0, 1, 2 ** 40, 3],
+                       'fc': [0.5, -1.25, np.nan, 2.0], 'pval': [0.01, 1e-300, 0.5, 1.0],
+                       'basemean': [1234.56789, 0.1, 2.0, 3.0],
+                       'label': ['a', 'a', 'b', 'a'], 'name': ['w', 'x', 'y', 'z']}, index=['g1', 'g2', 'g3', 'g4'])
+    compact = compact_dtypes(df)
+    assert compact['counts'].dtype == np.uint32
+    assert compact['negative'].dtype == np.int32
+    assert compact['huge'].dtype == np.int64
+    assert compact['fc'].dtype == np.float32
+    assert compact['pval'].dtype == np.float64
+    assert compact['basemean'].dtype == np.float64
+    assert compact['label'].dtype == 'category'
+    assert compact['name'].dtype == object
+    assert list(compact.index) == list(df.index)
+    pd.testing.assert_frame_equal(compact.astype(df.dtypes.to_dict()), df)
+    assert compact_dtypes(df['counts']).dtype == np.uint32
+
+
+def test_load_csv_dtype():
+    df = load_csv('test_deseq.csv', 0)
+    compact = load_csv('test_deseq.csv', 0, dtype='compact')
+    pd.testing.assert_frame_equal(compact.astype(np.float64), df)
+    attr_ref = load_csv('attr_ref_table_for_tests.csv', dtype='compact')
+    assert (attr_ref.dtypes == np.float32).any()
+    assert attr_ref.memory_usage(deep=True).sum() < load_csv('attr_ref_table_for_tests.csv').memory_usage(
+        deep=True).sum()
+    assert load_csv('counted.csv', 0, dtype={'cond1': 'float32'})['cond1'].dtype == np.float32
+
+
+@pytest.mark.parametrize('fname,idx_col', [('counted.csv', 0), ('test_deseq_textcol.csv', 0), ('test_load_csv.csv', 0),
+                                           ('counted_missing_rows.csv', 0), ('biotype_ref_table_for_tests.csv', None),
+                                           ('attr_ref_table_for_tests.csv', None)])
+def test_load_csv_engines(fname, idx_col):
+    truth = load_csv(fname, idx_col, engine='c')
+    pd.testing.assert_frame_equal(load_csv(fname, idx_col, engine='pyarrow'), truth)
+    pd.testing.assert_frame_equal(load_csv(fname, idx_col, engine='auto'), truth)
+
+
+def test_load_csv_usecols():
+    truth = load_csv('counted.csv', 0)
+    for engine in ['c', 'pyarrow']:
+        res = load_csv('counted.csv', 0, usecols=[0, 'cond3', 'cond1'], engine=engine)
+        pd.testing.assert_frame_equal(res, truth[['cond1', 'cond3']])
+        res = load_csv('counted.csv', 0, usecols=lambda col: col != 'cond2', engine=engine)
+        pd.testing.assert_frame_equal(res, truth.drop('cond2', axis=1))
+        res = load_csv('counted.csv', 0, usecols=[0, 'cond4'], squeeze=True, engine=engine)
+        pd.testing.assert_series_equal(res, truth['cond4'])
+    with pytest.raises(ValueError):
+        load_csv('counted.csv', 0, usecols=['cond1', 'not_a_column'])
+    with pytest.raises(AssertionError):
+        load_csv('counted.csv', 0, engine='fast')
+
+
+def test_load_csv_pyarrow_fallback(tmp_path):
+    pth = tmp_path.joinpath('ragged.csv')
+    pth.write_text('gene,a,b\ng1,1,2\ng2,3\n#g3,5,6\n')
+    for comment in [None, '#']:
+        truth = pd.read_csv(pth, index_col=0, comment=comment)
+        pd.testing.assert_frame_equal(load_csv(pth, 0, comment=comment, engine='pyarrow'), truth)
+
+
+def _compress(source: str, target: Path, compression: str):
+    data = Path(source).read_bytes()
+    if compression == 'gzip':
+        import gzip
+        data = gzip.compress(data)
+    elif compression == 'bz2':
+        import bz2
+        data = bz2.compress(data)
+    elif compression == 'xz':
+        import lzma
+        data = lzma.compress(data)
+    else:
+        import pyarrow as pa
+        data = pa.compress(data, codec='zstd', asbytes=True)
+    target.write_bytes(data)
+    return target
+
+
+@pytest.mark.parametrize('compression,suffix', [('gzip', '.gz'), ('bz2', '.bz2'), ('xz', '.xz'), ('zstd', '.zst')])
+def test_load_csv_compressed(tmp_path, compression, suffix):
+    truth = load_csv('test_deseq.csv', 0)
+    pth = _compress('test_deseq.csv', tmp_path.joinpath('test_deseq.csv' + suffix), compression)
+    for engine in ['c', 'pyarrow']:
+        pd.testing.assert_frame_equal(load_csv(pth, 0, engine=engine), truth)
+    pd.testing.assert_frame_equal(load_csv(str(pth), 0, usecols=[0, 'padj']), truth[['padj']])
+    assert _read_header_line(pth) == ',baseMean,log2FoldChange,lfcSE,stat,pvalue,padj'
+    assert not _check_is_df(pth)
+    assert not _check_is_df(str(pth))
+    with pytest.raises(ValueError):
+        _check_is_df(tmp_path.joinpath('test_deseq.txt' + suffix))
+
+
+def test_settings_cache(monkeypatch, tmp_path):
+    settings_pth = tmp_path.joinpath('settings.yaml')
+    monkeypatch.setenv('RNALYSIS_SETTINGS_FILE', str(settings_pth))
+    assert _get_settings_file_path() == settings_pth
+    assert _load_settings_file() == {}
+
+    set_attr_ref_table_path('attr_ref_table_for_tests.csv')
+    set_biotype_ref_table_path('biotype_ref_table_for_tests.csv')
+    assert [pth.name for pth in tmp_path.iterdir()] == ['settings.yaml']
+
+    loads = []
+    original_load = yaml.safe_load
+    monkeypatch.setattr(yaml, 'safe_load', lambda f: loads.append(1) or original_load(f))
+    for _ in range(100):
+        assert read_attr_ref_table_path() == 'attr_ref_table_for_tests.csv'
+        assert read_biotype_ref_table_path() == 'biotype_ref_table_for_tests.csv'
+    assert loads == []
+
+    # the settings file is parsed again after it was modified by another process
+    with open(settings_pth, 'a') as f:
+        f.write('plot_enrichment_results: false\n')
+    assert read_enrichment_plotting() is False
+    assert read_enrichment_plotting() is False
+    assert loads == [1]
+
+    # returned settings are copies of the cached settings
+    _load_settings_file()['plot_enrichment_results'] = True
+    assert read_enrichment_plotting() is False
+
+    reset_settings_file()
+    assert _load_settings_file() == {}
+
+
+def test_settings_env_overrides(monkeypatch, tmp_path):
+    monkeypatch.setenv('RNALYSIS_SETTINGS_FILE', str(tmp_path.joinpath('settings.yaml')))
+    set_attr_ref_table_path('attr_ref_table_for_tests.csv')
+    monkeypatch.setenv('RNALYSIS_ATTR_REF_TABLE', 'attr_ref_table_for_examples.csv')
+    monkeypatch.setenv('RNALYSIS_BIOTYPE_REF_TABLE', 'biotype_ref_table_for_tests.csv')
+    monkeypatch.setenv('RNALYSIS_GO_CACHE_DIR', str(tmp_path))
+    assert read_attr_ref_table_path() == 'attr_ref_table_for_examples.csv'
+    assert _get_attr_ref_path('predefined') == 'attr_ref_table_for_examples.csv'
+    assert read_biotype_ref_table_path() == 'biotype_ref_table_for_tests.csv'
+    assert read_go_cache_dir() == tmp_path
+    assert _load_settings_file() == {'attribute_reference_table': 'attr_ref_table_for_tests.csv'}
+    monkeypatch.delenv('RNALYSIS_ATTR_REF_TABLE')
+    assert read_attr_ref_table_path() == 'attr_ref_table_for_tests.csv'
+
+
+def test_settings_path_reported_once(monkeypatch, tmp_path, caplog):
+    monkeypatch.setenv('RNALYSIS_SETTINGS_FILE', str(tmp_path.joinpath('settings.yaml')))
+    monkeypatch.setitem(_SETTINGS_CACHE, 'reported', {})
+    set_attr_ref_table_path('attr_ref_table_for_tests.csv')
+    with caplog.at_level(logging.DEBUG, logger='rnalysis'):
+        for _ in range(5):
+            read_attr_ref_table_path()
+        set_attr_ref_table_path('attr_ref_table_for_examples.csv')
+        read_attr_ref_table_path()
+    used = [rec.getMessage() for rec in caplog.records if rec.levelno == logging.INFO and 'used' in rec.getMessage()]
+    assert used == ['Attribute Reference Table used: attr_ref_table_for_tests.csv',
+                    'Attribute Reference Table used: attr_ref_table_for_examples.csv']